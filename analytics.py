@@ -0,0 +1,223 @@
+"""Reports over the round log, computed on memory-mapped NumPy arrays.
+
+Each segment of the log is mapped as an array of ROUND_DTYPE, which has
+the same layout as round_log's 80-byte records, so the fields are read in
+place without building a Python object per round. Each segment is
+reduced to a small Report on its own, so memory stays flat however long
+the log is and segments can be read by several processes at once; the
+reports are then merged in log order.
+
+    python analytics.py rounds/
+    python analytics.py rounds/ --players 50 --json --workers 8
+
+Requires numpy, which the game itself does not need.
+"""
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import round_log
+from main import BLACKJACK
+from vectorized import hand_totals
+
+ROUND_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("seed", "<u8"),
+    ("player", "S16"),
+    ("position", "<u2"),
+    ("decks", "u1"),
+    ("flags", "u1"),
+    ("bet", "<u4"),
+    ("payout", "<f8"),
+    ("player_count", "u1"),
+    ("dealer_count", "u1"),
+    ("cards", "u1", (30,)),
+])
+assert ROUND_DTYPE.itemsize == round_log.RECORD_SIZE
+
+# Starting totals of the bust-rate table, 4 to 21 (a pair of aces counts as 12)
+TOTALS = range(4, BLACKJACK + 1)
+# Per player: rounds, wins, wagered, net, highest and lowest net, worst drawdown; money in dollars
+_ROUNDS, _WINS, _WAGERED, _NET, _HIGH, _LOW, _DRAWDOWN = range(7)
+
+
+def map_segment(path):
+    """The records of one segment as a read-only memory-mapped array"""
+    count = round_log.segment_records(path)
+    if count == 0:
+        return np.empty(0, dtype=ROUND_DTYPE)
+    return np.memmap(path, dtype=ROUND_DTYPE, mode="r", offset=round_log.HEADER_SIZE, shape=(count,))
+
+
+class Report:
+    """Totals over a run of rounds; reports on consecutive runs merge into one"""
+
+    def __init__(self):
+        self.rounds = 0
+        self.wagered = 0.0
+        self.paid = 0.0
+        self.naturals = 0
+        self.starts = np.zeros(BLACKJACK + 1, dtype=np.int64)  # rounds by starting total
+        self.busts = np.zeros(BLACKJACK + 1, dtype=np.int64)  # of those, rounds the player bust
+        self.players = {}  # name -> list indexed by _ROUNDS to _DRAWDOWN
+
+    @classmethod
+    def of(cls, records):
+        """Report on an array of ROUND_DTYPE records"""
+        report = cls()
+        if len(records) == 0:
+            return report
+        bet = records["bet"].astype(np.float64)
+        payout = records["payout"]
+        cards = records["cards"]
+        report.rounds = len(records)
+        report.wagered = float(bet.sum())
+        report.paid = float(payout.sum())
+
+        # Naturals and bust rates need only the player's cards, which come first
+        player_count = records["player_count"]
+        start_values, _ = hand_totals(cards[:, :2])
+        start_values = start_values.astype(np.intp)
+        final_values, _ = hand_totals(cards[:, :int(player_count.max())], player_count)
+        report.naturals = int(np.count_nonzero(start_values == BLACKJACK))
+        report.starts = np.bincount(start_values, minlength=BLACKJACK + 1)[:BLACKJACK + 1]
+        bust = final_values > BLACKJACK
+        report.busts = np.bincount(start_values[bust], minlength=BLACKJACK + 1)[:BLACKJACK + 1]
+
+        report._add_players(records["player"], records["flags"] & 3 == round_log.WIN, bet, payout - bet)
+        return report
+
+    def _add_players(self, names, wins, bet, net):
+        # Group the rounds by player with one stable sort, on the name read as two integers
+        halves = np.ascontiguousarray(names).view("<u8").reshape(-1, 2)
+        order = np.lexsort((halves[:, 1], halves[:, 0]))
+        sorted_halves = halves[order]
+        starts = np.flatnonzero(np.concatenate(([True], (sorted_halves[1:] != sorted_halves[:-1]).any(axis=1))))
+        counts = np.diff(np.append(starts, len(order)))
+        names = names[order[starts]].tolist()
+        net = net[order]
+
+        # Each player's net after each of their rounds, in log order
+        running = np.cumsum(net)
+        running -= np.repeat(running[starts] - net[starts], counts)
+        peaks = np.maximum(_grouped_running_max(running, counts), 0)
+        columns = (
+            counts,
+            np.add.reduceat(wins[order], starts),
+            np.add.reduceat(bet[order], starts),
+            running[starts + counts - 1],
+            np.maximum(np.maximum.reduceat(running, starts), 0),
+            np.minimum(np.minimum.reduceat(running, starts), 0),
+            np.maximum.reduceat(peaks - running, starts),
+        )
+        for name, entry in zip(names, zip(*(column.tolist() for column in columns))):
+            self.players[name] = list(entry)
+
+    def merge(self, other):
+        """Add the report on the rounds logged after ours"""
+        self.rounds += other.rounds
+        self.wagered += other.wagered
+        self.paid += other.paid
+        self.naturals += other.naturals
+        self.starts = self.starts + other.starts
+        self.busts = self.busts + other.busts
+        for name, later in other.players.items():
+            entry = self.players.get(name)
+            if entry is None:
+                self.players[name] = list(later)
+                continue
+            net = entry[_NET]
+            # A drawdown can run from before their later rounds down to the lowest point in them
+            entry[_DRAWDOWN] = max(entry[_DRAWDOWN], later[_DRAWDOWN], entry[_HIGH] - (net + later[_LOW]))
+            entry[_HIGH] = max(entry[_HIGH], net + later[_HIGH])
+            entry[_LOW] = min(entry[_LOW], net + later[_LOW])
+            entry[_NET] = net + later[_NET]
+            entry[_ROUNDS] += later[_ROUNDS]
+            entry[_WINS] += later[_WINS]
+            entry[_WAGERED] += later[_WAGERED]
+        return self
+
+    def summary(self, players=20):
+        """The report as plain data, with the `players` who played the most rounds"""
+        by_rounds = sorted(self.players.items(), key=lambda item: (-item[1][_ROUNDS], item[0]))
+        return {
+            "rounds": self.rounds,
+            "wagered": self.wagered,
+            "house_net": self.wagered - self.paid,
+            "house_edge": round((self.wagered - self.paid) / self.wagered * 100, 4) if self.wagered else 0.0,
+            "blackjack_frequency": round(self.naturals / self.rounds * 100, 4) if self.rounds else 0.0,
+            "bust_rate_by_starting_total": {
+                total: round(int(self.busts[total]) / int(self.starts[total]) * 100, 2)
+                for total in TOTALS if self.starts[total]
+            },
+            "players": [
+                {
+                    "name": name.decode(errors="replace"),
+                    "rounds": entry[_ROUNDS],
+                    "win_rate": round(entry[_WINS] / entry[_ROUNDS] * 100, 2),
+                    "net": entry[_NET],
+                    "max_drawdown": entry[_DRAWDOWN],
+                }
+                for name, entry in by_rounds[:players]
+            ],
+            "player_count": len(self.players),
+        }
+
+def _grouped_running_max(values, counts):
+    """Running maximum of `values` restarting at each group of `counts` consecutive items"""
+    if len(values) == 0:
+        return values
+    # Lift each group clear of the ones before it, so a single running max never crosses a group
+    low = values.min()
+    span = values.max() - low + 1
+    lift = np.repeat(np.arange(len(counts)) * span, counts)
+    return np.maximum.accumulate(values - low + lift) - lift + low
+
+def segment_report(path):
+    return Report.of(map_segment(path))
+
+def analyze(directory, workers=1):
+    """A Report over every segment of the round log in `directory`, `workers` segments at a time"""
+    paths = round_log.segments(directory)
+    report = Report()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for segment in executor.map(segment_report, paths):
+                report.merge(segment)
+    else:
+        for path in paths:
+            report.merge(segment_report(path))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="House edge, win rates, bust rates and drawdowns from the round log")
+    parser.add_argument("directory", help="the BLACKJACK_ROUND_LOG directory")
+    parser.add_argument("--players", type=int, default=20, help="players to list, those with the most rounds first")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--workers", type=int, default=1, help="processes reading segments at once")
+    args = parser.parse_args()
+
+    summary = analyze(args.directory, args.workers).summary(args.players)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{'rounds':<20} {summary['rounds']:,}")
+    print(f"{'wagered':<20} ${summary['wagered']:,.2f}")
+    print(f"{'house net':<20} ${summary['house_net']:,.2f}")
+    print(f"{'house edge':<20} {summary['house_edge']}%")
+    print(f"{'blackjacks':<20} {summary['blackjack_frequency']}% of rounds")
+    print("\nbust rate by starting total")
+    for total, rate in summary["bust_rate_by_starting_total"].items():
+        print(f"  {total:>2}  {rate:6.2f}%")
+    print(f"\n{summary['player_count']:,} players; the {len(summary['players'])} with the most rounds:")
+    print(f"  {'name':<16} {'rounds':>10} {'win rate':>9} {'net':>12} {'drawdown':>12}")
+    for player in summary["players"]:
+        print(f"  {player['name']:<16} {player['rounds']:>10,} {player['win_rate']:>8}% "
+              f"{player['net']:>12,.2f} {player['max_drawdown']:>12,.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,49 @@
 from flask import Flask, render_template, request, jsonify, session
-import json
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import URLSafeTimedSerializer
 import os
-from datetime import datetime
-from main import Card, Deck, Hand, Player, Leaderboard, Game, BLACKJACK, DEALER_STAND
+import game_service
+import metrics
+
+class FallbackSessionInterface(SecureCookieSessionInterface):
+    """Flask's cookie session, also accepting cookies signed with a key in SECRET_KEY_FALLBACKS,
+    as Flask 3.1 does"""
+
+    def get_signing_serializer(self, app):
+        if not app.secret_key:
+            return None
+        # itsdangerous signs with the last key and accepts any of them
+        keys = [*app.config.get('SECRET_KEY_FALLBACKS', []), app.secret_key]
+        return URLSafeTimedSerializer(keys, salt=self.salt, serializer=self.serializer,
+                                      signer_kwargs={'key_derivation': self.key_derivation, 'digest_method': self.digest_method})
+
+class TimedSessionInterface(FallbackSessionInterface):
+    """The cookie session, timing how long it takes to verify and sign"""
+
+    def open_session(self, app, request):
+        start = metrics.clock()
+        session = super().open_session(app, request)
+        metrics.phase('session_load', start)
+        return session
+
+    def save_session(self, app, session, response):
+        start = metrics.clock()
+        super().save_session(app, session, response)
+        metrics.phase('session_save', start)
 
 app = Flask(__name__)
-app.secret_key = 'blackjack_secret_key_2024'
-
-# Global game state
-game_state = {}
+app.secret_key = game_service.SECRET_KEY
+app.config['SECRET_KEY_FALLBACKS'] = game_service.SECRET_KEY_FALLBACKS
+app.session_interface = FallbackSessionInterface()
+if metrics.enabled:
+    app.session_interface = TimedSessionInterface()
+    app.wsgi_app = metrics.WSGIMiddleware(app.wsgi_app)
+
+    @app.before_request
+    def label_route():
+        # Label the request's timing with the route pattern rather than the path
+        if request.url_rule is not None:
+            request.environ[metrics.ROUTE_KEY] = request.url_rule.rule
 
 @app.route('/')
 def index():
@@ -19,301 +54,109 @@ def index():
 def start_game():
     """Start a new game"""
     data = request.get_json()
-    player_name = data.get('player_name', 'Player')
-    
-    # Initialize game state
-    session['player_name'] = player_name
-    session['player_money'] = 1000
-    session['games_played'] = 0
-    session['games_won'] = 0
-    session['blackjacks'] = 0
-    session['current_bet'] = 0
-    session['game_active'] = False
-    
-    return jsonify({
-        'status': 'success',
-        'message': f'Welcome, {player_name}!',
-        'player_money': session['player_money']
-    })
+    return jsonify(game_service.start_game(session, data.get('player_name', 'Player')))
 
 @app.route('/place_bet', methods=['POST'])
 def place_bet():
     """Place a bet"""
     data = request.get_json()
-    bet_amount = int(data.get('bet_amount', 0))
-    
-    if bet_amount > session['player_money'] or bet_amount < 10 or bet_amount > 500:
-        return jsonify({
-            'status': 'error',
-            'message': 'Invalid bet amount. Must be between $10 and $500, and not exceed your balance.'
-        })
-    
-    session['current_bet'] = bet_amount
-    session['player_money'] -= bet_amount
-    session['game_active'] = True
-    
-    # Initialize game
-    deck = Deck()
-    deck.shuffle()
-    
-    player_hand = Hand()
-    dealer_hand = Hand(dealer=True)
-    
-    # Deal initial cards
-    for _ in range(2):
-        player_hand.add_card(deck.deal(1))
-        dealer_hand.add_card(deck.deal(1))
-    
-    # Check for initial blackjack
-    game_message = _check_initial_blackjack(player_hand, dealer_hand)
-    
-    # Handle blackjack wins immediately
-    if game_message and "BLACKJACK" in game_message and "tie" not in game_message:
-        if player_hand.is_blackjack():
-            # Player wins with blackjack
-            session['games_played'] += 1
-            session['games_won'] += 1
-            session['blackjacks'] += 1
-            # Return bet + 1.5x winnings (total = bet + 1.5*bet = 2.5*bet)
-            session['player_money'] += session['current_bet'] + int(session['current_bet'] * 1.5)
-            session['game_active'] = False
-            session['current_bet'] = 0
-        elif dealer_hand.is_blackjack():
-            # Dealer wins with blackjack
-            session['games_played'] += 1
-            session['game_active'] = False
-            session['current_bet'] = 0
-        elif "tie" in game_message:
-            # Both have blackjack - tie
-            session['games_played'] += 1
-            session['player_money'] += session['current_bet']  # Return bet
-            session['game_active'] = False
-            session['current_bet'] = 0
-    
-    # Store game state
-    session['deck'] = _serialize_deck(deck)
-    session['player_hand'] = _serialize_hand(player_hand)
-    session['dealer_hand'] = _serialize_hand(dealer_hand)
-    
-    return jsonify({
-        'status': 'success',
-        'player_hand': _format_hand_for_display(player_hand),
-        'dealer_hand': _format_hand_for_display(dealer_hand, hide_first=True),
-        'player_value': player_hand.get_value(),
-        'dealer_value': dealer_hand.get_value() if len(dealer_hand.cards) == 2 and dealer_hand.is_blackjack() else '?',
-        'game_message': game_message
-    })
+    return jsonify(game_service.place_bet(session, int(data.get('bet_amount', 0))))
 
 @app.route('/hit', methods=['POST'])
 def hit():
     """Player hits"""
-    if not session.get('game_active', False):
-        return jsonify({'status': 'error', 'message': 'No active game'})
-    
-    # Reconstruct game state
-    deck = _deserialize_deck(session['deck'])
-    player_hand = _deserialize_hand(session['player_hand'])
-    dealer_hand = _deserialize_hand(session['dealer_hand'])
-    
-    # Deal card to player
-    player_hand.add_card(deck.deal(1))
-    
-    # Update session
-    session['deck'] = _serialize_deck(deck)
-    session['player_hand'] = _serialize_hand(player_hand)
-    
-    player_value = player_hand.get_value()
-    
-    if player_value > BLACKJACK:
-        # Player busted
-        session['games_played'] += 1
-        session['game_active'] = False
-        return jsonify({
-            'status': 'game_over',
-            'player_hand': _format_hand_for_display(player_hand),
-            'dealer_hand': _format_hand_for_display(dealer_hand, show_all=True),
-            'player_value': player_value,
-            'dealer_value': dealer_hand.get_value(),
-            'message': '💥 You busted! Dealer wins.',
-            'result': 'lose'
-        })
-    
-    return jsonify({
-        'status': 'continue',
-        'player_hand': _format_hand_for_display(player_hand),
-        'player_value': player_value,
-        'can_hit': player_value < BLACKJACK
-    })
+    return jsonify(game_service.hit(session))
 
 @app.route('/stand', methods=['POST'])
 def stand():
     """Player stands"""
-    if not session.get('game_active', False):
-        return jsonify({'status': 'error', 'message': 'No active game'})
-    
-    # Reconstruct game state
-    deck = _deserialize_deck(session['deck'])
-    player_hand = _deserialize_hand(session['player_hand'])
-    dealer_hand = _deserialize_hand(session['dealer_hand'])
-    
-    # Dealer's turn
-    while dealer_hand.get_value() < DEALER_STAND:
-        dealer_hand.add_card(deck.deal(1))
-    
-    player_value = player_hand.get_value()
-    dealer_value = dealer_hand.get_value()
-    
-    # Determine winner
-    result, message = _determine_winner(player_hand, dealer_hand)
-    
-    # Update session
-    session['games_played'] += 1
-    if result == 'win':
-        session['games_won'] += 1
-        if player_hand.is_blackjack():
-            session['blackjacks'] += 1
-            # Return bet + 1.5x winnings (total = bet + 1.5*bet = 2.5*bet)
-            session['player_money'] += session['current_bet'] + int(session['current_bet'] * 1.5)
-        else:
-            session['player_money'] += session['current_bet'] * 2
-    elif result == 'tie':
-        session['player_money'] += session['current_bet']
-    
-    session['current_bet'] = 0
-    session['game_active'] = False
-    
-    return jsonify({
-        'status': 'game_over',
-        'player_hand': _format_hand_for_display(player_hand),
-        'dealer_hand': _format_hand_for_display(dealer_hand, show_all=True),
-        'player_value': player_value,
-        'dealer_value': dealer_value,
-        'message': message,
-        'result': result,
-        'player_money': session['player_money']
-    })
+    return jsonify(game_service.stand(session))
+
+@app.route('/play_batch', methods=['POST'])
+def play_batch():
+    """Play many hands with a strategy or script and stream the results as NDJSON"""
+    data = request.get_json()
+    error, lines = game_service.play_batch(
+        session, int(data.get('bet_amount', 0)), data.get('hands'), data.get('strategy', 'dealer'), data.get('script')
+    )
+    if error:
+        return jsonify(error)
+    return app.response_class(lines, mimetype='application/x-ndjson')
+
+@app.route('/table/<table_id>')
+def table_state(table_id):
+    """Everything on a shared table"""
+    return jsonify(game_service.table_state(session, table_id))
+
+@app.route('/table/<table_id>/join', methods=['POST'])
+def join_table(table_id):
+    """Take a seat at a shared table"""
+    return jsonify(game_service.join_table(session, table_id))
+
+@app.route('/table/<table_id>/leave', methods=['POST'])
+def leave_table(table_id):
+    """Leave your table between rounds"""
+    return jsonify(game_service.leave_table(session, table_id))
+
+@app.route('/table/<table_id>/bet', methods=['POST'])
+def table_bet(table_id):
+    """Bet at your table"""
+    data = request.get_json()
+    return jsonify(game_service.table_bet(session, table_id, int(data.get('bet_amount', 0))))
+
+@app.route('/table/<table_id>/hit', methods=['POST'])
+def table_hit(table_id):
+    """Hit at your table"""
+    return jsonify(game_service.table_hit(session, table_id))
+
+@app.route('/table/<table_id>/stand', methods=['POST'])
+def table_stand(table_id):
+    """Stand at your table"""
+    return jsonify(game_service.table_stand(session, table_id))
 
 @app.route('/get_stats')
 def get_stats():
     """Get player statistics"""
-    return jsonify({
-        'player_name': session.get('player_name', 'Player'),
-        'player_money': session.get('player_money', 0),
-        'games_played': session.get('games_played', 0),
-        'games_won': session.get('games_won', 0),
-        'blackjacks': session.get('blackjacks', 0),
-        'win_rate': round((session.get('games_won', 0) / max(session.get('games_played', 1), 1)) * 100, 1)
-    })
+    return jsonify(game_service.get_stats(session))
+
+@app.route('/hint')
+def get_hint():
+    """Best play for the current hand, with the expected value of each option"""
+    return jsonify(game_service.hint(session))
 
 @app.route('/leaderboard')
 def get_leaderboard():
-    """Get leaderboard data"""
-    leaderboard = Leaderboard()
-    # Add cache control headers to prevent caching
-    response = jsonify(leaderboard.leaderboard)
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    """Get leaderboard data, the top entries or a page given by limit and offset"""
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    error = game_service.check_leaderboard_page(limit, offset)
+    if error:
+        return jsonify(error)
+
+    body, etag = game_service.leaderboard_snapshot(limit, offset)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients may keep a copy but must revalidate it, which costs a 304 when unchanged
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/leaderboard/rank/<name>')
+def get_leaderboard_rank(name):
+    """Get a player's rank and the players around them"""
+    return jsonify(game_service.leaderboard_rank(name, request.args.get('radius', 2, type=int)))
 
 @app.route('/save_to_leaderboard', methods=['POST'])
 def save_to_leaderboard():
     """Save current player to leaderboard"""
-    if session.get('games_played', 0) == 0:
-        return jsonify({'status': 'error', 'message': 'No games played yet'})
-    
-    # Create player object
-    player = Player(session.get('player_name', 'Player'))
-    player.money = session.get('player_money', 0)
-    player.games_played = session.get('games_played', 0)
-    player.games_won = session.get('games_won', 0)
-    player.blackjacks = session.get('blackjacks', 0)
-    
-    # Add to leaderboard
-    leaderboard = Leaderboard()
-    leaderboard.add_player(player)
-    
-    return jsonify({'status': 'success', 'message': 'Score saved to leaderboard!'})
-
-# Helper methods
-def _serialize_deck(deck):
-    """Serialize deck for session storage"""
-    return [{'suit': card.suit, 'rank': card.rank, 'value': card.value} for card in deck.cards]
-
-def _deserialize_deck(deck_data):
-    """Deserialize deck from session storage"""
-    deck = Deck()
-    deck.cards = []
-    for card_data in deck_data:
-        rank_data = {'rank': card_data['rank'], 'value': card_data['value']}
-        deck.cards.append(Card(card_data['suit'], rank_data))
-    return deck
-
-def _serialize_hand(hand):
-    """Serialize hand for session storage"""
-    return {
-        'cards': [{'suit': card.suit, 'rank': card.rank, 'value': card.value} for card in hand.cards],
-        'dealer': hand.dealer
-    }
-
-def _deserialize_hand(hand_data):
-    """Deserialize hand from session storage"""
-    hand = Hand(dealer=hand_data['dealer'])
-    for card_data in hand_data['cards']:
-        rank_data = {'rank': card_data['rank'], 'value': card_data['value']}
-        hand.cards.append(Card(card_data['suit'], rank_data))
-    return hand
-
-def _format_hand_for_display(hand, hide_first=False, show_all=False):
-    """Format hand for display"""
-    cards = []
-    for i, card in enumerate(hand.cards):
-        if hide_first and i == 0 and not show_all and not hand.is_blackjack():
-            cards.append({'display': '🂠 Hidden', 'suit': 'hidden', 'rank': 'hidden'})
-        else:
-            suit_symbol = _get_suit_symbol(card.suit)
-            cards.append({
-                'display': f'{suit_symbol}{card.rank}',
-                'suit': card.suit,
-                'rank': card.rank
-            })
-    return cards
-
-def _get_suit_symbol(suit):
-    """Get Unicode suit symbol"""
-    symbols = {
-        'hearts': '♥',
-        'diamonds': '♦',
-        'clubs': '♣',
-        'spades': '♠'
-    }
-    return symbols.get(suit, suit)
-
-def _check_initial_blackjack(player_hand, dealer_hand):
-    """Check for initial blackjack"""
-    if player_hand.is_blackjack() and dealer_hand.is_blackjack():
-        return "🤝 Both have blackjack! It's a tie."
-    elif player_hand.is_blackjack():
-        return "🎰 BLACKJACK! You win 1.5x your bet!"
-    elif dealer_hand.is_blackjack():
-        return "😱 Dealer has blackjack! Dealer wins."
-    return ""
+    return jsonify(game_service.save_to_leaderboard(session))
 
-def _determine_winner(player_hand, dealer_hand):
-    """Determine game winner"""
-    player_value = player_hand.get_value()
-    dealer_value = dealer_hand.get_value()
-    
-    if dealer_value > BLACKJACK:
-        return 'win', '🎉 Dealer busted! You win!'
-    elif player_value > dealer_value:
-        return 'win', '🎉 You win!'
-    elif player_value < dealer_value:
-        return 'lose', '😔 Dealer wins!'
-    else:
-        return 'tie', '🤝 It\'s a tie!'
+@app.route('/metrics')
+def get_metrics():
+    """Route and phase latencies in the Prometheus text format"""
+    if not metrics.enabled:
+        return 'Metrics are off; set BLACKJACK_METRICS=1 to turn them on\n', 404, {'Content-Type': 'text/plain'}
+    return metrics.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
 
 if __name__ == '__main__':
-    import os
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,494 @@
+"""ASGI version of the web app, for serving many concurrent tables.
+
+Same routes and JSON as app.py, built on the shared game_service actions.
+Sessions use the same signed cookie as Flask, so a player can move between
+the two apps. Leaderboard reads and writes, strategy hints, batches of
+hands, and round store access other than the in-process store run in a
+thread pool, so one slow request never holds up the event loop.
+
+It also has a WebSocket game channel at /ws: the page opens one
+connection and sends small action messages over it instead of a request
+per action, and gets back only what changed (see GameChannel).
+
+Run it with any ASGI server, e.g.
+
+    uvicorn asgi_app:app --port 5000
+"""
+import asyncio
+import hashlib
+import json
+import os
+import traceback
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from flask.json.tag import TaggedJSONSerializer
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+import game_service
+import metrics
+
+SESSION_COOKIE = "session"
+SESSION_MAX_AGE = 31 * 24 * 60 * 60  # Flask's PERMANENT_SESSION_LIFETIME
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+# The signing Flask's SecureCookieSessionInterface uses, so cookies work in both apps;
+# cookies signed with a fallback key are accepted, and new ones signed with the current key
+_serializer = URLSafeTimedSerializer(
+    [*game_service.SECRET_KEY_FALLBACKS, game_service.SECRET_KEY],
+    salt="cookie-session",
+    serializer=TaggedJSONSerializer(),
+    signer_kwargs={"key_derivation": "hmac", "digest_method": hashlib.sha1},
+)
+
+
+class Session(dict):
+    """Session data that remembers whether it needs to be sent back"""
+
+    modified = False
+
+    def __setitem__(self, key, value):
+        self.modified = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.modified = True
+        super().__delitem__(key)
+
+    def pop(self, key, *default):
+        self.modified = True
+        return super().pop(key, *default)
+
+    def popitem(self):
+        self.modified = True
+        return super().popitem()
+
+    def clear(self):
+        self.modified = True
+        super().clear()
+
+    def update(self, *args, **kwargs):
+        self.modified = True
+        super().update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        self.modified = True
+        return super().setdefault(key, default)
+
+
+def load_session_token(token):
+    """Session data from a signed cookie value, or None if it doesn't verify"""
+    try:
+        return _serializer.loads(token, max_age=SESSION_MAX_AGE)
+    except BadSignature:
+        return None
+
+
+class Request:
+    def __init__(self, scope, body=b""):
+        self.method = scope.get("method", "GET")
+        self.path = scope["path"]
+        self.query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        self.headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body or b"null")
+
+    def int_arg(self, name, default=None):
+        """Query parameter as an int, or `default` if it's missing or not a number"""
+        try:
+            return int(self.query[name][0])
+        except (KeyError, ValueError):
+            return default
+
+    def load_session(self):
+        start = metrics.clock()
+        cookie = SimpleCookie(self.headers.get("cookie", ""))
+        morsel = cookie.get(SESSION_COOKIE)
+        if morsel is None:
+            return Session()
+        session = Session(load_session_token(morsel.value) or {})
+        metrics.phase("session_load", start)
+        return session
+
+
+class Response:
+    def __init__(self, body=b"", status=200, content_type="application/json", headers=None, stream=None):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.stream = stream  # iterable of str chunks sent after the headers, in place of body
+
+    @classmethod
+    def json(cls, payload, status=200):
+        return cls(json.dumps(payload).encode(), status)
+
+    async def send(self, send, session):
+        headers = [(b"content-type", self.content_type.encode())]
+        headers.extend((name.encode(), value.encode()) for name, value in self.headers.items())
+        if session.modified:
+            start = metrics.clock()
+            cookie = f"{SESSION_COOKIE}={_serializer.dumps(dict(session))}; HttpOnly; Path=/"
+            metrics.phase("session_save", start)
+            headers.append((b"set-cookie", cookie.encode()))
+            headers.append((b"vary", b"Cookie"))
+        if self.stream is None:
+            headers.append((b"content-length", str(len(self.body)).encode()))
+        await send({"type": "http.response.start", "status": self.status, "headers": headers})
+        if self.stream is None:
+            await send({"type": "http.response.body", "body": self.body})
+            return
+        for chunk in self.stream:
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def _run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+async def _round_action(func, *args):
+    """Run a game action, off the event loop if the round store does I/O"""
+    if game_service.round_store_blocking:
+        return await _run_blocking(func, *args)
+    return func(*args)
+
+_pending_pages = {}
+
+async def _leaderboard_page(limit, offset):
+    """Leaderboard page and ETag; polls arriving together share one trip to the thread pool"""
+    key = (limit, offset)
+    task = _pending_pages.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_run_blocking(game_service.leaderboard_snapshot, limit, offset))
+        _pending_pages[key] = task
+        task.add_done_callback(lambda _: _pending_pages.pop(key, None))
+    # Shielded so one poll being cancelled doesn't cancel the others
+    return await asyncio.shield(task)
+
+
+_index_page = None
+
+async def index(request, session):
+    """Main game page"""
+    global _index_page
+    if _index_page is None:
+        with open(TEMPLATE, "rb") as f:
+            _index_page = f.read()
+    return Response(_index_page, content_type="text/html; charset=utf-8")
+
+async def start_game(request, session):
+    """Start a new game"""
+    data = request.json()
+    return Response.json(game_service.start_game(session, data.get("player_name", "Player")))
+
+async def place_bet(request, session):
+    """Place a bet"""
+    data = request.json()
+    return Response.json(await _round_action(game_service.place_bet, session, int(data.get("bet_amount", 0))))
+
+async def hit(request, session):
+    """Player hits"""
+    return Response.json(await _round_action(game_service.hit, session))
+
+async def stand(request, session):
+    """Player stands"""
+    return Response.json(await _round_action(game_service.stand, session))
+
+async def play_batch(request, session):
+    """Play many hands with a strategy or script and stream the results as NDJSON"""
+    data = request.json()
+    # Up to BATCH_MAX_HANDS hands are played before anything is returned, whichever the round store
+    error, lines = await _run_blocking(
+        game_service.play_batch, session, int(data.get("bet_amount", 0)),
+        data.get("hands"), data.get("strategy", "dealer"), data.get("script")
+    )
+    if error:
+        return Response.json(error)
+    return Response(content_type="application/x-ndjson", stream=lines)
+
+async def get_stats(request, session):
+    """Get player statistics"""
+    return Response.json(game_service.get_stats(session))
+
+async def get_hint(request, session):
+    """Best play for the current hand; solving can take a while, so it runs in the thread pool"""
+    return Response.json(await _run_blocking(game_service.hint, session))
+
+async def get_leaderboard(request, session):
+    """Get leaderboard data, the top entries or a page given by limit and offset"""
+    limit = request.int_arg("limit")
+    offset = request.int_arg("offset", 0)
+    error = game_service.check_leaderboard_page(limit, offset)
+    if error:
+        return Response.json(error)
+
+    body, etag = await _leaderboard_page(limit, offset)
+    quoted = f'"{etag}"'
+    headers = {"etag": quoted, "cache-control": "no-cache"}
+    if quoted in request.headers.get("if-none-match", ""):
+        return Response(status=304, headers=headers)
+    return Response(body, headers=headers)
+
+async def get_leaderboard_rank(request, session, name):
+    """Get a player's rank and the players around them"""
+    return Response.json(await _run_blocking(game_service.leaderboard_rank, name, request.int_arg("radius", 2)))
+
+async def save_to_leaderboard(request, session):
+    """Save current player to leaderboard"""
+    return Response.json(await _run_blocking(game_service.save_to_leaderboard, session))
+
+async def table_state(request, session, table_id):
+    """Everything on a shared table"""
+    return Response.json(game_service.table_state(session, table_id))
+
+async def join_table(request, session, table_id):
+    """Take a seat at a shared table"""
+    return Response.json(game_service.join_table(session, table_id))
+
+async def leave_table(request, session, table_id):
+    """Leave your table between rounds"""
+    return Response.json(game_service.leave_table(session, table_id))
+
+async def table_bet(request, session, table_id):
+    """Bet at your table"""
+    data = request.json()
+    return Response.json(game_service.table_bet(session, table_id, int(data.get("bet_amount", 0))))
+
+async def table_hit(request, session, table_id):
+    """Hit at your table"""
+    return Response.json(game_service.table_hit(session, table_id))
+
+async def table_stand(request, session, table_id):
+    """Stand at your table"""
+    return Response.json(game_service.table_stand(session, table_id))
+
+async def get_metrics(request, session):
+    """Route and phase latencies in the Prometheus text format"""
+    if not metrics.enabled:
+        return Response(b"Metrics are off; set BLACKJACK_METRICS=1 to turn them on\n", 404, "text/plain")
+    return Response(metrics.render().encode(), content_type=metrics.CONTENT_TYPE)
+
+async def resume_session(request, session):
+    """Take over a session played on the game channel, so the HTTP routes carry on from it"""
+    data = load_session_token(request.json().get("token", ""))
+    if data is None:
+        return Response.json({'status': 'error', 'message': 'Invalid session token'})
+    session.clear()
+    session.update(data)
+    session.modified = True
+    return Response.json({'status': 'success'})
+
+
+ROUTES = {
+    "/": ("GET", index),
+    "/start_game": ("POST", start_game),
+    "/place_bet": ("POST", place_bet),
+    "/hit": ("POST", hit),
+    "/stand": ("POST", stand),
+    "/play_batch": ("POST", play_batch),
+    "/get_stats": ("GET", get_stats),
+    "/hint": ("GET", get_hint),
+    "/leaderboard": ("GET", get_leaderboard),
+    "/save_to_leaderboard": ("POST", save_to_leaderboard),
+    "/resume_session": ("POST", resume_session),
+    "/metrics": ("GET", get_metrics),
+}
+RANK_PREFIX = "/leaderboard/rank/"
+# /table/<table_id> and /table/<table_id>/<action>
+TABLE_PREFIX = "/table/"
+TABLE_ROUTES = {
+    "": ("GET", table_state),
+    "join": ("POST", join_table),
+    "leave": ("POST", leave_table),
+    "bet": ("POST", table_bet),
+    "hit": ("POST", table_hit),
+    "stand": ("POST", table_stand),
+}
+
+
+_MISSING = object()
+
+def state_changes(last, state):
+    """Message fields turning `last` into `state`.
+
+    "set" holds new or changed values, "add" the items appended to a list
+    (a card dealt to a hand), and "del" the keys that are gone.
+    """
+    changes = {}
+    for key, value in state.items():
+        old = last.get(key, _MISSING)
+        if old == value:
+            continue
+        if isinstance(value, list) and isinstance(old, list) and value[:len(old)] == old:
+            changes.setdefault("add", {})[key] = value[len(old):]
+        else:
+            changes.setdefault("set", {})[key] = value
+    removed = [key for key in last if key not in state]
+    if removed:
+        changes["del"] = removed
+    return changes
+
+
+class GameChannel:
+    """One WebSocket connection's game.
+
+    Clients send {"id": n, "action": name, ...arguments}, with the actions
+    and arguments of the HTTP routes. The state after an action is the
+    route's payload merged over the player's stats; each reply carries the
+    request id and state_changes() from the state last sent on this
+    connection. The session lives here for the whole connection, so no
+    cookie is verified per action. Whenever it changes the reply includes
+    its signed token; a client reconnecting sends {"action": "resume",
+    "token": ...}, and one falling back to HTTP posts it to /resume_session.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.state = {}
+        self.actions = {
+            "start_game": lambda message: game_service.start_game(self.session, message.get("player_name", "Player")),
+            "place_bet": lambda message: _round_action(game_service.place_bet, self.session, int(message.get("bet_amount", 0))),
+            "hit": lambda message: _round_action(game_service.hit, self.session),
+            "stand": lambda message: _round_action(game_service.stand, self.session),
+            "get_stats": lambda message: game_service.get_stats(self.session),
+            "hint": lambda message: _run_blocking(game_service.hint, self.session),
+            "save_to_leaderboard": lambda message: _run_blocking(game_service.save_to_leaderboard, self.session),
+        }
+
+    async def handle(self, message):
+        reply = {"id": message.get("id")}
+        action = message.get("action")
+        if action == "resume":
+            data = load_session_token(message.get("token", ""))
+            if data is None:
+                reply["error"] = "Invalid session token"
+            else:
+                self.session = Session(data)
+                reply.update(self._update(game_service.get_stats(self.session)))
+            return reply
+        if action not in self.actions:
+            reply["error"] = f"Unknown action: {action}"
+            return reply
+
+        self.session.modified = False
+        payload = self.actions[action](message)
+        if asyncio.iscoroutine(payload):
+            payload = await payload
+        reply.update(self._update(payload))
+        if self.session.modified:
+            reply["session"] = _serializer.dumps(dict(self.session))
+        return reply
+
+    def _update(self, payload):
+        state = {**game_service.get_stats(self.session), **payload}
+        changes = state_changes(self.state, state)
+        self.state = state
+        return changes
+
+
+async def websocket_game(scope, receive, send):
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    if scope["path"] != "/ws":
+        await send({"type": "websocket.close", "code": 4404})
+        return
+    channel = GameChannel(Request(scope).load_session())
+    await send({"type": "websocket.accept"})
+    while True:
+        message = await receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        text = message.get("text")
+        if text is None:
+            text = message.get("bytes", b"").decode()
+        try:
+            request = json.loads(text)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            reply = {"id": None, "error": "Messages must be JSON objects"}
+        else:
+            try:
+                reply = await channel.handle(request)
+            except Exception:
+                traceback.print_exc()
+                reply = {"id": request.get("id"), "error": "Internal Server Error"}
+        await send({"type": "websocket.send", "text": json.dumps(reply)})
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+async def _dispatch(request, session):
+    if request.path.startswith(RANK_PREFIX) and request.method == "GET":
+        return await get_leaderboard_rank(request, session, request.path[len(RANK_PREFIX):])
+    arguments = ()
+    if request.path.startswith(TABLE_PREFIX):
+        table_id, _, action = request.path[len(TABLE_PREFIX):].partition("/")
+        route = TABLE_ROUTES.get(action) if table_id else None
+        arguments = (table_id,)
+    else:
+        route = ROUTES.get(request.path)
+    if route is None:
+        return Response(b"Not Found", 404, "text/plain")
+    method, handler = route
+    if request.method != method:
+        return Response(b"Method Not Allowed", 405, "text/plain", {"allow": method})
+    return await handler(request, session, *arguments)
+
+def _route_label(path):
+    """The route pattern a path matches, named as in app.py, for labelling its timing"""
+    if path in ROUTES:
+        return path
+    if path.startswith(RANK_PREFIX):
+        return RANK_PREFIX + "<name>"
+    if path.startswith(TABLE_PREFIX):
+        table_id, _, action = path[len(TABLE_PREFIX):].partition("/")
+        if table_id and action in TABLE_ROUTES:
+            return TABLE_PREFIX + "<table_id>" + (f"/{action}" if action else "")
+    return "unmatched"
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Write any queued leaderboard scores and logged rounds before the server exits
+            if game_service._leaderboard is not None:
+                await _run_blocking(game_service._leaderboard.close)
+            if game_service.round_log is not None:
+                await _run_blocking(game_service.round_log.close)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] == "websocket":
+        await websocket_game(scope, receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    start = metrics.clock()
+    request = Request(scope, await _read_body(receive))
+    session = request.load_session()
+    try:
+        response = await _dispatch(request, session)
+    except Exception:
+        traceback.print_exc()
+        session.modified = False
+        response = Response(b"Internal Server Error", 500, "text/plain")
+    await response.send(send, session)
+    if start:
+        metrics.request(_route_label(request.path), request.method, start)
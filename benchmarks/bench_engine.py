@@ -0,0 +1,110 @@
+"""Benchmarks for the game engine: the deck, hands, whole rounds, the round codec, the leaderboard and shuffling."""
+import random
+
+import pytest
+
+from main import Card, Deck, Shoe, Hand, Player, Leaderboard, SUITS, RANKS, DECK_SIZE
+from round_store import Round
+from shuffler import SecureShuffler, SeededShuffler
+from simulator import Simulator
+
+
+@pytest.mark.benchmark(group="deck")
+def test_deck_construction(benchmark):
+    benchmark(Deck)
+
+@pytest.mark.benchmark(group="deck")
+def test_deck_shuffle(benchmark):
+    benchmark(Deck(rng=random.Random(1)).shuffle)
+
+@pytest.mark.benchmark(group="deck")
+@pytest.mark.parametrize("cards", [1, 4])
+def test_deck_deal(benchmark, cards):
+    # A fresh deck per round, built outside the timing
+    benchmark.pedantic(lambda deck: deck.deal(cards), setup=lambda: ((Deck(rng=random.Random(1)),), {}), rounds=5000)
+
+@pytest.mark.benchmark(group="deck")
+def test_shoe_reshuffle(benchmark):
+    benchmark(Shoe(6, rng=random.Random(1)).reshuffle)
+
+
+@pytest.mark.benchmark(group="hand")
+@pytest.mark.parametrize("size", [2, 4, 7, 11])
+def test_hand_get_value(benchmark, size):
+    # Aces and small cards, so the soft total is worked out as the hand grows
+    cards = [Card(SUITS[index % 4], RANKS[index % 4]) for index in range(size)]
+    hand = Hand()
+    hand.add_card(cards)
+    benchmark(hand.get_value)
+
+@pytest.mark.benchmark(group="hand")
+@pytest.mark.parametrize("size", [2, 4, 7, 11])
+def test_hand_add_cards(benchmark, size):
+    cards = [Card(SUITS[index % 4], RANKS[index % 4]) for index in range(size)]
+
+    def deal():
+        hand = Hand()
+        hand.add_card(cards)
+        return hand.get_value()
+    benchmark(deal)
+
+
+@pytest.mark.benchmark(group="round")
+@pytest.mark.parametrize("decks", [None, 6])
+def test_headless_round(benchmark, decks):
+    simulator = Simulator(record_every=0, rng=random.Random(1), decks=decks)
+    benchmark(simulator.play_round)
+
+@pytest.mark.benchmark(group="round codec")
+@pytest.mark.parametrize("decks", [None, 6])
+def test_round_to_bytes(benchmark, decks):
+    benchmark(_dealt_round(decks).to_bytes)
+
+@pytest.mark.benchmark(group="round codec")
+@pytest.mark.parametrize("decks", [None, 6])
+def test_round_from_bytes(benchmark, decks):
+    benchmark(Round.from_bytes, _dealt_round(decks).to_bytes())
+
+def _dealt_round(decks):
+    deck = Deck(rng=random.Random(1)) if decks is None else Shoe(decks, rng=random.Random(1))
+    player_hand = Hand()
+    dealer_hand = Hand(dealer=True)
+    player_hand.add_card(deck.deal(3))
+    dealer_hand.add_card(deck.deal(2))
+    return Round(deck, player_hand, dealer_hand)
+
+
+@pytest.mark.benchmark(group="leaderboard")
+@pytest.mark.parametrize("entries", [1_000, 20_000])
+def test_leaderboard_add_player(benchmark, tmp_path, entries):
+    """Adding a player to a leaderboard of `entries` players, which saves the whole file"""
+    leaderboard = Leaderboard(str(tmp_path / "leaderboard.json"))
+    rng = random.Random(1)
+    players = []
+    for index in range(entries):
+        player = Player(f"Player{index}")
+        player.games_played = rng.randint(1, 200)
+        player.games_won = rng.randint(0, player.games_played)
+        player.money = rng.randint(0, 5000)
+        players.append(Leaderboard.player_record(player))
+    leaderboard.add_entries(players)
+    newcomer = Player("Newcomer")
+    newcomer.games_played = newcomer.games_won = 1
+
+    def add():
+        # Each round starts with the newcomer missing, so every add inserts a new entry
+        leaderboard._set_entries(players)
+    benchmark.pedantic(leaderboard.add_player, args=(newcomer,), setup=add, rounds=20)
+
+
+@pytest.mark.benchmark(group="shuffle")
+@pytest.mark.parametrize("decks", [1, 6])
+@pytest.mark.parametrize("shuffler", ["random", "secure", "seeded"])
+def test_shuffle(benchmark, shuffler, decks):
+    """Shuffles per second of random.shuffle against the shufflers of shuffler.py"""
+    shuffle = {
+        "random": random.shuffle,
+        "secure": SecureShuffler().shuffle,
+        "seeded": SeededShuffler(1).shuffle,
+    }[shuffler]
+    benchmark(shuffle, bytearray(range(DECK_SIZE)) * decks)
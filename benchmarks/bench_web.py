@@ -0,0 +1,24 @@
+"""Benchmark of a round of requests through the Flask test client."""
+import pytest
+
+from app import app
+
+
+@pytest.fixture
+def client():
+    client = app.test_client()
+    client.post("/start_game", json={"player_name": "Benchmark"})
+    return client
+
+@pytest.mark.benchmark(group="web")
+def test_bet_hit_stand(benchmark, client):
+    def refill():
+        # Keep the bankroll topped up between rounds, outside the timing
+        with client.session_transaction() as session:
+            session["player_money"] = 1000
+
+    def play():
+        client.post("/place_bet", json={"bet_amount": 10})
+        client.post("/hit")
+        client.post("/stand")
+    benchmark.pedantic(play, setup=refill, rounds=500, warmup_rounds=20)
@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+from pytest_benchmark.utils import parse_compare_fail
+
+# Keep the benchmarks' scores and rounds out of the real leaderboard and round log
+_temp_dir = tempfile.TemporaryDirectory()
+os.environ.setdefault("BLACKJACK_LEADERBOARD", os.path.join(_temp_dir.name, "leaderboard.json"))
+os.environ.pop("BLACKJACK_ROUND_LOG", None)
+
+
+def pytest_addoption(parser):
+    parser.addini("benchmark_regression", "how much slower than the baseline a benchmark may get, "
+                  "as for --benchmark-compare-fail", default="min:10%")
+
+def pytest_configure(config):
+    # Runs before pytest-benchmark reads its options
+    if config.getoption("benchmark_compare") and not config.getoption("benchmark_compare_fail"):
+        config.option.benchmark_compare_fail = [parse_compare_fail(config.getini("benchmark_regression"))]
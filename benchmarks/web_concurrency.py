@@ -0,0 +1,215 @@
+"""Requests per second and latency of the Flask and ASGI apps under many players.
+
+Every simulated player starts a game, plays a number of rounds (bet, hit
+to 17, stand, check stats, poll the leaderboard with its ETag) and saves
+the score, all players at once. A third run plays the same games over the
+ASGI app's WebSocket game channel, where stats come with every reply.
+
+Both apps are called in-process so the numbers measure the apps rather
+than a network stack: the ASGI app runs on one event loop, the Flask app
+on a pool of worker threads like a threaded WSGI server. Latency is
+measured from when the player sends a request, so it includes any time
+spent waiting for a free worker. Requests that never leave the event
+loop look instant, so compare the total time to play all the games.
+
+    python -m benchmarks.web_concurrency --players 1000 --rounds 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+# Keep the benchmark's scores out of the real leaderboard
+_temp_dir = tempfile.TemporaryDirectory()
+os.environ.setdefault("BLACKJACK_LEADERBOARD", os.path.join(_temp_dir.name, "leaderboard.json"))
+
+from werkzeug.test import EnvironBuilder  # noqa: E402
+
+from app import app as flask_app  # noqa: E402
+from asgi_app import app as asgi_app  # noqa: E402
+
+
+def asgi_caller():
+    async def call(method, path, payload, headers):
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http", "method": method, "path": path, "query_string": query.encode(),
+            "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        }
+        body = json.dumps(payload).encode() if payload is not None else b""
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi_app(scope, receive, send)
+        response_headers = {name.decode(): value.decode() for name, value in messages[0]["headers"]}
+        return messages[0]["status"], response_headers, messages[1]["body"]
+    return call
+
+def flask_caller(threads):
+    pool = ThreadPoolExecutor(max_workers=threads)
+
+    def wsgi_call(method, path, payload, headers):
+        environ = EnvironBuilder(path=path, method=method, json=payload, headers=headers).get_environ()
+        result = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            result["status"] = int(status.split()[0])
+            result["headers"] = {name.lower(): value for name, value in response_headers}
+
+        body = b"".join(flask_app.wsgi_app(environ, start_response))
+        return result["status"], result["headers"], body
+
+    async def call(method, path, payload, headers):
+        return await asyncio.get_running_loop().run_in_executor(pool, wsgi_call, method, path, payload, headers)
+    return call
+
+
+class ChannelConnection:
+    """A WebSocket connection to the ASGI app's game channel, run in-process"""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.replies = asyncio.Queue()
+        self.state = {}
+        self.next_id = 1
+
+    async def open(self):
+        async def send(message):
+            if message["type"] == "websocket.send":
+                await self.replies.put(json.loads(message["text"]))
+
+        await self.incoming.put({"type": "websocket.connect"})
+        scope = {"type": "websocket", "path": "/ws", "headers": []}
+        self.task = asyncio.ensure_future(asgi_app(scope, self.incoming.get, send))
+
+    async def call(self, action, **arguments):
+        await self.incoming.put({"type": "websocket.receive", "text": json.dumps({"id": self.next_id, "action": action, **arguments})})
+        self.next_id += 1
+        reply = await self.replies.get()
+        self.state.update(reply.get("set", {}))
+        for key, items in reply.get("add", {}).items():
+            self.state[key] = self.state[key] + items
+        for key in reply.get("del", []):
+            del self.state[key]
+        return dict(self.state)
+
+    async def close(self):
+        await self.incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await self.task
+
+
+async def play(call, name, rounds, latencies):
+    cookie = None
+    etag = None
+
+    async def request(method, path, payload=None, headers=None):
+        nonlocal cookie
+        headers = dict(headers or {})
+        if cookie:
+            headers["Cookie"] = f"session={cookie}"
+        start = time.perf_counter()
+        status, response_headers, body = await call(method, path, payload, headers)
+        latencies[path].append(time.perf_counter() - start)
+        if "set-cookie" in response_headers:
+            cookie = SimpleCookie(response_headers["set-cookie"])["session"].value
+        return status, response_headers, body
+
+    async def request_json(method, path, payload=None):
+        return json.loads((await request(method, path, payload))[2])
+
+    await request_json("POST", "/start_game", {"player_name": name})
+    for _ in range(rounds):
+        data = await request_json("POST", "/place_bet", {"bet_amount": 10})
+        if data["status"] == "error":
+            break
+        if not data["game_message"]:
+            value = data["player_value"]
+            while value < 17:
+                data = await request_json("POST", "/hit")
+                if data["status"] != "continue":
+                    break
+                value = data["player_value"]
+            if data["status"] != "game_over":
+                await request_json("POST", "/stand")
+        await request_json("GET", "/get_stats")
+        _, headers, _ = await request("GET", "/leaderboard", headers={"If-None-Match": etag} if etag else None)
+        etag = headers.get("etag", etag)
+    await request_json("POST", "/save_to_leaderboard")
+
+async def play_channel(call, name, rounds, latencies):
+    connection = ChannelConnection()
+    await connection.open()
+    etag = None
+
+    async def action(name, **arguments):
+        start = time.perf_counter()
+        state = await connection.call(name, **arguments)
+        latencies[f"ws {name}"].append(time.perf_counter() - start)
+        return state
+
+    await action("start_game", player_name=name)
+    for _ in range(rounds):
+        data = await action("place_bet", bet_amount=10)
+        if data["status"] == "error":
+            break
+        if not data["game_message"]:
+            value = data["player_value"]
+            while value < 17:
+                data = await action("hit")
+                if data["status"] != "continue":
+                    break
+                value = data["player_value"]
+            if data["status"] != "game_over":
+                await action("stand")
+        # No stats request: every reply already carries them
+        start = time.perf_counter()
+        _, headers, _ = await call("GET", "/leaderboard", None, {"If-None-Match": etag} if etag else {})
+        latencies["/leaderboard"].append(time.perf_counter() - start)
+        etag = headers.get("etag", etag)
+    await action("save_to_leaderboard")
+    await connection.close()
+
+async def run(call, players, rounds, player=play):
+    latencies = defaultdict(list)
+    start = time.perf_counter()
+    await asyncio.gather(*(player(call, f"Player{i}", rounds, latencies) for i in range(players)))
+    return time.perf_counter() - start, latencies
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def report(label, elapsed, latencies):
+    samples = [sample for route in latencies.values() for sample in route]
+    print(f"\n{label}: {len(samples)} requests in {elapsed:.2f}s, {len(samples) / elapsed:,.0f} req/s, "
+          f"p50 {percentile(samples, 0.5) * 1000:.1f} ms, p99 {percentile(samples, 0.99) * 1000:.1f} ms")
+    print(f"  {'route':<22} {'count':>7} {'mean ms':>9} {'p99 ms':>9}")
+    for route, route_samples in sorted(latencies.items()):
+        print(f"  {route:<22} {len(route_samples):>7} {statistics.fmean(route_samples) * 1000:>9.2f} "
+              f"{percentile(route_samples, 0.99) * 1000:>9.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Flask and ASGI apps under many concurrent players")
+    parser.add_argument("--players", type=int, default=1000, help="concurrent players")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds each player plays")
+    parser.add_argument("--threads", type=int, default=32, help="Flask worker threads")
+    args = parser.parse_args()
+
+    print(f"{args.players} players x {args.rounds} rounds")
+    report("ASGI", *asyncio.run(run(asgi_caller(), args.players, args.rounds)))
+    report("ASGI game channel", *asyncio.run(run(asgi_caller(), args.players, args.rounds, play_channel)))
+    report(f"Flask ({args.threads} threads)", *asyncio.run(run(flask_caller(args.threads), args.players, args.rounds)))
+
+if __name__ == "__main__":
+    main()
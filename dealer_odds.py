@@ -0,0 +1,161 @@
+"""Exact dealer final-total probabilities.
+
+For every dealer upcard and shoe of 1-8 decks, the probability of the dealer
+finishing on 17, 18, 19, 20, 21 or busting when drawing to DEALER_STAND.
+Tables are built once, cached on disk in a small binary file and loaded
+lazily on first use:
+
+    from dealer_odds import dealer_outcomes
+    dealer_outcomes(upcard=10, decks=6)   # {17: 0.11, ..., "bust": 0.21}
+
+Card ranks are the values 1-10 with 1 for an ace, as in the shoe counts.
+"""
+import os
+import struct
+from array import array
+
+from main import BLACKJACK, DEALER_STAND, RANKS
+
+MAX_DECKS = 8
+UPCARDS = tuple(range(1, 11))  # ace, 2-9, and any ten-value card
+OUTCOMES = (17, 18, 19, 20, 21, "bust")
+_RANK_KEY = [0] + [1 << (5 * i) for i in range(10)]
+
+CACHE_FILE = os.environ.get(
+    "BLACKJACK_DEALER_ODDS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dealer_odds.bin")
+)
+_MAGIC = b"BJDO"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHHH")  # magic, version, max decks, upcards, outcomes
+
+_tables = None
+
+
+def shoe_counts(decks):
+    """Cards per rank value 1-10 in a full shoe, indexed by value - 1"""
+    counts = [0] * 10
+    for rank in RANKS:
+        counts[(1 if rank["rank"] == "A" else rank["value"]) - 1] += 4 * decks
+    return counts
+
+def _hand_value(hard_total, has_ace):
+    if has_ace and hard_total + 10 <= BLACKJACK:
+        return hard_total + 10
+    return hard_total
+
+def dealer_distribution(upcard, counts, no_blackjack=False):
+    """Final-total probabilities for the dealer drawing from `counts`.
+
+    `counts` is the unseen cards per rank value (1-10), which the hole card
+    is drawn from. With `no_blackjack` the result is conditioned on the
+    dealer not holding a two-card 21, the situation once naturals have been
+    settled. Returns a list ordered like OUTCOMES.
+    """
+    counts = list(counts)
+    # Memoized on the multiset of cards drawn so far, packed 5 bits per rank;
+    # it fixes the dealer's total too, so nothing else goes in the key
+    memo = {}
+
+    def draw(hard_total, has_ace, drawn, first):
+        result = memo.get(drawn)
+        if result is not None:
+            return result
+
+        result = [0.0] * len(OUTCOMES)
+        total_weight = 0
+        for rank in range(1, 11):
+            weight = counts[rank - 1]
+            if weight == 0:
+                continue
+            new_hard = hard_total + rank
+            new_ace = has_ace or rank == 1
+            value = _hand_value(new_hard, new_ace)
+            if first and no_blackjack and value == BLACKJACK:
+                continue
+            total_weight += weight
+            if value >= DEALER_STAND:
+                # Final cards are tallied here rather than with another call
+                result[value - DEALER_STAND if value <= BLACKJACK else -1] += weight
+                continue
+            counts[rank - 1] -= 1
+            sub = draw(new_hard, new_ace, drawn + _RANK_KEY[rank], False)
+            counts[rank - 1] += 1
+            for i in range(len(OUTCOMES)):
+                result[i] += weight * sub[i]
+        if total_weight:
+            result = [p / total_weight for p in result]
+        memo[drawn] = result
+        return result
+
+    return list(draw(upcard, upcard == 1, 0, True))
+
+def build_tables():
+    """Compute every table: [decks - 1][upcard - 1][no_blackjack] -> outcome probabilities"""
+    tables = []
+    for decks in range(1, MAX_DECKS + 1):
+        by_upcard = []
+        for upcard in UPCARDS:
+            counts = shoe_counts(decks)
+            counts[upcard - 1] -= 1
+            by_upcard.append([dealer_distribution(upcard, counts, no_blackjack) for no_blackjack in (False, True)])
+        tables.append(by_upcard)
+    return tables
+
+def save_tables(tables, path=CACHE_FILE):
+    values = array("d", (p for by_upcard in tables for pair in by_upcard for dist in pair for p in dist))
+    if values.itemsize != 8:
+        raise RuntimeError("Unsupported platform: C double is not 8 bytes")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, MAX_DECKS, len(UPCARDS), len(OUTCOMES)))
+        values.tofile(f)
+    os.replace(tmp_path, path)
+
+def load_tables(path=CACHE_FILE):
+    """Read tables written by save_tables, or None if the file is missing or stale"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                return None
+            if _HEADER.unpack(header) != (_MAGIC, _VERSION, MAX_DECKS, len(UPCARDS), len(OUTCOMES)):
+                return None
+            values = array("d")
+            values.fromfile(f, MAX_DECKS * len(UPCARDS) * 2 * len(OUTCOMES))
+    except (OSError, EOFError, struct.error):
+        return None
+
+    n = len(OUTCOMES)
+    flat = [values[i:i + n].tolist() for i in range(0, len(values), n)]
+    return [
+        [[flat[(d * len(UPCARDS) + u) * 2 + c] for c in range(2)] for u in range(len(UPCARDS))]
+        for d in range(MAX_DECKS)
+    ]
+
+def get_tables():
+    """The tables, loaded from the cache file or built and cached on first call"""
+    global _tables
+    if _tables is None:
+        tables = load_tables()
+        if tables is None:
+            tables = build_tables()
+            try:
+                save_tables(tables)
+            except OSError:
+                pass  # read-only install: keep the tables in memory only
+        _tables = tables
+    return _tables
+
+def card_rank(card):
+    """Rank value 1-10 for a Card, with 1 for an ace"""
+    return 1 if card.is_ace else card.value
+
+def dealer_outcomes(upcard, decks=1, no_blackjack=False):
+    """Probability of each dealer final total for an upcard (1-10 or a Card)"""
+    if not isinstance(upcard, int):
+        upcard = card_rank(upcard)
+    if not 1 <= decks <= MAX_DECKS:
+        raise ValueError(f"Decks must be between 1 and {MAX_DECKS}")
+    if upcard not in UPCARDS:
+        raise ValueError("Upcard must be a rank value from 1 (ace) to 10")
+    return dict(zip(OUTCOMES, get_tables()[decks - 1][upcard - 1][int(no_blackjack)]))
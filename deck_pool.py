@@ -0,0 +1,141 @@
+"""A pool of ready-shuffled shoes, refilled by background threads.
+
+Shuffling a six-deck shoe takes over 100us, which the web routes would
+otherwise spend on the request thread whenever a new shoe is built or one
+passes its cut card. Once installed, a pool hands those shoes a buffer it
+shuffled earlier, and its threads shuffle more whenever fewer than
+`low_water` are left. If the pool has run dry the shoe is shuffled on the
+spot, as before, and counted as a miss.
+
+Each buffer is shuffled from a seed of its own in the usual way, so a
+shoe from the pool records a seed that deals it again, as the round log
+relies on. Shoes given their own rng, like the simulator's, never use the
+pool and stay reproducible.
+
+Configured by:
+
+    BLACKJACK_DECK_POOL          shoes kept ready (0 turns the pool off)
+    BLACKJACK_DECK_POOL_THREADS  threads refilling the pool
+    BLACKJACK_DECK_POOL_RNG      how shoes are shuffled: "random", "system" for seeds from
+                                 os.urandom, or "secure" to shuffle from os.urandom outright
+                                 (see shuffler.py), which leaves the shoes with no seed
+
+With BLACKJACK_DECK_POOL=0 and another RNG than "random", a pool of no
+shoes is still installed, so every shoe is shuffled on the spot with it.
+"""
+import os
+import random
+import threading
+from collections import deque
+
+import metrics
+from main import Shoe, SHOE_DECKS, new_shoe
+from shuffler import SecureShuffler
+
+DECK_POOL_SIZE = 32
+DECK_POOL_THREADS = 1
+RNG_SOURCES = {
+    "random": lambda: random,
+    "system": random.SystemRandom,
+    "secure": SecureShuffler,
+}
+
+
+class DeckPool:
+    """Up to `size` shuffled shoes of `decks` decks, as (seed, buffer) pairs"""
+
+    def __init__(self, decks=SHOE_DECKS, size=DECK_POOL_SIZE, low_water=None, threads=DECK_POOL_THREADS, rng=None):
+        if size < 0:
+            raise ValueError("A deck pool can't hold fewer than no shoes")
+        self.decks = decks
+        self.size = size
+        self.low_water = max(size // 2 if low_water is None else low_water, 1)
+        # Anything with getrandbits(), or a shuffler from shuffler.py; None uses the global random module
+        self.rng = rng
+        self.hits = 0
+        self.misses = 0
+        self._ready = deque()
+        self._lock = threading.Lock()
+        self._wanted = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._refill, name=f"deck-pool-{i}", daemon=True) for i in range(threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def __len__(self):
+        return len(self._ready)
+
+    def take(self):
+        """A (seed, buffer) pair, from the pool if it has one ready"""
+        with self._lock:
+            entry = self._ready.popleft() if self._ready else None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            refill = len(self._ready) < self.low_water
+        if refill:
+            with self._wanted:
+                self._wanted.notify()
+        return entry or self._shuffle()
+
+    def fill(self):
+        """Shuffle on this thread until the pool is full"""
+        while not self._closed and self._add(self._shuffle()):
+            pass
+
+    def install(self):
+        """Serve every new shoe and reshuffle of this many decks that has no rng of its own"""
+        Shoe.pools[self.decks] = self
+        return self
+
+    def close(self):
+        if Shoe.pools.get(self.decks) is self:
+            del Shoe.pools[self.decks]
+        with self._wanted:
+            self._closed = True
+            self._wanted.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _shuffle(self):
+        return new_shoe(self.decks, self.rng)
+
+    def _add(self, entry):
+        """Add a shuffled shoe unless the pool is already full; returns whether there was room for more"""
+        with self._lock:
+            if len(self._ready) < self.size:
+                self._ready.append(entry)
+            return len(self._ready) < self.size
+
+    def _refill(self):
+        while True:
+            with self._wanted:
+                self._wanted.wait_for(lambda: self._closed or len(self._ready) < self.low_water)
+                if self._closed:
+                    return
+            self.fill()
+
+    def _collect_takes(self):
+        return [((("result", "hit"),), self.hits), ((("result", "miss"),), self.misses)]
+
+    def register_metrics(self):
+        """Show the pool's hits, misses and ready shoes at /metrics"""
+        metrics.register("blackjack_deck_pool_takes_total", "counter",
+                         "Shoes taken from the pre-shuffled pool, and those shuffled on the spot because it was empty",
+                         self._collect_takes)
+        metrics.register("blackjack_deck_pool_ready", "gauge", "Shuffled shoes waiting in the pool",
+                         lambda: [((), len(self._ready))])
+        return self
+
+
+def open_deck_pool(decks=SHOE_DECKS):
+    """The pool configured by BLACKJACK_DECK_POOL*, installed and started, or None when it's not needed"""
+    size = max(int(os.environ.get("BLACKJACK_DECK_POOL", DECK_POOL_SIZE)), 0)
+    source = os.environ.get("BLACKJACK_DECK_POOL_RNG", "random")
+    if source not in RNG_SOURCES:
+        raise ValueError(f"BLACKJACK_DECK_POOL_RNG must be one of {', '.join(RNG_SOURCES)}, not {source!r}")
+    if size == 0 and source == "random":
+        return None
+    threads = int(os.environ.get("BLACKJACK_DECK_POOL_THREADS", DECK_POOL_THREADS)) if size else 0
+    return DeckPool(decks, size, threads=threads, rng=RNG_SOURCES[source]()).install().register_metrics()
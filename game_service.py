@@ -0,0 +1,659 @@
+"""Game actions behind the web routes, shared by the Flask and ASGI apps.
+
+Each action takes the player's session (any mutable mapping, such as
+Flask's session or the ASGI app's cookie session) and returns the JSON
+payload for the response. The live shoe and hands are kept in the round
+store under the round ID held in the session.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from main import Shoe, Hand, Player, BLACKJACK, BLACKJACK_PAYOUT, DEALER_STAND, MIN_BET, MAX_BET, SHOE_DECKS, SHOE_PENETRATION, LEADERBOARD_FLUSH_MS, WriteBehindLeaderboard, open_leaderboard
+from round_store import Round, MemoryRoundStore, create_round_store, new_round_id
+from round_token import TokenRoundStore
+import round_log as round_logs
+import deck_pool as deck_pools
+import metrics
+import strategy
+import simulator
+import table as tables
+
+# Signs the session cookie and round tokens; set BLACKJACK_SECRET_KEY in production. Keys
+# being retired go in BLACKJACK_SECRET_KEY_FALLBACKS, comma-separated, and are still accepted
+DEFAULT_SECRET_KEY = 'blackjack_secret_key_2024'
+SECRET_KEY = os.environ.get('BLACKJACK_SECRET_KEY', DEFAULT_SECRET_KEY)
+SECRET_KEY_FALLBACKS = [key for key in os.environ.get('BLACKJACK_SECRET_KEY_FALLBACKS', '').split(',') if key]
+
+def round_token_keys(secret_key, fallbacks):
+    """The keys round tokens may be signed with, current key last.
+
+    The default key is public, and with it anyone could work out the cards
+    still to come from a token, so it's never one of them.
+    """
+    if secret_key == DEFAULT_SECRET_KEY:
+        return []
+    return [key for key in fallbacks if key != DEFAULT_SECRET_KEY] + [secret_key]
+
+# Each session's shoe and current hands, keyed by the round ID kept in the session
+round_store = create_round_store(secret_keys=round_token_keys(SECRET_KEY, SECRET_KEY_FALLBACKS))
+# Whether the round ID is the round itself, as a signed token
+round_tokens = isinstance(round_store, TokenRoundStore)
+# Stores other than the in-process one and tokens do I/O on every get and put
+round_store_blocking = not isinstance(round_store, (MemoryRoundStore, TokenRoundStore))
+shoe_decks = int(os.environ.get('BLACKJACK_DECKS', SHOE_DECKS))
+shoe_penetration = float(os.environ.get('BLACKJACK_PENETRATION', SHOE_PENETRATION))
+# Every finished round, when BLACKJACK_ROUND_LOG names a directory
+round_log = round_logs.open_round_log()
+# Shoes shuffled ahead of time by background threads, unless BLACKJACK_DECK_POOL=0
+deck_pool = deck_pools.open_deck_pool(shoe_decks)
+leaderboard_flush_ms = int(os.environ.get('BLACKJACK_LEADERBOARD_FLUSH_MS', LEADERBOARD_FLUSH_MS))
+
+# One leaderboard per process; the leaderboard routes serve a cached body until its version changes
+_leaderboard = None
+_leaderboard_cache = None  # (version, {(limit, offset): (body, etag)})
+LEADERBOARD_PAGE_MAX = 100
+LEADERBOARD_CACHED_PAGES = 64
+_leaderboard_lock = threading.Lock()
+
+BATCH_MAX_HANDS = 10000
+# The solver behind "perfect" is far too slow to run thousands of hands inside a request
+BATCH_STRATEGIES = {name: play for name, play in simulator.STRATEGIES.items() if name != "perfect"}
+
+
+def start_game(session, player_name):
+    """Start a new game"""
+    session['player_name'] = player_name
+    session['player_money'] = 1000
+    session['games_played'] = 0
+    session['games_won'] = 0
+    session['blackjacks'] = 0
+    session['current_bet'] = 0
+    session['game_active'] = False
+    session.pop('table', None)
+
+    return {
+        'status': 'success',
+        'message': f'Welcome, {player_name}!',
+        'player_money': session['player_money']
+    }
+
+def place_bet(session, bet_amount):
+    """Place a bet and deal a new round"""
+    if session.get('table'):
+        return {'status': 'error', 'message': 'Leave your table first'}
+    if bet_amount > session['player_money'] or bet_amount < 10 or bet_amount > 500:
+        return {
+            'status': 'error',
+            'message': 'Invalid bet amount. Must be between $10 and $500, and not exceed your balance.'
+        }
+
+    session['current_bet'] = bet_amount
+    session['player_money'] -= bet_amount
+    session['game_active'] = True
+
+    # Initialize game, reusing the session's shoe until it passes the cut card
+    game_round = _get_round(session)
+    if game_round is None:
+        session['round_id'] = new_round_id()
+        game_round = _new_round()
+    deck = game_round.deck
+    start = metrics.clock()
+    if deck.start_round():
+        metrics.phase('reshuffle', start)
+
+    player_hand = game_round.player_hand
+    dealer_hand = game_round.dealer_hand
+    player_hand.clear()
+    dealer_hand.clear()
+
+    # Deal initial cards
+    for _ in range(2):
+        player_hand.add_card(deck.deal(1))
+        dealer_hand.add_card(deck.deal(1))
+
+    # Check for initial blackjack
+    game_message = _check_initial_blackjack(player_hand, dealer_hand)
+
+    # Handle blackjack wins immediately
+    if game_message and "BLACKJACK" in game_message and "tie" not in game_message:
+        if player_hand.is_blackjack():
+            # Player wins with blackjack
+            session['games_played'] += 1
+            session['games_won'] += 1
+            session['blackjacks'] += 1
+            # Return bet + 1.5x winnings (total = bet + 1.5*bet = 2.5*bet)
+            payout = session['current_bet'] + int(session['current_bet'] * 1.5)
+            session['player_money'] += payout
+            _log_round(session, game_round, 'win', payout)
+            session['game_active'] = False
+            session['current_bet'] = 0
+        elif dealer_hand.is_blackjack():
+            # Dealer wins with blackjack
+            session['games_played'] += 1
+            _log_round(session, game_round, 'lose', 0)
+            session['game_active'] = False
+            session['current_bet'] = 0
+        elif "tie" in game_message:
+            # Both have blackjack - tie
+            session['games_played'] += 1
+            session['player_money'] += session['current_bet']  # Return bet
+            _log_round(session, game_round, 'tie', session['current_bet'])
+            session['game_active'] = False
+            session['current_bet'] = 0
+
+    # Store game state
+    _save_round(session, game_round)
+
+    return {
+        'status': 'success',
+        'player_hand': format_hand(player_hand),
+        'dealer_hand': format_hand(dealer_hand, hide_first=True),
+        'player_value': player_hand.get_value(),
+        'dealer_value': dealer_hand.get_value() if len(dealer_hand.cards) == 2 and dealer_hand.is_blackjack() else '?',
+        'game_message': game_message
+    }
+
+def hit(session):
+    """Player hits"""
+    game_round = _get_active_round(session)
+    if game_round is None:
+        return {'status': 'error', 'message': 'No active game'}
+    player_hand = game_round.player_hand
+    dealer_hand = game_round.dealer_hand
+
+    # Deal card to player
+    player_hand.add_card(game_round.deck.deal(1))
+
+    player_value = player_hand.get_value()
+
+    if player_value > BLACKJACK:
+        # Player busted
+        session['games_played'] += 1
+        session['game_active'] = False
+        _log_round(session, game_round, 'lose', 0)
+        _save_round(session, game_round)
+        return {
+            'status': 'game_over',
+            'player_hand': format_hand(player_hand),
+            'dealer_hand': format_hand(dealer_hand, show_all=True),
+            'player_value': player_value,
+            'dealer_value': dealer_hand.get_value(),
+            'message': '💥 You busted! Dealer wins.',
+            'result': 'lose'
+        }
+
+    _save_round(session, game_round)
+
+    return {
+        'status': 'continue',
+        'player_hand': format_hand(player_hand),
+        'player_value': player_value,
+        'can_hit': player_value < BLACKJACK
+    }
+
+def stand(session):
+    """Player stands and the dealer plays out the round"""
+    game_round = _get_active_round(session)
+    if game_round is None:
+        return {'status': 'error', 'message': 'No active game'}
+    player_hand = game_round.player_hand
+    dealer_hand = game_round.dealer_hand
+
+    # Dealer's turn
+    while dealer_hand.get_value() < DEALER_STAND:
+        dealer_hand.add_card(game_round.deck.deal(1))
+
+    player_value = player_hand.get_value()
+    dealer_value = dealer_hand.get_value()
+
+    # Determine winner
+    result, message = _determine_winner(player_hand, dealer_hand)
+
+    # Update session
+    money_before = session['player_money']
+    session['games_played'] += 1
+    if result == 'win':
+        session['games_won'] += 1
+        if player_hand.is_blackjack():
+            session['blackjacks'] += 1
+            # Return bet + 1.5x winnings (total = bet + 1.5*bet = 2.5*bet)
+            session['player_money'] += session['current_bet'] + int(session['current_bet'] * 1.5)
+        else:
+            session['player_money'] += session['current_bet'] * 2
+    elif result == 'tie':
+        session['player_money'] += session['current_bet']
+    _log_round(session, game_round, result, session['player_money'] - money_before)
+
+    session['current_bet'] = 0
+    session['game_active'] = False
+    _save_round(session, game_round)
+
+    return {
+        'status': 'game_over',
+        'player_hand': format_hand(player_hand),
+        'dealer_hand': format_hand(dealer_hand, show_all=True),
+        'player_value': player_value,
+        'dealer_value': dealer_value,
+        'message': message,
+        'result': result,
+        'player_money': session['player_money']
+    }
+
+def get_stats(session):
+    """Player statistics"""
+    return {
+        'player_name': session.get('player_name', 'Player'),
+        'player_money': session.get('player_money', 0),
+        'games_played': session.get('games_played', 0),
+        'games_won': session.get('games_won', 0),
+        'blackjacks': session.get('blackjacks', 0),
+        'win_rate': round((session.get('games_won', 0) / max(session.get('games_played', 1), 1)) * 100, 1)
+    }
+
+def hint(session):
+    """Best play for the current hand, with the expected value of each option"""
+    game_round = _get_active_round(session)
+    if game_round is None:
+        return {'status': 'error', 'message': 'No active game'}
+
+    decision = strategy.hint(game_round.player_hand, game_round.dealer_hand, game_round.deck)
+    return {'status': 'success', **decision.to_dict()}
+
+class ScriptStrategy:
+    """Simulator strategy following a script of actions for each hand in turn"""
+
+    def __init__(self, script):
+        self.script = script
+        self.hand = -1
+        self.step = 0
+
+    def next_hand(self):
+        self.hand += 1
+        self.step = 0
+
+    def __call__(self, player_hand, dealer_upcard, deck):
+        actions = self.script[self.hand]
+        if self.step >= len(actions):
+            return simulator.STAND
+        self.step += 1
+        return actions[self.step - 1]
+
+def play_batch(session, bet_amount, hands=None, strategy_name=None, script=None):
+    """Play many hands from the session's shoe with the main.py rules.
+
+    Hands are played by a simulator strategy named by `strategy_name`, or
+    by `script`, a list with the actions ("hit"/"stand") for each hand.
+    Every hand is played and the session updated before anything is
+    returned; the result is (error payload, None) or (None, lines), where
+    lines yields the NDJSON result of each hand and then the session stats.
+    """
+    if 'player_money' not in session:
+        return {'status': 'error', 'message': 'Start a game first'}, None
+    if session.get('game_active', False):
+        return {'status': 'error', 'message': 'Finish the current hand first'}, None
+    if session.get('table'):
+        return {'status': 'error', 'message': 'Leave your table first'}, None
+    if not MIN_BET <= bet_amount <= MAX_BET:
+        return {'status': 'error', 'message': f'Invalid bet amount. Must be between ${MIN_BET} and ${MAX_BET}.'}, None
+
+    if script is not None:
+        if not isinstance(script, list) or not all(
+                isinstance(actions, list) and all(action in (simulator.HIT, simulator.STAND) for action in actions)
+                for actions in script):
+            return {'status': 'error', 'message': 'script must be a list of action lists of "hit" and "stand"'}, None
+        play = ScriptStrategy(script)
+        hands = len(script)
+    elif strategy_name in BATCH_STRATEGIES:
+        play = BATCH_STRATEGIES[strategy_name]
+    else:
+        return {'status': 'error', 'message': f'strategy must be one of {", ".join(BATCH_STRATEGIES)}'}, None
+    if not isinstance(hands, int) or not 1 <= hands <= BATCH_MAX_HANDS:
+        return {'status': 'error', 'message': f'hands must be between 1 and {BATCH_MAX_HANDS}'}, None
+
+    game_round = _get_round(session)
+    if game_round is None:
+        session['round_id'] = new_round_id()
+        game_round = _new_round()
+    table = simulator.Simulator(play, bet_amount, record_every=0, shoe=game_round.deck)
+
+    # (player cards, dealer cards, result, winnings, balance) for each hand
+    results = []
+    player_name = session.get('player_name', 'Player')
+    money = session['player_money']
+    games_won = blackjacks = 0
+    for _ in range(hands):
+        if money < bet_amount:
+            break
+        if script is not None:
+            play.next_hand()
+        result, multiplier = table.play_round()
+        money -= bet_amount
+        winnings = 0
+        if result == 'win':
+            games_won += 1
+            if multiplier == BLACKJACK_PAYOUT:
+                blackjacks += 1
+            winnings = bet_amount + int(bet_amount * multiplier)
+        elif result == 'tie':
+            winnings = bet_amount
+        money += winnings
+        if round_log is not None:
+            round_log.record(player_name, game_round.deck, table.player_hand, table.dealer_hand,
+                             bet_amount, winnings, result, round_logs.BATCH)
+        results.append((list(table.player_hand.cards), list(table.dealer_hand.cards), result, winnings, money))
+
+    session['player_money'] = money
+    session['games_played'] += len(results)
+    session['games_won'] += games_won
+    session['blackjacks'] += blackjacks
+    _save_round(session, game_round)
+    stats = get_stats(session)
+    stopped = 'bankroll' if len(results) < hands else None
+
+    def lines():
+        for number, (player_cards, dealer_cards, result, winnings, balance) in enumerate(results, 1):
+            player_hand = Hand()
+            player_hand.add_card(player_cards)
+            dealer_hand = Hand(dealer=True)
+            dealer_hand.add_card(dealer_cards)
+            yield json.dumps({
+                'hand': number,
+                'player_hand': [card['display'] for card in format_hand(player_hand)],
+                'dealer_hand': [card['display'] for card in format_hand(dealer_hand)],
+                'player_value': player_hand.get_value(),
+                'dealer_value': dealer_hand.get_value(),
+                'result': result,
+                'winnings': winnings,
+                'player_money': balance
+            }) + '\n'
+        yield json.dumps({'status': 'success', 'hands': len(results), 'stopped': stopped, 'stats': stats}) + '\n'
+
+    return None, lines()
+
+def join_table(session, table_id):
+    """Take a seat at a shared table, opening the table if nobody is at it"""
+    if 'player_money' not in session:
+        return {'status': 'error', 'message': 'Start a game first'}
+    if session.get('game_active', False):
+        return {'status': 'error', 'message': 'Finish the current hand first'}
+    if session.get('table'):
+        return {'status': 'error', 'message': 'Leave your table first'}
+
+    player = Player(session.get('player_name', 'Player'))
+    player.money = session['player_money']
+    try:
+        table = tables.get_table(table_id, create=True, round_log=round_log)
+        number, token = table.join(player)
+    except tables.TableError as e:
+        return {'status': 'error', 'message': str(e)}
+
+    # The seat counts games from zero; the session's totals from before are kept alongside
+    session['table'] = {
+        'id': table_id, 'seat': number, 'token': token,
+        'games_played': session['games_played'], 'games_won': session['games_won'], 'blackjacks': session['blackjacks']
+    }
+    return _table_state(table, number)
+
+def leave_table(session, table_id):
+    """Give up the session's seat once its round is over"""
+    table, seated = _seated_table(session, table_id)
+    if table is None:
+        return {'status': 'error', 'message': 'You are not seated at this table'}
+    try:
+        seat = table.leave(seated['seat'], seated['token'])
+    except tables.TableError as e:
+        return {'status': 'error', 'message': str(e)}
+
+    _sync_seat(session, seat)
+    del session['table']
+    tables.close_if_empty(table)
+    return {'status': 'success', 'message': f'You left table {seated["id"]}', 'player_money': session['player_money']}
+
+def table_bet(session, table_id, bet_amount):
+    """Bet at the session's table; the cards are dealt once every seat has bet"""
+    return _table_action(session, table_id, lambda table, number, token: table.bet(number, token, bet_amount))
+
+def table_hit(session, table_id):
+    """Hit at the session's table, on the session's turn"""
+    return _table_action(session, table_id, lambda table, number, token: table.hit(number, token))
+
+def table_stand(session, table_id):
+    """Stand at the session's table, on the session's turn"""
+    return _table_action(session, table_id, lambda table, number, token: table.stand(number, token))
+
+def table_state(session, table_id):
+    """Everything on a table, as anyone can see it"""
+    table = tables.get_table(table_id)
+    if table is None:
+        return {'status': 'error', 'message': 'No such table'}
+    seated = session.get('table')
+    if seated and seated['id'] == table_id:
+        return _table_action(session, table_id, lambda table, number, token: None)
+    return _table_state(table, None)
+
+def save_to_leaderboard(session):
+    """Queue the session's player for the leaderboard"""
+    if session.get('games_played', 0) == 0:
+        return {'status': 'error', 'message': 'No games played yet'}
+
+    # Create player object
+    player = Player(session.get('player_name', 'Player'))
+    player.money = session.get('player_money', 0)
+    player.games_played = session.get('games_played', 0)
+    player.games_won = session.get('games_won', 0)
+    player.blackjacks = session.get('blackjacks', 0)
+
+    # Queue for the leaderboard's background writer
+    get_leaderboard().add_player(player)
+
+    return {'status': 'success', 'message': 'Score saved to leaderboard!'}
+
+def leaderboard_rank(name, radius=2):
+    """A player's rank and the players around them"""
+    radius = min(radius, LEADERBOARD_PAGE_MAX // 2)
+    leaderboard = get_leaderboard()
+    leaderboard.refresh()
+    rank, first, entries = leaderboard.around(name, max(radius, 0))
+    if rank is None:
+        return {'status': 'error', 'message': 'Player not on the leaderboard'}
+
+    around = [{'rank': rank, **entry} for rank, entry in enumerate(entries, first)]
+    return {
+        'status': 'success',
+        'name': name,
+        'rank': rank,
+        'total': len(leaderboard),
+        'around': around
+    }
+
+def check_leaderboard_page(limit, offset):
+    """Error payload for a leaderboard page outside the limits, or None"""
+    if (limit is not None and not 0 <= limit <= LEADERBOARD_PAGE_MAX) or offset < 0:
+        return {'status': 'error', 'message': f'limit must be 0-{LEADERBOARD_PAGE_MAX} and offset at least 0'}
+    return None
+
+def get_leaderboard():
+    """This process's leaderboard, opened on first use"""
+    global _leaderboard
+    with _leaderboard_lock:
+        if _leaderboard is None:
+            _leaderboard = WriteBehindLeaderboard(open_leaderboard(), flush_ms=leaderboard_flush_ms)
+        return _leaderboard
+
+def leaderboard_snapshot(limit=None, offset=0):
+    """Serialized leaderboard page and its ETag, rebuilt only when the leaderboard changes"""
+    global _leaderboard_cache
+    leaderboard = get_leaderboard()
+    with _leaderboard_lock:
+        version = leaderboard.version()
+        if _leaderboard_cache is None or _leaderboard_cache[0] != version:
+            leaderboard.refresh()
+            _leaderboard_cache = (version, {})
+        pages = _leaderboard_cache[1]
+        page = pages.get((limit, offset))
+        if page is None:
+            entries = leaderboard.leaderboard if limit is None else leaderboard.top(limit, offset)
+            body = json.dumps(entries, separators=(',', ':')).encode()
+            page = (body, hashlib.sha1(body).hexdigest())
+            if len(pages) >= LEADERBOARD_CACHED_PAGES:
+                pages.clear()
+            pages[(limit, offset)] = page
+        return page
+
+# Helper methods
+def _log_round(session, game_round, result, payout):
+    """Add a finished round to the round log, if rounds are being logged"""
+    if round_log is not None:
+        round_log.record(session.get('player_name', 'Player'), game_round.deck, game_round.player_hand,
+                         game_round.dealer_hand, session['current_bet'], payout, result)
+
+def _get_round(session):
+    """Look up this session's shoe and hands"""
+    start = metrics.clock()
+    game_round = round_store.get(session.get('round_id', ''))
+    metrics.phase('round_load', start)
+    return game_round
+
+def _save_round(session, game_round):
+    """Keep this session's shoe and hands for its next request"""
+    start = metrics.clock()
+    round_id = round_store.put(session['round_id'], game_round)
+    if round_id != session['round_id']:
+        session['round_id'] = round_id
+    metrics.phase('round_save', start)
+
+def _new_round():
+    """A freshly shuffled shoe and empty hands"""
+    start = metrics.clock()
+    shoe = round_store.new_shoe(shoe_decks, shoe_penetration) if round_tokens else Shoe(shoe_decks, shoe_penetration)
+    game_round = Round(shoe, Hand(), Hand(dealer=True))
+    metrics.phase('deck_build', start)
+    return game_round
+
+def _get_active_round(session):
+    """Look up the live round for this session, if one is in progress"""
+    if not session.get('game_active', False):
+        return None
+    game_round = _get_round(session)
+    if game_round is None:
+        # The round expired from the store
+        session['game_active'] = False
+    return game_round
+
+def _seated_table(session, table_id):
+    """The table and seat the session holds at `table_id`, or (None, None)"""
+    seated = session.get('table')
+    if not seated or seated['id'] != table_id:
+        return None, None
+    table = tables.get_table(table_id)
+    if table is None:
+        # The table was closed, e.g. by a restart
+        session.pop('table', None)
+    return table, seated
+
+def _table_action(session, table_id, action):
+    """Run action(table, seat number, seat token) on the session's seat and return the table"""
+    table, seated = _seated_table(session, table_id)
+    if table is None:
+        return {'status': 'error', 'message': 'You are not seated at this table'}
+    try:
+        action(table, seated['seat'], seated['token'])
+        seat = table.seat(seated['seat'], seated['token'])
+    except tables.TableError as e:
+        if table.seats[seated['seat']] is None or table.seats[seated['seat']].token != seated['token']:
+            # The seat was given up after sitting idle
+            session.pop('table', None)
+        return {'status': 'error', 'message': str(e)}
+
+    _sync_seat(session, seat)
+    return _table_state(table, seated['seat'])
+
+def _sync_seat(session, seat):
+    """Copy a seat's balance and games into the session"""
+    seated = session['table']
+    player = seat.player
+    session['player_money'] = player.money
+    session['games_played'] = seated['games_played'] + player.games_played
+    session['games_won'] = seated['games_won'] + player.games_won
+    session['blackjacks'] = seated['blackjacks'] + player.blackjacks
+
+def _table_state(table, me):
+    """JSON for a table snapshot, marking seat `me` as the caller's"""
+    snapshot = table.snapshot()
+    seats = []
+    for number, seat in enumerate(snapshot['seats']):
+        if seat is not None:
+            seat = {**seat, 'seat': number, 'cards': _format_cards(seat['cards'])}
+        seats.append(seat)
+    return {
+        'status': 'success',
+        'table': table.table_id,
+        'round': snapshot['round'],
+        'phase': snapshot['phase'],
+        'turn': snapshot['turn'],
+        'your_seat': me,
+        'your_turn': me is not None and snapshot['turn'] == me,
+        'seconds_left': None if snapshot['seconds_left'] is None else round(snapshot['seconds_left'], 1),
+        'dealer_hand': _format_cards(snapshot['dealer_cards']),
+        'dealer_value': snapshot['dealer_value'] if snapshot['dealer_value'] is not None else '?',
+        'seats': seats
+    }
+
+def _format_cards(cards):
+    """Format a list of cards for display, None being a face-down card"""
+    return [
+        {'display': '🂠 Hidden', 'suit': 'hidden', 'rank': 'hidden'} if card is None else
+        {'display': f'{_get_suit_symbol(card.suit)}{card.rank}', 'suit': card.suit, 'rank': card.rank}
+        for card in cards
+    ]
+
+def format_hand(hand, hide_first=False, show_all=False):
+    """Format hand for display"""
+    cards = []
+    for i, card in enumerate(hand.cards):
+        if hide_first and i == 0 and not show_all and not hand.is_blackjack():
+            cards.append({'display': '🂠 Hidden', 'suit': 'hidden', 'rank': 'hidden'})
+        else:
+            suit_symbol = _get_suit_symbol(card.suit)
+            cards.append({
+                'display': f'{suit_symbol}{card.rank}',
+                'suit': card.suit,
+                'rank': card.rank
+            })
+    return cards
+
+def _get_suit_symbol(suit):
+    """Get Unicode suit symbol"""
+    symbols = {
+        'hearts': '♥',
+        'diamonds': '♦',
+        'clubs': '♣',
+        'spades': '♠'
+    }
+    return symbols.get(suit, suit)
+
+def _check_initial_blackjack(player_hand, dealer_hand):
+    """Check for initial blackjack"""
+    if player_hand.is_blackjack() and dealer_hand.is_blackjack():
+        return "🤝 Both have blackjack! It's a tie."
+    elif player_hand.is_blackjack():
+        return "🎰 BLACKJACK! You win 1.5x your bet!"
+    elif dealer_hand.is_blackjack():
+        return "😱 Dealer has blackjack! Dealer wins."
+    return ""
+
+def _determine_winner(player_hand, dealer_hand):
+    """Determine game winner"""
+    player_value = player_hand.get_value()
+    dealer_value = dealer_hand.get_value()
+
+    if dealer_value > BLACKJACK:
+        return 'win', '🎉 Dealer busted! You win!'
+    elif player_value > dealer_value:
+        return 'win', '🎉 You win!'
+    elif player_value < dealer_value:
+        return 'lose', '😔 Dealer wins!'
+    else:
+        return 'tie', '🤝 It\'s a tie!'
@@ -0,0 +1,316 @@
+"""Load generator: many virtual players playing against a running web app.
+
+Each player starts a game and plays rounds the way the page does: bet,
+hit or stand by a strategy, then fetch the stats, waiting a think time
+between requests. When a player can't cover their next bet they start a
+new game. Players keep their own session cookie and share a pool of
+keep-alive HTTP/1.1 connections, all on one event loop, so thousands of
+them need only one process.
+
+    python app.py &
+    python loadgen.py http://localhost:5000 --players 2000 --rounds 20 --think exp:0.5 --seed 7
+
+Every player draws their bets and think times from random streams seeded
+by --seed and their number, so a scenario can be run again. The cards come
+from the server, so the hits and the requests they lead to can still differ.
+
+The report gives the throughput, the error rate and latency quantiles for
+each route. A request counts as an error if it fails, gets an HTTP error or
+gets a JSON reply with "status": "error".
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+import metrics
+from main import DEALER_STAND, MIN_BET
+
+REQUEST_TIMEOUT = 30  # seconds
+# Hit below these totals; "hint" asks the server's /hint route instead
+STRATEGIES = {"dealer": DEALER_STAND, "never_bust": 12, "stand": 0, "hint": None}
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.open = True
+
+    async def request(self, method, target, host, body=b"", headers=()):
+        """(status, headers with lowercase names, body)"""
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {host}", f"Content-Length: {len(body)}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by the server")
+        version, status = status_line.split(None, 2)[:2]
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                chunks.append(await self.reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            response_body = b"".join(chunk[:-2] for chunk in chunks)
+        elif "content-length" in response_headers:
+            response_body = await self.reader.readexactly(int(response_headers["content-length"]))
+        else:
+            response_body = await self.reader.read()
+            self.open = False
+
+        connection = response_headers.get("connection", "").lower()
+        if connection == "close" or (version == b"HTTP/1.0" and connection != "keep-alive"):
+            self.open = False
+        return int(status), response_headers, response_body
+
+    def close(self):
+        self.open = False
+        self.writer.close()
+
+
+class ConnectionPool:
+    """Up to `size` connections to one server, handed out one request at a time"""
+
+    def __init__(self, host, port, size):
+        self.host = host
+        self.port = port
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+
+    async def request(self, method, target, body=b"", headers=()):
+        async with self.slots:
+            connection = self.idle.pop() if self.idle else None
+            if connection is None:
+                connection = Connection(*await asyncio.open_connection(self.host, self.port))
+            try:
+                result = await asyncio.wait_for(
+                    connection.request(method, target, f"{self.host}:{self.port}", body, headers), REQUEST_TIMEOUT)
+            except BaseException:
+                connection.close()
+                raise
+            if connection.open:
+                self.idle.append(connection)
+            else:
+                connection.close()
+            return result
+
+    def close(self):
+        while self.idle:
+            self.idle.pop().close()
+
+
+def think_time(spec):
+    """A function of a Random giving think times in seconds, from "0", "fixed:S", "uniform:LOW:HIGH" or "exp:MEAN" """
+    kind, _, arguments = spec.partition(":")
+    values = [float(value) for value in arguments.split(":")] if arguments else []
+    if kind in ("0", "none"):
+        return lambda rng: 0.0
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if kind == "exp" and len(values) == 1 and values[0] > 0:
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise ValueError(f"think time must be 0, fixed:S, uniform:LOW:HIGH or exp:MEAN, not {spec!r}")
+
+def bet_range(spec):
+    """(lowest, highest) bet from "10" or "10-100" """
+    low, _, high = spec.partition("-")
+    low = int(low)
+    high = int(high) if high else low
+    if not MIN_BET <= low <= high:
+        raise ValueError(f"bets must be at least {MIN_BET}, as LOW or LOW-HIGH, not {spec!r}")
+    return low, high
+
+
+class Results:
+    """Latencies, request counts and errors by route"""
+
+    def __init__(self):
+        self.latencies = {}  # route -> metrics.Histogram of nanoseconds
+        self.requests = Counter()
+        self.errors = Counter()
+        self.error_messages = Counter()
+        self.rounds = 0
+        self.elapsed = 0.0
+
+    def add(self, route, nanoseconds, error=None):
+        histogram = self.latencies.get(route)
+        if histogram is None:
+            histogram = self.latencies[route] = metrics.Histogram()
+        histogram.record(nanoseconds)
+        self.requests[route] += 1
+        if error is not None:
+            self.errors[route] += 1
+            self.error_messages[f"{route}: {error}"] += 1
+
+    def summary(self):
+        total = sum(self.requests.values())
+        errors = sum(self.errors.values())
+        return {
+            "seconds": round(self.elapsed, 3),
+            "rounds": self.rounds,
+            "requests": total,
+            "requests_per_second": round(total / self.elapsed, 1) if self.elapsed else 0.0,
+            "error_rate": round(errors / total * 100, 3) if total else 0.0,
+            "routes": {
+                route: {
+                    "requests": self.requests[route],
+                    "errors": self.errors[route],
+                    **{f"p{fraction * 100:g}_ms": round(histogram.quantile(fraction) / 1e6, 3) for fraction in metrics.QUANTILES},
+                    "max_ms": round(histogram.quantile(1.0) / 1e6, 3),
+                }
+                for route, histogram in sorted(self.latencies.items())
+            },
+            "top_errors": dict(self.error_messages.most_common(5)),
+        }
+
+
+class VirtualPlayer:
+    """One player with their own cookie jar and random streams"""
+
+    def __init__(self, pool, results, name, seed, strategy="dealer", think=think_time("0"), bets=(MIN_BET, MIN_BET)):
+        self.pool = pool
+        self.results = results
+        self.name = name
+        self.cookies = SimpleCookie()
+        # Separate streams, so the bets don't shift with the number of requests a round takes
+        self.bet_rng = random.Random(f"{seed}/{name}/bets")
+        self.think_rng = random.Random(f"{seed}/{name}/think")
+        self.hit_below = STRATEGIES[strategy]
+        self.think = think
+        self.bets = bets
+
+    async def call(self, method, path, payload=None):
+        """The JSON reply, or None if the request failed; the time to think follows every request"""
+        headers = [("Accept", "application/json")]
+        body = b""
+        if payload is not None:
+            body = json.dumps(payload).encode()
+            headers.append(("Content-Type", "application/json"))
+        if self.cookies:
+            headers.append(("Cookie", "; ".join(f"{key}={morsel.value}" for key, morsel in self.cookies.items())))
+        route = f"{method} {path.partition('?')[0]}"
+        start = time.perf_counter_ns()
+        data = error = None
+        try:
+            status, response_headers, response_body = await self.pool.request(method, path, body, headers)
+            if "set-cookie" in response_headers:
+                self.cookies.load(response_headers["set-cookie"])
+            if status >= 400:
+                error = f"HTTP {status}"
+            else:
+                data = json.loads(response_body)
+                if data.get("status") == "error":
+                    error = data.get("message", "error")
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            error = type(e).__name__
+        self.results.add(route, time.perf_counter_ns() - start, error)
+        pause = self.think(self.think_rng)
+        if pause:
+            await asyncio.sleep(pause)
+        return None if error else data
+
+    async def play(self, rounds):
+        money = (await self.call("POST", "/start_game", {"player_name": self.name}) or {}).get("player_money", 0)
+        for _ in range(rounds):
+            bet = self.bet_rng.randint(*self.bets)
+            if money < bet:
+                # Broke: buy back in with a new game
+                money = (await self.call("POST", "/start_game", {"player_name": self.name}) or {}).get("player_money", 0)
+            data = await self.call("POST", "/place_bet", {"bet_amount": bet})
+            if data is not None and not data.get("game_message"):
+                while data is not None and await self.wants_card(data):
+                    data = await self.call("POST", "/hit")
+                    if data is None or data["status"] != "continue":
+                        break
+                else:
+                    await self.call("POST", "/stand")
+            self.results.rounds += 1
+            money = (await self.call("GET", "/get_stats") or {}).get("player_money", money)
+
+    async def wants_card(self, data):
+        if self.hit_below is None:
+            hint = await self.call("GET", "/hint")
+            return hint is not None and hint["action"] == "hit"
+        return data["player_value"] < self.hit_below
+
+
+async def run(url, players, rounds, seed=0, strategy="dealer", think="0", bets="10", connections=100, ramp=0.0):
+    """Play `rounds` rounds with each of `players` virtual players against the app at `url`; returns Results"""
+    parts = urlsplit(url)
+    if parts.scheme != "http" or not parts.hostname:
+        raise ValueError(f"need an http:// URL, not {url!r}")
+    think = think_time(think)
+    bets = bet_range(bets)
+    pool = ConnectionPool(parts.hostname, parts.port or 80, connections)
+    results = Results()
+
+    async def player(index):
+        if ramp:
+            await asyncio.sleep(ramp * index / players)
+        await VirtualPlayer(pool, results, f"Load{index}", seed, strategy, think, bets).play(rounds)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(player(index) for index in range(players)))
+    finally:
+        pool.close()
+    results.elapsed = time.perf_counter() - start
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many virtual players against a running blackjack web app")
+    parser.add_argument("url", nargs="?", default="http://localhost:5000", help="the app to play against")
+    parser.add_argument("--players", type=int, default=100, help="virtual players playing at once")
+    parser.add_argument("--rounds", type=int, default=10, help="rounds each player plays")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="dealer", help="when players hit")
+    parser.add_argument("--think", default="0", help="think time after each request: 0, fixed:S, uniform:LOW:HIGH or exp:MEAN seconds")
+    parser.add_argument("--bets", default=str(MIN_BET), help="bet for each round, or a range LOW-HIGH to draw from")
+    parser.add_argument("--seed", type=int, default=0, help="seeds every player's bets and think times")
+    parser.add_argument("--connections", type=int, default=100, help="most connections open to the app at once")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which to start the players")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        results = asyncio.run(run(args.url, args.players, args.rounds, args.seed, args.strategy, args.think,
+                                  args.bets, args.connections, args.ramp))
+    except ValueError as e:
+        parser.error(str(e))
+    summary = results.summary()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{args.players} players x {args.rounds} rounds: {summary['rounds']:,} rounds, {summary['requests']:,} requests "
+          f"in {summary['seconds']:.2f}s, {summary['requests_per_second']:,.0f} req/s, {summary['error_rate']}% errors")
+    quantiles = [f"p{fraction * 100:g}" for fraction in metrics.QUANTILES]
+    print(f"  {'route':<20} {'requests':>9} {'errors':>7} " + " ".join(f"{name + ' ms':>10}" for name in quantiles) + f" {'max ms':>10}")
+    for route, stats in summary["routes"].items():
+        print(f"  {route:<20} {stats['requests']:>9,} {stats['errors']:>7,} "
+              + " ".join(f"{stats[name + '_ms']:>10.2f}" for name in quantiles) + f" {stats['max_ms']:>10.2f}")
+    for message, count in summary["top_errors"].items():
+        print(f"  {count:>7,} x {message}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
+import atexit
+import bisect
+import queue
 import random
 import json
 import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
 from datetime import datetime
 
 # Constants
@@ -9,76 +17,232 @@ DEALER_STAND = 17
 STARTING_MONEY = 1000
 MIN_BET = 10
 MAX_BET = 500
+BLACKJACK_PAYOUT = 1.5
+SHOE_DECKS = 6
+SHOE_PENETRATION = 0.75  # share of the shoe dealt before the cut card comes out
+LEADERBOARD_SIZE = 10
+LEADERBOARD_FLUSH_MS = 250  # least time between two background leaderboard writes
+LEADERBOARD_QUEUE_SIZE = 1000  # scores waiting to be written before add_player blocks
+LEADERBOARD_RETRY_MIN = 0.1  # seconds before a failed leaderboard write is tried again, doubling each time
+LEADERBOARD_RETRY_MAX = 30.0
+
+SUITS = ["hearts", "diamonds", "clubs", "spades"]
+RANKS = [
+    {"rank": "A", "value": 11},
+    {"rank": "2", "value": 2},
+    {"rank": "3", "value": 3},
+    {"rank": "4", "value": 4},
+    {"rank": "5", "value": 5},
+    {"rank": "6", "value": 6},
+    {"rank": "7", "value": 7},
+    {"rank": "8", "value": 8},
+    {"rank": "9", "value": 9},
+    {"rank": "10", "value": 10},
+    {"rank": "J", "value": 10},
+    {"rank": "Q", "value": 10},
+    {"rank": "K", "value": 10}
+]
+DECK_SIZE = len(SUITS) * len(RANKS)
+
+_SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+_RANK_INDEX = {rank["rank"]: i for i, rank in enumerate(RANKS)}
 
 class Card:
     def __init__(self, suit, rank):
         self.suit = suit
         self.rank = rank["rank"]
         self.value = rank["value"]
+        self.is_ace = self.rank == "A"
+        # Compact integer encoding: suit * 13 + rank index, 0-51
+        self.code = _SUIT_INDEX[suit] * len(RANKS) + _RANK_INDEX[self.rank]
 
     def __str__(self):
         return f"{self.rank} of {self.suit}"
 
+    @staticmethod
+    def from_code(code):
+        return CARDS[code % DECK_SIZE]
+
+# One shared Card per code, so dealing from a buffer never allocates
+CARDS = tuple(Card(suit, rank) for suit in SUITS for rank in RANKS)
+
+def encode_cards(cards):
+    return bytes(card.code for card in cards)
+
+def decode_cards(data):
+    return [CARDS[code] for code in data]
+
 class Deck:
-    def __init__(self):
-        self.cards = []
-        suits = ["hearts", "diamonds", "clubs", "spades"]
-        ranks = [
-            {"rank": "A", "value": 11},
-            {"rank": "2", "value": 2},
-            {"rank": "3", "value": 3},
-            {"rank": "4", "value": 4},
-            {"rank": "5", "value": 5},
-            {"rank": "6", "value": 6},
-            {"rank": "7", "value": 7},
-            {"rank": "8", "value": 8},
-            {"rank": "9", "value": 9},
-            {"rank": "10", "value": 10},
-            {"rank": "J", "value": 10},
-            {"rank": "Q", "value": 10},
-            {"rank": "K", "value": 10}
-        ]
-
-        for suit in suits:
-            for rank in ranks:
-                self.cards.append(Card(suit, rank))
+    def __init__(self, rng=None):
+        # Cards are stored as their integer codes; the top of the deck is the end
+        self.buffer = bytearray(range(DECK_SIZE))
+        # Anything with a shuffle() method, e.g. random.Random(seed); None uses the global random module
+        self.rng = rng
+
+    @property
+    def cards(self):
+        return decode_cards(self.buffer)
+
+    @cards.setter
+    def cards(self, cards):
+        self.buffer = bytearray(encode_cards(cards))
+
+    def __len__(self):
+        return len(self.buffer)
 
     def shuffle(self):
-        if len(self.cards) > 1:
-            random.shuffle(self.cards)
+        if len(self.buffer) > 1:
+            (self.rng or random).shuffle(self.buffer)
 
     def deal(self, number):
         cards_dealt = []
         for _ in range(number):
-            if len(self.cards) > 0:
-                card = self.cards.pop()
-                cards_dealt.append(card)
+            if len(self.buffer) > 0:
+                cards_dealt.append(CARDS[self.buffer.pop()])
         return cards_dealt
 
+    def to_bytes(self):
+        return bytes(self.buffer)
+
+    @classmethod
+    def from_bytes(cls, data):
+        deck = cls.__new__(cls)
+        deck.buffer = bytearray(data)
+        deck.rng = None
+        return deck
+
+class Shoe(Deck):
+    """Several decks shuffled together and dealt across many rounds.
+
+    The shoe is only reshuffled between rounds, once play has passed the cut
+    card, or mid-round in the rare case that it runs out completely.
+    """
+
+    def __init__(self, decks=SHOE_DECKS, penetration=SHOE_PENETRATION, rng=None):
+        if decks < 1:
+            raise ValueError("A shoe needs at least one deck")
+        if not 0 < penetration <= 1:
+            raise ValueError("Penetration must be between 0 and 1")
+        self.decks = decks
+        self.rng = rng
+        # Cards left in the shoe when the cut card is reached
+        self.cut_card = DECK_SIZE * decks - int(DECK_SIZE * decks * penetration)
+        self.reshuffle()
+
+    # Ready-shuffled shoes by number of decks, for shoes with no rng of their own; see deck_pool.py
+    pools = {}
+
+    def reshuffle(self):
+        pool = self.pools.get(self.decks) if self.rng is None else None
+        if pool is not None:
+            self.seed, self.buffer = pool.take()
+        else:
+            self.seed, self.buffer = new_shoe(self.decks, self.rng)
+
+    @property
+    def dealt(self):
+        """Cards dealt since the last shuffle"""
+        return DECK_SIZE * self.decks - len(self.buffer)
+
+    def needs_shuffle(self):
+        return len(self.buffer) <= self.cut_card
+
+    def start_round(self):
+        """Reshuffle if the cut card has come out; returns True when it did"""
+        if self.needs_shuffle():
+            self.reshuffle()
+            return True
+        return False
+
+    def deal(self, number):
+        cards_dealt = []
+        for _ in range(number):
+            if len(self.buffer) == 0:
+                self.reshuffle()
+            cards_dealt.append(CARDS[self.buffer.pop()])
+        return cards_dealt
+
+    @classmethod
+    def restore(cls, data, decks, cut_card, rng=None, seed=None):
+        """Rebuild a shoe part-way through from its remaining cards"""
+        shoe = cls.__new__(cls)
+        shoe.decks = decks
+        shoe.cut_card = cut_card
+        shoe.rng = rng
+        shoe.seed = seed
+        shoe.buffer = bytearray(data)
+        return shoe
+
+def new_shoe(decks, rng=None):
+    """(seed, cards) of a freshly shuffled shoe, shuffled with `rng` or the random module"""
+    rng = rng or random
+    if getattr(rng, "direct_shuffle", False):
+        # A shuffler from shuffler.py shuffles the shoe itself, and no seed deals it again
+        buffer = bytearray(range(DECK_SIZE)) * decks
+        rng.shuffle(buffer)
+        return None, buffer
+    # Every other shuffle has a seed of its own, so any round dealt from it can be dealt again
+    seed = rng.getrandbits(64)
+    return seed, shuffled_shoe(decks, seed)
+
+def shuffled_shoe(decks, seed):
+    """The cards of a shoe shuffled from `seed`, top of the shoe last"""
+    buffer = bytearray(range(DECK_SIZE)) * decks
+    random.Random(seed).shuffle(buffer)
+    return buffer
+
 class Hand:
     def __init__(self, dealer=False):
         self.cards = []
         self.value = 0
         self.dealer = dealer
+        # Running totals kept up to date by add_card
+        self.hard_total = 0  # every ace counted as 1
+        self.aces = 0
 
     def add_card(self, card_list):
-        self.cards.extend(card_list)
-    
-    def calculate_value(self):
+        for card in card_list:
+            self.cards.append(card)
+            if card.is_ace:
+                self.aces += 1
+                self.hard_total += 1
+            else:
+                self.hard_total += card.value
+        self._update_value()
+
+    def clear(self):
+        self.cards.clear()
         self.value = 0
-        has_ace = False
-        
+        self.hard_total = 0
+        self.aces = 0
+
+    def _update_value(self):
+        # At most one ace can count as 11 without busting
+        if self.aces and self.hard_total + 10 <= BLACKJACK:
+            self.value = self.hard_total + 10
+        else:
+            self.value = self.hard_total
+
+    def calculate_value(self):
+        # Full recount, for when self.cards was changed directly
+        self.hard_total = 0
+        self.aces = 0
         for card in self.cards:
-            self.value += card.value
-            if card.rank == "A":
-                has_ace = True
-        
-        if has_ace and self.value > BLACKJACK:
-            self.value -= 10
+            if card.is_ace:
+                self.aces += 1
+                self.hard_total += 1
+            else:
+                self.hard_total += card.value
+        self._update_value()
 
     def get_value(self):
-        self.calculate_value()
         return self.value
+
+    def is_soft(self):
+        return self.value != self.hard_total
+
+    def is_bust(self):
+        return self.value > BLACKJACK
     
     def is_blackjack(self):
         return self.value == BLACKJACK
@@ -132,10 +296,56 @@ class Player:
             return 0
         return (self.games_won / self.games_played) * 100
 
+def rank_key(entry):
+    """Sort key putting the best win rate first, then the higher final balance, then name"""
+    return (-entry["win_rate"], -entry["final_balance"], entry["name"])
+
 class Leaderboard:
-    def __init__(self, filename="leaderboard.json"):
+    """Every player's best result, ranked; `leaderboard` is the top_n of them.
+
+    Entries are kept sorted with a parallel list of rank keys to bisect and a
+    name index, so inserts and rank lookups don't sort the whole list.
+    """
+
+    def __init__(self, filename="leaderboard.json", top_n=LEADERBOARD_SIZE):
         self.filename = filename
-        self.leaderboard = self.load_leaderboard()
+        self.top_n = top_n
+        self._writes = 0
+        self._file_stamp = self._stamp()
+        self._set_entries(self.load_leaderboard())
+
+    def _set_entries(self, entries):
+        self.entries = []
+        self._keys = []
+        self._by_name = {}
+        for entry in entries:
+            self._merge(entry)
+
+    @property
+    def leaderboard(self):
+        return self.entries[:self.top_n]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def top(self, limit=None, offset=0):
+        """`limit` entries (all if None) starting after the first `offset`"""
+        return self.entries[offset:None if limit is None else offset + limit]
+
+    def rank(self, name):
+        """1-based rank of the named player, or None if they have no entry"""
+        entry = self._by_name.get(name)
+        if entry is None:
+            return None
+        return bisect.bisect_left(self._keys, rank_key(entry)) + 1
+
+    def around(self, name, radius=2):
+        """(rank of `name`, rank of the first entry, entries) for up to `radius` players either side of them"""
+        rank = self.rank(name)
+        if rank is None:
+            return None, None, []
+        first = max(rank - radius, 1)
+        return rank, first, self.top(rank + radius - first + 1, first - 1)
 
     def load_leaderboard(self):
         if os.path.exists(self.filename):
@@ -146,12 +356,50 @@ class Leaderboard:
                 return []
         return []
 
-    def save_leaderboard(self):
-        with open(self.filename, 'w') as f:
-            json.dump(self.leaderboard, f, indent=2)
-
-    def add_player(self, player):
-        player_data = {
+    def save_leaderboard(self, fsync=False):
+        # Write a temporary file and swap it in, so readers never see half a leaderboard
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, temp_name = tempfile.mkstemp(dir=directory, prefix=".leaderboard-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.entries, f, indent=2)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_name, self.filename)
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+        self._writes += 1
+        self._file_stamp = self._stamp()
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def sync(self):
+        """Flush the saved leaderboard to disk"""
+        if os.path.exists(self.filename):
+            with open(self.filename, 'rb') as f:
+                os.fsync(f.fileno())
+
+    def version(self):
+        """Token that changes whenever the leaderboard does, here or in the file"""
+        return (self._writes, self._stamp())
+
+    def refresh(self):
+        """Reload the entries if another process has rewritten the file"""
+        stamp = self._stamp()
+        if stamp != self._file_stamp:
+            self._file_stamp = stamp
+            self._set_entries(self.load_leaderboard())
+
+    @staticmethod
+    def player_record(player):
+        return {
             "name": player.name,
             "final_balance": player.money,
             "highest_balance": player.highest_balance,
@@ -162,36 +410,31 @@ class Leaderboard:
             "total_winnings": player.total_winnings,
             "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
-        
-        # Check if player already exists in leaderboard
-        existing_player_index = None
-        for i, existing_player in enumerate(self.leaderboard):
-            if existing_player["name"] == player.name:
-                existing_player_index = i
-                break
-        
-        if existing_player_index is not None:
-            # Keep the entry with the BEST win rate (not the latest)
-            existing_player = self.leaderboard[existing_player_index]
-            if player_data["win_rate"] > existing_player["win_rate"]:
-                # New player has better win rate, update the entry
-                self.leaderboard[existing_player_index] = player_data
-            elif player_data["win_rate"] == existing_player["win_rate"]:
-                # Same win rate, keep the one with higher final balance
-                if player_data["final_balance"] > existing_player["final_balance"]:
-                    self.leaderboard[existing_player_index] = player_data
-            # If existing player has better win rate, don't update
-        else:
-            # Add new player
-            self.leaderboard.append(player_data)
-        
-        # Sort by win rate (highest first), then by final balance as tiebreaker
-        self.leaderboard.sort(key=lambda x: (x["win_rate"], x["final_balance"]), reverse=True)
-        
-        # Keep only top 10 players
-        self.leaderboard = self.leaderboard[:10]
+
+    def add_player(self, player):
+        self.add_entries([self.player_record(player)])
+
+    def add_entries(self, entries):
+        """Merge player records into the leaderboard and save it once"""
+        for player_data in entries:
+            self._merge(player_data)
         self.save_leaderboard()
 
+    def _merge(self, player_data):
+        existing_player = self._by_name.get(player_data["name"])
+        if existing_player is not None:
+            # Keep the entry with the BEST win rate (not the latest), then the higher final balance
+            if rank_key(player_data) >= rank_key(existing_player):
+                return
+            index = bisect.bisect_left(self._keys, rank_key(existing_player))
+            del self.entries[index]
+            del self._keys[index]
+        key = rank_key(player_data)
+        index = bisect.bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        self.entries.insert(index, player_data)
+        self._by_name[player_data["name"]] = player_data
+
     def display_leaderboard(self):
         print("\n" + "="*60)
         print("🏆 LEADERBOARD 🏆")
@@ -203,9 +446,300 @@ class Leaderboard:
             print(f"{i:<4} {player['name']:<15} ${player['final_balance']:<14} {player['win_rate']}%{'':<6} {player['games_played']:<8} {player['blackjacks']:<12}")
         print("="*60)
 
+class SQLiteLeaderboard(Leaderboard):
+    """Leaderboard kept in SQLite, safe to share between worker processes.
+
+    Every player's best result is stored; `leaderboard` is the top_n of them.
+    On first use the entries of an existing JSON leaderboard are imported.
+
+    Unlike the JSON leaderboard's O(log n) bisect, a rank lookup here is
+    O(players ahead): SQLite can't count rows in O(log n), so rank() counts
+    the entries ahead along the covering leaderboard_order index, without
+    touching the table. That is under a millisecond near the top and about
+    0.1s for the last of 200,000 players.
+    """
+
+    COLUMNS = ("name", "final_balance", "highest_balance", "games_played", "games_won",
+               "win_rate", "blackjacks", "total_winnings", "date")
+
+    def __init__(self, filename="leaderboard.db", top_n=LEADERBOARD_SIZE, import_from="leaderboard.json"):
+        self.filename = filename
+        self.top_n = top_n
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leaderboard ("
+                "name TEXT PRIMARY KEY, final_balance INTEGER NOT NULL, highest_balance INTEGER NOT NULL, "
+                "games_played INTEGER NOT NULL, games_won INTEGER NOT NULL, win_rate REAL NOT NULL, "
+                "blackjacks INTEGER NOT NULL, total_winnings REAL NOT NULL, date TEXT NOT NULL)"
+            )
+            # Same order as rank_key, so listing and counting ranks walk the index
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS leaderboard_order ON leaderboard (win_rate DESC, final_balance DESC, name)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+        if import_from:
+            self._import_json(import_from)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.filename, timeout=5)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _import_json(self, json_filename):
+        conn = self._connection()
+        with conn:
+            # BEGIN IMMEDIATE so only one worker imports
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+                return
+            self._upsert(conn, Leaderboard(json_filename).entries)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (json_filename,))
+
+    def _upsert(self, conn, entries):
+        # Keep the entry with the best win rate, then the higher final balance
+        conn.executemany(
+            f"INSERT INTO leaderboard ({', '.join(self.COLUMNS)}) "
+            f"VALUES ({', '.join(':' + column for column in self.COLUMNS)}) "
+            "ON CONFLICT(name) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in self.COLUMNS[1:]) +
+            " WHERE excluded.win_rate > leaderboard.win_rate"
+            " OR (excluded.win_rate = leaderboard.win_rate AND excluded.final_balance > leaderboard.final_balance)",
+            [{column: entry.get(column, 0) for column in self.COLUMNS} for entry in entries]
+        )
+        # Bumped in the same transaction, so every worker sees the change
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    @property
+    def leaderboard(self):
+        return self.load_leaderboard()
+
+    @property
+    def entries(self):
+        return self.top()
+
+    def load_leaderboard(self):
+        return self.top(self.top_n)
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM leaderboard").fetchone()[0]
+
+    def top(self, limit=None, offset=0):
+        rows = self._connection().execute(
+            "SELECT * FROM leaderboard ORDER BY win_rate DESC, final_balance DESC, name LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    # Counts the entries ahead of the player along the ordering index, in O(players ahead)
+    RANK_QUERY = (
+        "SELECT 1 + (SELECT COUNT(*) FROM leaderboard AS other WHERE other.win_rate > player.win_rate"
+        " OR (other.win_rate = player.win_rate AND (other.final_balance > player.final_balance"
+        " OR (other.final_balance = player.final_balance AND other.name < player.name))))"
+        " FROM leaderboard AS player WHERE player.name = ?"
+    )
+
+    def rank(self, name):
+        row = self._connection().execute(self.RANK_QUERY, (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def around(self, name, radius=2):
+        conn = self._connection()
+        with conn:
+            # One read transaction, so another worker's write can't land between the rank and the page
+            conn.execute("BEGIN")
+            return super().around(name, radius)
+
+    def save_leaderboard(self, fsync=False):
+        pass  # every add_player commits on its own
+
+    def sync(self):
+        pass  # SQLite syncs each commit
+
+    def version(self):
+        return self._connection().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def refresh(self):
+        pass  # every read goes to the database
+
+    def add_entries(self, entries):
+        conn = self._connection()
+        with conn:
+            self._upsert(conn, entries)
+
+class WriteBehindLeaderboard(Leaderboard):
+    """Leaderboard front that queues scores and writes them from a background thread.
+
+    add_player only queues the player's record. The flusher merges everything
+    queued into one write of the wrapped leaderboard, at most once every
+    `flush_ms`; a full queue makes add_player wait for the flusher. Queued
+    scores are written and synced to disk on close(), which also runs at exit.
+
+    Scores from a write that fails are kept and tried again with the next
+    batch, waiting longer after each failure, up to LEADERBOARD_RETRY_MAX
+    seconds, when nothing new arrives.
+    """
+
+    _STOP = object()
+
+    def __init__(self, backend, flush_ms=LEADERBOARD_FLUSH_MS, max_queue=LEADERBOARD_QUEUE_SIZE):
+        self.backend = backend
+        self.flush_interval = flush_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last_write = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="leaderboard-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Reads take the lock so they never see the flusher halfway through a merge
+    @property
+    def leaderboard(self):
+        with self._lock:
+            return self.backend.leaderboard
+
+    @property
+    def entries(self):
+        with self._lock:
+            return list(self.backend.entries)
+
+    def __len__(self):
+        with self._lock:
+            return len(self.backend)
+
+    def top(self, limit=None, offset=0):
+        with self._lock:
+            return self.backend.top(limit, offset)
+
+    def rank(self, name):
+        with self._lock:
+            return self.backend.rank(name)
+
+    def around(self, name, radius=2):
+        with self._lock:
+            return self.backend.around(name, radius)
+
+    @property
+    def filename(self):
+        return self.backend.filename
+
+    @property
+    def top_n(self):
+        return self.backend.top_n
+
+    def load_leaderboard(self):
+        return self.backend.load_leaderboard()
+
+    def save_leaderboard(self, fsync=False):
+        self.flush()
+        if fsync:
+            self.sync()
+
+    def sync(self):
+        with self._lock:
+            self.backend.sync()
+
+    def version(self):
+        with self._lock:
+            return self.backend.version()
+
+    def refresh(self):
+        with self._lock:
+            self.backend.refresh()
+
+    def add_entries(self, entries):
+        if self._closed:
+            raise RuntimeError("Leaderboard is closed")
+        for entry in entries:
+            self._queue.put(entry)
+
+    def flush(self):
+        """Write every queued score now and wait until it's saved, or kept to try again if the write failed"""
+        self._wake.set()
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(self._STOP)
+        self._wake.set()
+        self._thread.join()
+        self.sync()
+
+    def display_leaderboard(self):
+        self.flush()
+        super().display_leaderboard()
+
+    def _run(self):
+        pending = []  # scores from writes that failed
+        retry = 0.0
+        while True:
+            try:
+                batch = [self._queue.get(timeout=retry if pending else None)]
+            except queue.Empty:
+                batch = []
+            delay = self._last_write + self.flush_interval - time.monotonic()
+            if delay > 0:
+                self._wake.wait(delay)
+            self._wake.clear()
+            # Everything submitted while we waited goes into the same write
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = self._STOP in batch
+            entries = pending + [entry for entry in batch if entry is not self._STOP]
+            if entries:
+                try:
+                    with self._lock:
+                        self.backend.refresh()
+                        self.backend.add_entries(entries)
+                    pending = []
+                    retry = 0.0
+                except Exception as e:
+                    pending = entries
+                    retry = min(max(retry * 2, self.flush_interval, LEADERBOARD_RETRY_MIN), LEADERBOARD_RETRY_MAX)
+                    print(f"⚠️ Could not save the leaderboard, keeping {len(pending)} scores to try again: {e}",
+                          file=sys.stderr)
+                self._last_write = time.monotonic()
+            for _ in batch:
+                self._queue.task_done()
+            if stopping:
+                if pending:
+                    print(f"⚠️ {len(pending)} scores were never saved to the leaderboard", file=sys.stderr)
+                return
+
+def open_leaderboard(location=None, top_n=None):
+    """Open the leaderboard named by `location` or BLACKJACK_LEADERBOARD.
+
+    A .db/.sqlite path (or sqlite:///path) gives a SQLiteLeaderboard,
+    anything else the JSON file Leaderboard.
+    """
+    if location is None:
+        location = os.environ.get("BLACKJACK_LEADERBOARD", "leaderboard.json")
+    if top_n is None:
+        top_n = int(os.environ.get("BLACKJACK_LEADERBOARD_SIZE", LEADERBOARD_SIZE))
+    if location.startswith("sqlite:///"):
+        return SQLiteLeaderboard(location[len("sqlite:///"):], top_n=top_n)
+    if location.endswith((".db", ".sqlite", ".sqlite3")):
+        return SQLiteLeaderboard(location, top_n=top_n)
+    return Leaderboard(location, top_n=top_n)
+
 class Game:
     def __init__(self):
-        self.leaderboard = Leaderboard()
+        self.leaderboard = WriteBehindLeaderboard(open_leaderboard())
+        self.shoe = Shoe()
 
     def get_player_name(self):
         while True:
@@ -270,8 +804,9 @@ class Game:
         bet = self.get_bet_amount(player)
         print(f"\nBet placed: ${bet}")
         
-        deck_of_cards = Deck()
-        deck_of_cards.shuffle()
+        deck_of_cards = self.shoe
+        if deck_of_cards.start_round():
+            print("🔀 Shuffling the shoe...")
         player_hand = Hand()
         dealer_hand = Hand(dealer=True)
 
@@ -326,48 +861,53 @@ class Game:
 
     def check_winner(self, player_hand, dealer_hand, player, game_over=False):
         player.games_played += 1
-        
-        if not game_over:
-            if player_hand.get_value() > BLACKJACK:
-                print("💥 You busted! Dealer wins.")
-                player.games_lost += 1
-                player.lose_bet()
-                return True
-            elif dealer_hand.get_value() > BLACKJACK:
-                print("🎉 Dealer busted! You win!")
-                player.games_won += 1
-                player.win_bet()
-                return True
-            elif player_hand.is_blackjack() and dealer_hand.is_blackjack():
-                print("🤝 Both have blackjack! It's a tie.")
-                player.current_bet = 0  # Return bet
-                return True
-            elif player_hand.is_blackjack():
-                print("🎰 BLACKJACK! You win 1.5x your bet!")
-                player.games_won += 1
+
+        outcome = settle_round(player_hand, dealer_hand, game_over)
+        if outcome is None:
+            return False
+
+        result, multiplier, message = outcome
+        print(message)
+        if result == "win":
+            player.games_won += 1
+            if multiplier == BLACKJACK_PAYOUT:
                 player.blackjacks += 1
-                player.win_bet(1.5)
-                return True
-            elif dealer_hand.is_blackjack():
-                print("😱 Dealer has blackjack! Dealer wins.")
-                player.games_lost += 1
-                player.lose_bet()
-                return True
+            player.win_bet(multiplier)
+        elif result == "lose":
+            player.games_lost += 1
+            player.lose_bet()
         else:
-            if player_hand.get_value() > dealer_hand.get_value():
-                print("🎉 You win!")
-                player.games_won += 1
-                player.win_bet()
-            elif player_hand.get_value() < dealer_hand.get_value():
-                print("😔 Dealer wins!")
-                player.games_lost += 1
-                player.lose_bet()
-            else:
-                print("🤝 It's a tie!")
-                player.current_bet = 0  # Return bet
-            return True
-
-        return False
+            player.current_bet = 0  # Return bet
+        return True
+
+def settle_round(player_hand, dealer_hand, game_over=False):
+    """Decide a round without any I/O.
+
+    Returns None while the round is still undecided, otherwise a
+    (result, multiplier, message) tuple where result is "win", "lose" or
+    "tie" and multiplier is what Player.win_bet pays on a win.
+    """
+    player_value = player_hand.get_value()
+    dealer_value = dealer_hand.get_value()
+
+    if not game_over:
+        if player_value > BLACKJACK:
+            return "lose", 0, "💥 You busted! Dealer wins."
+        elif dealer_value > BLACKJACK:
+            return "win", 1, "🎉 Dealer busted! You win!"
+        elif player_hand.is_blackjack() and dealer_hand.is_blackjack():
+            return "tie", 0, "🤝 Both have blackjack! It's a tie."
+        elif player_hand.is_blackjack():
+            return "win", BLACKJACK_PAYOUT, "🎰 BLACKJACK! You win 1.5x your bet!"
+        elif dealer_hand.is_blackjack():
+            return "lose", 0, "😱 Dealer has blackjack! Dealer wins."
+        return None
+
+    if player_value > dealer_value:
+        return "win", 1, "🎉 You win!"
+    elif player_value < dealer_value:
+        return "lose", 0, "😔 Dealer wins!"
+    return "tie", 0, "🤝 It's a tie!"
 
 if __name__ == "__main__":
     game = Game()
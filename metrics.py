@@ -0,0 +1,178 @@
+"""Latency histograms for the web routes and the phases inside them.
+
+Off unless BLACKJACK_METRICS=1. When on, both web apps time every request
+by route, and the game actions time their phases: loading and saving the
+round, building and reshuffling the shoe, and loading and signing the
+session cookie. Durations go into log-linear histograms, as in
+HdrHistogram, and /metrics serves them in the Prometheus text format as
+summaries with their quantiles.
+
+Timing a phase costs two clock reads and one histogram update:
+
+    start = metrics.clock()
+    ...
+    metrics.phase("round_load", start)
+
+When metrics are off clock() returns 0 and phase() returns straight away.
+"""
+import os
+import threading
+import time
+
+enabled = os.environ.get("BLACKJACK_METRICS", "0") not in ("", "0")
+
+# Each power of two is split into 2 ** SUB_BUCKET_BITS linear buckets, so a
+# recorded value is never more than 1/16 below the top of its bucket
+SUB_BUCKET_BITS = 4
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_BUCKETS = (64 - SUB_BUCKET_BITS) * _SUB_BUCKETS
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+# The WSGI environ key the Flask app puts the matched route pattern under
+ROUTE_KEY = "blackjack.route"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Counts of nanosecond durations in log-linear buckets"""
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def record(self, value):
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        index = (shift << SUB_BUCKET_BITS) + (value >> shift) if shift > 0 else value
+        with self.lock:
+            self.counts[index] += 1
+            self.total += value
+
+    def snapshot(self):
+        """(bucket counts, total count, sum of the values)"""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.total
+        return counts, sum(counts), total
+
+    def quantile(self, fraction, counts=None):
+        """Highest value of the bucket the `fraction` quantile falls in"""
+        if counts is None:
+            counts = self.snapshot()[0]
+        rank = max(int(sum(counts) * fraction + 0.5), 1)
+        seen = 0
+        for index, bucket in enumerate(counts):
+            seen += bucket
+            if seen >= rank:
+                return bucket_top(index)
+        return 0
+
+def bucket_top(index):
+    """Largest value that goes into bucket `index`"""
+    if index < 2 * _SUB_BUCKETS:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    top = index - (shift << SUB_BUCKET_BITS)
+    return ((top + 1) << shift) - 1
+
+
+_histograms = {}  # (metric, labels) -> Histogram
+_histograms_lock = threading.Lock()
+# The same histograms by phase name and by (route, method), which is quicker to look up per request
+_phases = {}
+_routes = {}
+_collectors = {}  # metric -> (kind, help, collect) for counters and gauges kept elsewhere
+_HELP = {
+    "blackjack_request_seconds": "Time to handle a request, by route",
+    "blackjack_phase_seconds": "Time spent in each phase of the game actions",
+}
+
+def histogram(metric, labels):
+    """The histogram for `metric` with `labels`, a tuple of (name, value) pairs"""
+    key = (metric, labels)
+    found = _histograms.get(key)
+    if found is None:
+        with _histograms_lock:
+            found = _histograms.setdefault(key, Histogram())
+    return found
+
+def clock():
+    """A start time for phase() or request(), or 0 when metrics are off"""
+    return time.perf_counter_ns() if enabled else 0
+
+def phase(name, start):
+    """Record the time since `start`, from clock(), against phase `name`"""
+    if start:
+        elapsed = time.perf_counter_ns() - start
+        found = _phases.get(name)
+        if found is None:
+            found = _phases[name] = histogram("blackjack_phase_seconds", (("phase", name),))
+        found.record(elapsed)
+
+def request(route, method, start):
+    """Record the time since `start`, from clock(), against a route"""
+    if start:
+        elapsed = time.perf_counter_ns() - start
+        found = _routes.get((route, method))
+        if found is None:
+            found = _routes[(route, method)] = histogram("blackjack_request_seconds", (("route", route), ("method", method)))
+        found.record(elapsed)
+
+def register(metric, kind, help_text, collect):
+    """Serve a "counter" or "gauge" at /metrics, read when scraped from collect(), which
+    returns (labels, value) pairs; registering the same metric again replaces it"""
+    with _histograms_lock:
+        _collectors[metric] = (kind, help_text, collect)
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
+        _phases.clear()
+        _routes.clear()
+
+
+def render():
+    """Every histogram in the Prometheus text format"""
+    lines = []
+    with _histograms_lock:
+        series = sorted(_histograms.items())
+    last_metric = None
+    for (metric, labels), found in series:
+        if metric != last_metric:
+            lines.append(f"# HELP {metric} {_HELP[metric]}")
+            lines.append(f"# TYPE {metric} summary")
+            last_metric = metric
+        label_text = _labels(labels)
+        counts, count, total = found.snapshot()
+        for fraction in QUANTILES:
+            lines.append(f'{metric}{{{label_text},quantile="{fraction}"}} {found.quantile(fraction, counts) / 1e9:.9f}')
+        lines.append(f"{metric}_sum{{{label_text}}} {total / 1e9:.9f}")
+        lines.append(f"{metric}_count{{{label_text}}} {count}")
+    with _histograms_lock:
+        collectors = sorted(_collectors.items())
+    for metric, (kind, help_text, collect) in collectors:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for labels, value in collect():
+            label_text = _labels(labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+def _labels(labels):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class WSGIMiddleware:
+    """Times every request through a WSGI app, labelled with environ[ROUTE_KEY]"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        start = clock()
+        try:
+            return self.app(environ, start_response)
+        finally:
+            request(environ.get(ROUTE_KEY, "unmatched"), environ.get("REQUEST_METHOD", "GET"), start)
@@ -0,0 +1,306 @@
+"""Append-only log of every round played, and a tool to replay it.
+
+Each round is one fixed-width 80-byte record (see _RECORD): when it was
+played, the seed and position of the shoe it was dealt from, the player,
+the bet and payout, and the cards in both hands. Records are appended to
+numbered segment files in one directory, a new segment being started once
+the current one reaches max_bytes. Every writer has segments of its own,
+named with its process ID and a random tag, so workers sharing the
+directory never write into the same file. Writes are buffered in memory
+and go to disk in large appends, at least every flush_seconds, so logging
+a round costs a struct pack rather than a system call. The web app logs to the directory named by
+BLACKJACK_ROUND_LOG, and nothing when it isn't set.
+
+The actions taken are the cards: two each, then every card after the
+second in the player's hand is a hit and the rest are the dealer's draws.
+Replaying a record shuffles a shoe from its seed, deals the round again
+from its position, and checks the cards and payout against the log:
+
+    python round_log.py rounds/            check every round
+    python round_log.py rounds/ --show 42  print round 42 in full
+"""
+import argparse
+import atexit
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from main import Shoe, Hand, BLACKJACK, BLACKJACK_PAYOUT, encode_cards, decode_cards, settle_round, shuffled_shoe
+
+ROUND_LOG_MAX_BYTES = 64 * 1024 * 1024  # size at which a new segment is started
+ROUND_LOG_BUFFER = 64 * 1024  # bytes of records held before they are written
+ROUND_LOG_FLUSH_SECONDS = 1.0  # longest a record waits in the buffer while rounds are being played
+
+# time, shuffle seed, player name, cards dealt from the shoe before the round,
+# decks in the shoe, flags, bet, payout, player and dealer card counts, then
+# the player's cards followed by the dealer's
+_CARDS_SIZE = 30
+_RECORD = struct.Struct(f"<dQ16sHBBIdBB{_CARDS_SIZE}s")
+RECORD_SIZE = _RECORD.size
+# Every segment starts with a magic number, the format version and the record size
+_FILE_HEADER = struct.Struct("<4sHH")
+HEADER_SIZE = _FILE_HEADER.size
+_MAGIC = b"BJRL"
+_VERSION = 1
+_SEGMENT = re.compile(r"^rounds-(\d{6})(?:-(\d+-[0-9a-f]+))?\.log$")
+
+# Flags: the result in the low two bits, then where the round was played
+LOSE, WIN, TIE = 0, 1, 2
+RESULTS = {"lose": LOSE, "win": WIN, "tie": TIE}
+RESULT_NAMES = {code: name for name, code in RESULTS.items()}
+SOLO = 0  # the web routes, which pay with their own rules
+BATCH = 1  # /play_batch, settle_round paid in whole dollars
+TABLE = 2  # a shared table, settle_round paid in whole dollars
+SOURCE_NAMES = {SOLO: "solo", BATCH: "batch", TABLE: "table"}
+RESHUFFLED = 0x10  # no seed deals the round again: the shoe ran out part-way through, or had no seed
+TRUNCATED = 0x20  # more cards than the record holds; only the first 30 were kept
+
+LoggedRound = namedtuple("LoggedRound", "time seed player position decks result source reshuffled truncated "
+                                        "bet payout player_cards dealer_cards")
+
+
+def segment_path(directory, number, writer=None):
+    return os.path.join(directory, f"rounds-{number:06d}.log" if writer is None else f"rounds-{number:06d}-{writer}.log")
+
+def segments(directory):
+    """Paths of the segments in `directory`, oldest first"""
+    found = sorted((int(match.group(1)), match.group(2) or "")
+                   for match in map(_SEGMENT.match, os.listdir(directory)) if match)
+    return [segment_path(directory, number, writer or None) for number, writer in found]
+
+
+class RoundLog:
+    """Buffered writer of round records; safe to share between threads"""
+
+    def __init__(self, directory, max_bytes=ROUND_LOG_MAX_BYTES, buffer_bytes=ROUND_LOG_BUFFER,
+                 flush_seconds=ROUND_LOG_FLUSH_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.buffer_bytes = buffer_bytes
+        self.flush_seconds = flush_seconds
+        os.makedirs(directory, exist_ok=True)
+        existing = segments(directory)
+        # Numbered after every segment already there, so reading in order keeps rounds roughly in time order
+        self._segment = int(_SEGMENT.match(os.path.basename(existing[-1])).group(1)) + 1 if existing else 1
+        self._writer = f"{os.getpid()}-{os.urandom(3).hex()}"
+        self._file = None
+        self._buffer = bytearray()
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._flush_periodically, name="round-log-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, player_name, shoe, player_hand, dealer_hand, bet, payout, result, source=SOLO, seed=None, start=None):
+        """Log a finished round.
+
+        `seed` and `start` are the shoe's seed and cards dealt when the round
+        began; without them the round is taken to be the last cards dealt.
+        """
+        cards = player_hand.cards + dealer_hand.cards
+        flags = RESULTS[result] | source << 2
+        if seed is None:
+            seed = shoe.seed
+            start = shoe.dealt - len(cards)
+        if start < 0 or seed != shoe.seed or seed is None:
+            flags |= RESHUFFLED
+            start = 0
+        if len(cards) > _CARDS_SIZE:
+            flags |= TRUNCATED
+            cards = cards[:_CARDS_SIZE]
+        record = _RECORD.pack(
+            time.time(), seed or 0, player_name.encode()[:16], start, shoe.decks, flags, bet, payout,
+            len(player_hand.cards), len(dealer_hand.cards), encode_cards(cards)
+        )
+        with self._lock:
+            self._buffer += record
+            if len(self._buffer) >= self.buffer_bytes or time.monotonic() - self._flushed >= self.flush_seconds:
+                self._write()
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        with self._lock:
+            self._write()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _flush_periodically(self):
+        # Records logged just before play stops don't wait for the next round to reach disk
+        while not self._closed.wait(self.flush_seconds):
+            with self._lock:
+                if time.monotonic() - self._flushed >= self.flush_seconds:
+                    self._write()
+
+    def _write(self):
+        self._flushed = time.monotonic()
+        if not self._buffer:
+            return
+        if self._file is None:
+            self._open()
+        # One append per flush, to a file only this writer appends to
+        self._file.write(self._buffer)
+        self._file.flush()
+        self._buffer.clear()
+        if self._file.tell() >= self.max_bytes:
+            self._file.close()
+            self._segment += 1
+            self._open()
+
+    def _open(self):
+        path = segment_path(self.directory, self._segment, self._writer)
+        self._file = open(path, "ab", buffering=0)
+        if self._file.tell() == 0:
+            self._file.write(_FILE_HEADER.pack(_MAGIC, _VERSION, RECORD_SIZE))
+
+
+def open_round_log():
+    """The log named by BLACKJACK_ROUND_LOG, or None when rounds aren't logged"""
+    directory = os.environ.get("BLACKJACK_ROUND_LOG")
+    if not directory:
+        return None
+    return RoundLog(directory, int(os.environ.get("BLACKJACK_ROUND_LOG_MAX_BYTES", ROUND_LOG_MAX_BYTES)))
+
+
+def segment_records(path):
+    """Number of whole records in a segment, after checking its header; they start at HEADER_SIZE"""
+    with open(path, "rb") as f:
+        magic, version, record_size = _FILE_HEADER.unpack(f.read(HEADER_SIZE))
+    if magic != _MAGIC or version != _VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"{path} is not a version {_VERSION} round log")
+    # A record cut short by a crash mid-write is left out
+    return (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+
+def read_segment(path):
+    """Every record in one segment file"""
+    count = segment_records(path)
+    with open(path, "rb") as f:
+        f.seek(HEADER_SIZE)
+        data = f.read(count * RECORD_SIZE)
+    for fields in _RECORD.iter_unpack(data):
+        yield _decode(*fields)
+
+def read_rounds(directory):
+    """Every record in the log, oldest first"""
+    for path in segments(directory):
+        yield from read_segment(path)
+
+def _decode(played, seed, player, position, decks, flags, bet, payout, player_count, dealer_count, cards):
+    cards = decode_cards(cards[:player_count + dealer_count])
+    return LoggedRound(
+        played, seed, player.rstrip(b"\0").decode(errors="replace"), position, decks,
+        RESULT_NAMES[flags & 3], flags >> 2 & 3, bool(flags & RESHUFFLED), bool(flags & TRUNCATED),
+        bet, payout, cards[:player_count], cards[player_count:player_count + dealer_count]
+    )
+
+
+Replay = namedtuple("Replay", "shoe player_hand dealer_hand result payout problems")
+
+def replay(logged):
+    """Deal a logged round again and settle it; `problems` lists where it differs from the log.
+
+    `shoe` is left as it was once the round was dealt. Rounds at a shared
+    table were dealt in turn with the other seats, and rounds the shoe ran
+    out during or dealt from a shoe with no seed can't be dealt from one, so
+    those are settled from the logged cards and the shoe is as it stood when
+    the round began.
+    """
+    problems = []
+    shoe = Shoe.restore(shuffled_shoe(logged.decks, logged.seed), logged.decks, 0, seed=logged.seed)
+    del shoe.buffer[len(shoe.buffer) - logged.position:]
+    player_hand = Hand()
+    dealer_hand = Hand(dealer=True)
+
+    if logged.source == TABLE or logged.reshuffled:
+        if logged.truncated:
+            return Replay(shoe, player_hand, dealer_hand, None, None, ["cards not all logged"])
+        player_hand.add_card(logged.player_cards)
+        dealer_hand.add_card(logged.dealer_cards)
+    else:
+        for _ in range(2):
+            player_hand.add_card(shoe.deal(1))
+            dealer_hand.add_card(shoe.deal(1))
+        player_hand.add_card(shoe.deal(len(logged.player_cards) - 2))
+        dealer_hand.add_card(shoe.deal(len(logged.dealer_cards) - 2))
+        dealt = player_hand.cards + dealer_hand.cards
+        if dealt[:len(logged.player_cards) + len(logged.dealer_cards)] != logged.player_cards + logged.dealer_cards:
+            problems.append("cards differ from the shoe")
+
+    result, payout = settle_logged(logged.source, player_hand, dealer_hand, logged.bet)
+    if result != logged.result:
+        problems.append(f"result {logged.result}, replayed {result}")
+    if payout != logged.payout:
+        problems.append(f"payout {logged.payout:g}, replayed {payout:g}")
+    return Replay(shoe, player_hand, dealer_hand, result, payout, problems)
+
+def settle_logged(source, player_hand, dealer_hand, bet):
+    """(result, payout) of a finished round under the rules of where it was played"""
+    if source == SOLO:
+        return _settle_solo(player_hand, dealer_hand, bet)
+    result, multiplier, _ = (settle_round(player_hand, dealer_hand)
+                             or settle_round(player_hand, dealer_hand, game_over=True))
+    if result == "win":
+        return result, bet + int(bet * multiplier)
+    return result, bet if result == "tie" else 0
+
+def _settle_solo(player_hand, dealer_hand, bet):
+    """The payouts of game_service.place_bet, hit and stand, where any 21 pays 1.5x"""
+    player_value = player_hand.get_value()
+    dealer_value = dealer_hand.get_value()
+    if player_value > BLACKJACK:
+        return "lose", 0
+    if dealer_value > BLACKJACK or player_value > dealer_value:
+        return "win", bet + int(bet * BLACKJACK_PAYOUT) if player_hand.is_blackjack() else bet * 2
+    if player_value < dealer_value:
+        return "lose", 0
+    return "tie", bet
+
+
+def _show(number, logged, replayed):
+    print(f"round {number}: {logged.player} at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(logged.time))}, "
+          f"{SOURCE_NAMES[logged.source]}")
+    print(f"  shoe      {logged.decks} decks, seed {logged.seed}, {logged.position} cards in, "
+          f"{len(replayed.shoe)} left after the round")
+    print(f"  player    {', '.join(map(str, replayed.player_hand.cards))} ({replayed.player_hand.get_value()})")
+    print(f"  dealer    {', '.join(map(str, replayed.dealer_hand.cards))} ({replayed.dealer_hand.get_value()})")
+    print(f"  bet ${logged.bet}, {logged.result}, paid ${logged.payout:g}")
+    for problem in replayed.problems:
+        print(f"  MISMATCH  {problem}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged rounds and check their payouts")
+    parser.add_argument("directory", help="the BLACKJACK_ROUND_LOG directory")
+    parser.add_argument("--show", type=int, metavar="N", help="print round N (counting from 1) in full")
+    args = parser.parse_args()
+
+    rounds = mismatches = 0
+    for number, logged in enumerate(read_rounds(args.directory), 1):
+        if args.show is not None and number != args.show:
+            continue
+        rounds += 1
+        replayed = replay(logged)
+        if args.show is not None:
+            _show(number, logged, replayed)
+            break
+        if replayed.problems:
+            mismatches += 1
+            print(f"round {number} ({logged.player}): {'; '.join(replayed.problems)}")
+    if args.show is None:
+        print(f"{rounds} rounds replayed, {mismatches} mismatched")
+    elif rounds == 0:
+        print(f"There is no round {args.show}")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Server-side storage for rounds in progress.
+
+The web app keeps only a round ID in the session cookie; the live Deck and
+Hands are kept in one of these stores, selected by BLACKJACK_ROUND_STORE:
+
+    memory (default)        in-process dict with TTL eviction
+    sqlite:///rounds.db     shared by all workers on one host
+    redis://localhost:6379  any Redis-compatible server (needs the redis package)
+    token                   nowhere: the session holds the round as a signed token (see round_token.py)
+
+put() returns the ID to look the round up by next time, which only changes
+for tokens.
+"""
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from main import Deck, Shoe, Hand, encode_cards, decode_cards
+
+ROUND_TTL = 30 * 60  # seconds an idle round is kept
+# decks (0 for a single Deck), cut card, the shoe's shuffle seed, then the lengths of the deck and both hands
+_HEADER = struct.Struct("<BHQHBB")
+
+
+class Round:
+    """A session's deck or shoe and the hands currently dealt from it"""
+
+    def __init__(self, deck, player_hand, dealer_hand):
+        self.deck = deck
+        self.player_hand = player_hand
+        self.dealer_hand = dealer_hand
+
+    def to_bytes(self):
+        deck_data = self.deck.to_bytes()
+        player_data = encode_cards(self.player_hand.cards)
+        dealer_data = encode_cards(self.dealer_hand.cards)
+        if isinstance(self.deck, Shoe):
+            decks, cut_card, seed = self.deck.decks, self.deck.cut_card, self.deck.seed or 0
+        else:
+            decks, cut_card, seed = 0, 0, 0
+        header = _HEADER.pack(decks, cut_card, seed, len(deck_data), len(player_data), len(dealer_data))
+        return header + deck_data + player_data + dealer_data
+
+    @classmethod
+    def from_bytes(cls, data):
+        decks, cut_card, seed, deck_len, player_len, dealer_len = _HEADER.unpack_from(data)
+        offset = _HEADER.size
+        deck_data = data[offset:offset + deck_len]
+        if decks:
+            deck = Shoe.restore(deck_data, decks, cut_card, seed=seed or None)
+        else:
+            deck = Deck.from_bytes(deck_data)
+        offset += deck_len
+        player_hand = Hand()
+        player_hand.add_card(decode_cards(data[offset:offset + player_len]))
+        offset += player_len
+        dealer_hand = Hand(dealer=True)
+        dealer_hand.add_card(decode_cards(data[offset:offset + dealer_len]))
+        return cls(deck, player_hand, dealer_hand)
+
+
+def new_round_id():
+    return uuid.uuid4().hex
+
+
+class MemoryRoundStore:
+    """Rounds kept as live objects in this process, evicted after `ttl` idle seconds"""
+
+    def __init__(self, ttl=ROUND_TTL):
+        self.ttl = ttl
+        self._rounds = OrderedDict()  # round_id -> (expires, round), oldest first
+        self._lock = threading.Lock()
+
+    def get(self, round_id):
+        with self._lock:
+            entry = self._rounds.get(round_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._rounds[round_id]
+                return None
+            return entry[1]
+
+    def put(self, round_id, game_round):
+        now = time.monotonic()
+        with self._lock:
+            self._rounds[round_id] = (now + self.ttl, game_round)
+            self._rounds.move_to_end(round_id)
+            self._evict(now)
+        return round_id
+
+    def delete(self, round_id):
+        with self._lock:
+            self._rounds.pop(round_id, None)
+
+    def __len__(self):
+        return len(self._rounds)
+
+    def _evict(self, now):
+        # Every put refreshes its entry to the end, so expired rounds sit at the front
+        while self._rounds:
+            round_id, (expires, _) = next(iter(self._rounds.items()))
+            if expires > now:
+                break
+            del self._rounds[round_id]
+
+
+class SQLiteRoundStore:
+    """Rounds serialized into a SQLite table that several worker processes can share"""
+
+    EVICT_EVERY = 256  # puts between sweeps of expired rows
+
+    def __init__(self, path, ttl=ROUND_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._puts = 0
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rounds ("
+            "id TEXT PRIMARY KEY, expires REAL NOT NULL, data BLOB NOT NULL)"
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, round_id):
+        row = self._connection().execute(
+            "SELECT data FROM rounds WHERE id = ? AND expires > ?", (round_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return Round.from_bytes(row[0])
+
+    def put(self, round_id, game_round):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO rounds (id, expires, data) VALUES (?, ?, ?)",
+                (round_id, now + self.ttl, game_round.to_bytes())
+            )
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                conn.execute("DELETE FROM rounds WHERE expires <= ?", (now,))
+        return round_id
+
+    def delete(self, round_id):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM rounds WHERE id = ?", (round_id,))
+
+
+class RedisRoundStore:
+    """Rounds serialized into a Redis-compatible server, expired by the server itself"""
+
+    def __init__(self, url, ttl=ROUND_TTL, prefix="blackjack:round:"):
+        import redis  # optional dependency, only needed for this backend
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, round_id):
+        data = self._client.get(self.prefix + round_id)
+        if data is None:
+            return None
+        return Round.from_bytes(data)
+
+    def put(self, round_id, game_round):
+        self._client.set(self.prefix + round_id, game_round.to_bytes(), ex=int(self.ttl))
+        return round_id
+
+    def delete(self, round_id):
+        self._client.delete(self.prefix + round_id)
+
+
+def create_round_store(url=None, secret_keys=()):
+    """Build the store named by `url` or the BLACKJACK_ROUND_STORE environment variable;
+    tokens are signed with `secret_keys`, the current key last"""
+    if url is None:
+        url = os.environ.get("BLACKJACK_ROUND_STORE", "memory")
+    if url == "token":
+        if not secret_keys:
+            raise ValueError("BLACKJACK_ROUND_STORE=token needs a secret key of your own in BLACKJACK_SECRET_KEY")
+        from round_token import TokenRoundStore  # imports this module
+        return TokenRoundStore(secret_keys)
+    if url == "memory":
+        return MemoryRoundStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteRoundStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisRoundStore(url)
+    raise ValueError(f"Unknown round store: {url}")
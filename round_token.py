@@ -0,0 +1,169 @@
+"""Rounds carried by the client as compact signed tokens, so no worker keeps them.
+
+With BLACKJACK_ROUND_STORE=token the session holds a token in place of a
+round ID, and any worker with the secret key can pick the round up. The
+shoe isn't in the token: its order is the output of a Shuffler fed a
+SHAKE-256 stream keyed by the secret key and a random nonce, so the token
+need only name the nonce and how far into the shoe play has got. Tokens
+are around 45 bytes, 60 characters once base64-encoded:
+
+    version      1 byte
+    key id       1 byte, picking the secret key out of the current and fallback keys
+    decks        1 byte
+    cut card     2 bytes
+    nonce        12 bytes
+    dealt        2 bytes, cards dealt from the shoe
+    card counts  1 byte each for the player's and dealer's hands
+    cards        1 byte per card in the hands
+    tag          16 bytes of HMAC-SHA256 over all of the above
+
+Only someone holding the key can work out the cards still to come or make
+a token that will be accepted, so token rounds won't start with the
+built-in default key. Like the session cookie itself, a token
+can be sent again to go back to an earlier point in the round.
+
+Secret keys are rotated as Flask's SECRET_KEY_FALLBACKS are: new shoes use
+the current key, and tokens made with a fallback key keep working until
+their shoe is reshuffled. Shoes from tokens have no seed, so the round log
+checks their rounds from the logged cards.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import struct
+from functools import lru_cache
+
+from main import Shoe, Hand, DECK_SIZE, SHOE_DECKS, SHOE_PENETRATION, encode_cards, decode_cards
+from round_store import Round
+from shuffler import Shuffler, shake_stream
+
+TOKEN_VERSION = 1
+NONCE_SIZE = 12
+TAG_SIZE = 16
+# version, key id, decks, cut card, nonce, cards dealt from the shoe, then the lengths of both hands
+_HEADER = struct.Struct(f"<BBBH{NONCE_SIZE}sHBB")
+# Shoe orders kept, so resuming a round from its token doesn't shuffle the shoe again
+SHOE_CACHE_SIZE = 4096
+
+
+class RoundKey:
+    """A secret key, and the keys derived from it for signing tokens and ordering shoes"""
+
+    def __init__(self, secret):
+        if isinstance(secret, str):
+            secret = secret.encode()
+        self.mac_key = hmac.new(secret, b"blackjack round token: mac", hashlib.sha256).digest()
+        self.shoe_key = hmac.new(secret, b"blackjack round token: shoe", hashlib.sha256).digest()
+        self.id = hmac.new(secret, b"blackjack round token: id", hashlib.sha256).digest()[0]
+
+    def sign(self, data):
+        return hmac.new(self.mac_key, data, hashlib.sha256).digest()[:TAG_SIZE]
+
+
+@lru_cache(maxsize=SHOE_CACHE_SIZE)
+def shoe_order(shoe_key, nonce, decks):
+    """The cards of the shoe for this key and nonce, top of the shoe last"""
+    buffer = bytearray(range(DECK_SIZE)) * decks
+    Shuffler(shake_stream(shoe_key + nonce), buffer_bytes=len(buffer) * 4 + 64).shuffle(buffer)
+    return bytes(buffer)
+
+
+class TokenShoe(Shoe):
+    """A shoe whose order comes from a key and a nonce, so a token can name it in a few bytes"""
+
+    def __init__(self, tokens, decks=SHOE_DECKS, penetration=SHOE_PENETRATION):
+        self.tokens = tokens
+        super().__init__(decks, penetration)
+
+    def reshuffle(self):
+        # A shoe dealt with a fallback key moves to the current key when it's reshuffled
+        self.key = self.tokens.current_key
+        self.seed = None
+        self.nonce = os.urandom(NONCE_SIZE)
+        self.buffer = bytearray(shoe_order(self.key.shoe_key, self.nonce, self.decks))
+
+    @classmethod
+    def resume(cls, tokens, key, nonce, decks, cut_card, dealt):
+        shoe = cls.restore(b"", decks, cut_card)
+        shoe.tokens = tokens
+        shoe.key = key
+        shoe.nonce = nonce
+        order = shoe_order(key.shoe_key, nonce, decks)
+        shoe.buffer = bytearray(order[:len(order) - dealt])
+        return shoe
+
+
+class RoundTokens:
+    """Turns rounds dealt from TokenShoes into tokens and back.
+
+    `secret_keys` are every key tokens may be signed with, the current one
+    last, as itsdangerous takes them.
+    """
+
+    def __init__(self, secret_keys):
+        self.keys = [RoundKey(secret) for secret in secret_keys]
+        if not self.keys:
+            raise ValueError("Round tokens need a secret key")
+        self.current_key = self.keys[-1]
+        self._by_id = {}
+        for key in reversed(self.keys):
+            self._by_id.setdefault(key.id, []).append(key)
+
+    def new_shoe(self, decks=SHOE_DECKS, penetration=SHOE_PENETRATION):
+        return TokenShoe(self, decks, penetration)
+
+    def encode(self, game_round):
+        shoe = game_round.deck
+        if not isinstance(shoe, TokenShoe):
+            raise TypeError("Only rounds dealt from a TokenShoe can be made into tokens")
+        player_data = encode_cards(game_round.player_hand.cards)
+        dealer_data = encode_cards(game_round.dealer_hand.cards)
+        data = _HEADER.pack(TOKEN_VERSION, shoe.key.id, shoe.decks, shoe.cut_card, shoe.nonce,
+                            shoe.dealt, len(player_data), len(dealer_data)) + player_data + dealer_data
+        return base64.urlsafe_b64encode(data + shoe.key.sign(data)).rstrip(b"=").decode("ascii")
+
+    def decode(self, token):
+        """The round in `token`, or None if it's malformed or wasn't signed with one of our keys"""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (binascii.Error, ValueError, TypeError):
+            return None
+        if len(raw) < _HEADER.size + TAG_SIZE or raw[0] != TOKEN_VERSION:
+            return None
+        data, tag = raw[:-TAG_SIZE], raw[-TAG_SIZE:]
+        for key in self._by_id.get(data[1], ()):
+            if hmac.compare_digest(key.sign(data), tag):
+                break
+        else:
+            return None
+
+        _, _, decks, cut_card, nonce, dealt, player_len, dealer_len = _HEADER.unpack_from(data)
+        cards = data[_HEADER.size:]
+        if len(cards) != player_len + dealer_len or not decks or dealt > DECK_SIZE * decks:
+            return None
+        player_hand = Hand()
+        player_hand.add_card(decode_cards(cards[:player_len]))
+        dealer_hand = Hand(dealer=True)
+        dealer_hand.add_card(decode_cards(cards[player_len:]))
+        return Round(TokenShoe.resume(self, key, nonce, decks, cut_card, dealt), player_hand, dealer_hand)
+
+
+class TokenRoundStore:
+    """Keeps no rounds: each round is a token held in the session in place of its ID"""
+
+    def __init__(self, secret_keys):
+        self.tokens = RoundTokens(secret_keys)
+
+    def new_shoe(self, decks=SHOE_DECKS, penetration=SHOE_PENETRATION):
+        return self.tokens.new_shoe(decks, penetration)
+
+    def get(self, round_id):
+        return self.tokens.decode(round_id)
+
+    def put(self, round_id, game_round):
+        return self.tokens.encode(game_round)
+
+    def delete(self, round_id):
+        pass
@@ -0,0 +1,133 @@
+"""Shufflers drawing their randomness in bulk, for decks and shoes.
+
+The random module's Mersenne Twister is fast but predictable: enough of
+its output gives away every card to come. A Shuffler runs Fisher-Yates on
+32-bit words from a byte source, fetched `buffer_bytes` at a time, so a
+secure source costs one call per many shuffles rather than one per card.
+Indices are drawn by rejection sampling, discarding the few words above
+the largest multiple of the range, so every order is equally likely.
+
+    SecureShuffler()        bytes from os.urandom
+    SeededShuffler(seed)    bytes from SHAKE-256 of the seed, the same every run
+
+Either can be given to a Deck or Shoe as its rng. Shoes shuffle with it
+directly instead of taking a seed for the Mersenne Twister, so their
+order can't be dealt again from a seed; the round log settles rounds from
+those shoes from the cards it logged.
+"""
+import hashlib
+import os
+import sys
+import threading
+from array import array
+
+BUFFER_BYTES = 64 * 1024
+_WORD = 1 << 32
+# Words are read little-endian on every platform, so seeded shuffles and round tokens agree between hosts
+_WORD_TYPE = "I" if array("I").itemsize == 4 else "L"
+# _LIMITS[n] is the largest multiple of n a word can hold: words below it give unbiased indices in range(n)
+_LIMITS = [0]
+_limits_lock = threading.Lock()
+
+
+def _limits(n):
+    """_LIMITS, long enough for ranges up to n"""
+    if len(_LIMITS) <= n:
+        with _limits_lock:
+            _LIMITS.extend([_WORD - _WORD % span for span in range(len(_LIMITS), n + 1)])
+    return _LIMITS
+
+
+class Shuffler:
+    """Fisher-Yates shuffles on bytes from `source(n)`"""
+
+    # Shoes shuffle with shuffle() itself rather than with a seed from getrandbits()
+    direct_shuffle = True
+
+    def __init__(self, source, buffer_bytes=BUFFER_BYTES):
+        self.source = source
+        self.buffer_bytes = buffer_bytes
+        self._buffer = b""
+        self._position = 0
+        self._lock = threading.Lock()
+
+    def _take(self, count):
+        """`count` bytes from the source, refilling the buffer as needed"""
+        with self._lock:
+            end = self._position + count
+            if end > len(self._buffer):
+                self._buffer = self._buffer[self._position:] + self.source(max(self.buffer_bytes, count))
+                self._position, end = 0, count
+            data = self._buffer[self._position:end]
+            self._position = end
+        return data
+
+    def _words(self, count):
+        words = array(_WORD_TYPE)
+        words.frombytes(self._take(count * 4))
+        if sys.byteorder == "big":
+            words.byteswap()
+        return words
+
+    def shuffle(self, x):
+        """Shuffle the mutable sequence `x` in place"""
+        if len(x) < 2:
+            return
+        limits = _limits(len(x))
+        for span, word in zip(range(len(x), 1, -1), self._words(len(x) - 1).tolist()):
+            if word >= limits[span]:
+                word = self._redraw(span)
+            j = word % span
+            x[span - 1], x[j] = x[j], x[span - 1]
+
+    def _redraw(self, span):
+        # Words in the uneven top of the range would favour the low indices
+        word = self._words(1)[0]
+        while word >= _LIMITS[span]:
+            word = self._words(1)[0]
+        return word
+
+    def randbelow(self, n):
+        """A random int in range(n)"""
+        if n <= 0:
+            raise ValueError("randbelow needs a positive bound")
+        bits = n.bit_length()
+        while True:
+            value = self.getrandbits(bits)
+            if value < n:
+                return value
+
+    def getrandbits(self, k):
+        if k <= 0:
+            return 0
+        return int.from_bytes(self._take((k + 7) // 8), "little") >> (-k % 8)
+
+
+class SecureShuffler(Shuffler):
+    """Shuffles from the operating system's CSPRNG"""
+
+    def __init__(self, buffer_bytes=BUFFER_BYTES):
+        super().__init__(os.urandom, buffer_bytes)
+
+
+def shake_stream(key):
+    """A byte source giving SHAKE-256 output for `key`, one counter-numbered block per call"""
+    counter = 0
+
+    def source(count):
+        nonlocal counter
+        block = hashlib.shake_256(counter.to_bytes(8, "little") + key).digest(count)
+        counter += 1
+        return block
+    return source
+
+
+class SeededShuffler(Shuffler):
+    """Shuffles that are the same every run for the same seed, for tests and simulations"""
+
+    def __init__(self, seed, buffer_bytes=BUFFER_BYTES):
+        if isinstance(seed, int):
+            seed = seed.to_bytes((seed.bit_length() + 8) // 8, "little", signed=True)
+        elif isinstance(seed, str):
+            seed = seed.encode()
+        super().__init__(shake_stream(bytes(seed)), buffer_bytes)
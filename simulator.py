@@ -0,0 +1,262 @@
+"""Headless blackjack simulation.
+
+Plays the rules of main.py (Deck, Hand, settle_round) with no input() or
+print(), asking a strategy callback whether to hit, and collects aggregate
+results for measuring house edge and payout changes.
+
+    python simulator.py --hands 1000000 --strategy dealer --workers 8 --seed 42 --decks 6
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from main import Deck, Shoe, Hand, BLACKJACK, DEALER_STAND, MIN_BET, MAX_BET, STARTING_MONEY, BLACKJACK_PAYOUT, DECK_SIZE, SHOE_PENETRATION, settle_round
+from strategy import perfect_play
+
+HIT = "hit"
+STAND = "stand"
+
+_FULL_DECK = bytes(range(DECK_SIZE))
+
+# simulate() splits work into fixed chunks, each with its own RNG stream, so
+# the hands played depend only on the seed and never on the worker count
+CHUNK_HANDS = 10000
+
+
+# Strategies take (player_hand, dealer_upcard, deck) and return HIT or STAND. One with a true
+# `takes_hidden_cards` attribute is also passed the dealer's hidden card, to count as unseen
+def dealer_rules(player_hand, dealer_upcard, deck):
+    """Mimic the dealer: hit below 17"""
+    return HIT if player_hand.get_value() < DEALER_STAND else STAND
+
+def never_bust(player_hand, dealer_upcard, deck):
+    """Only hit when no single card can bust the hand"""
+    return HIT if player_hand.get_value() < 12 else STAND
+
+def always_stand(player_hand, dealer_upcard, deck):
+    """Never take a card"""
+    return STAND
+
+STRATEGIES = {
+    "dealer": dealer_rules,
+    "never_bust": never_bust,
+    "stand": always_stand,
+    "perfect": perfect_play,
+}
+
+
+class SimulationResult:
+    def __init__(self, bet=MIN_BET):
+        self.bet = bet
+        self.hands = 0
+        self.wins = 0
+        self.losses = 0
+        self.pushes = 0
+        self.blackjacks = 0
+        self.player_busts = 0
+        self.dealer_busts = 0
+        self.wagered = 0
+        self.net = 0
+        self.seed = None
+        # Bankroll sampled every `record_every` hands, starting from STARTING_MONEY
+        self.bankroll = [STARTING_MONEY]
+
+    @property
+    def ev(self):
+        """Expected return per unit wagered"""
+        if self.wagered == 0:
+            return 0
+        return self.net / self.wagered
+
+    @property
+    def house_edge(self):
+        return -self.ev
+
+    def merge(self, other):
+        """Append another run's results, as if its hands were played after ours"""
+        self.hands += other.hands
+        self.wins += other.wins
+        self.losses += other.losses
+        self.pushes += other.pushes
+        self.blackjacks += other.blackjacks
+        self.player_busts += other.player_busts
+        self.dealer_busts += other.dealer_busts
+        self.wagered += other.wagered
+        self.bankroll.extend(balance + self.net for balance in other.bankroll[1:])
+        self.net += other.net
+        return self
+
+    def summary(self):
+        return {
+            "hands": self.hands,
+            "wins": self.wins,
+            "losses": self.losses,
+            "pushes": self.pushes,
+            "blackjacks": self.blackjacks,
+            "player_busts": self.player_busts,
+            "dealer_busts": self.dealer_busts,
+            "wagered": self.wagered,
+            "net": self.net,
+            "ev": round(self.ev, 6),
+            "house_edge": round(self.house_edge * 100, 4),
+            "seed": self.seed,
+        }
+
+
+class Simulator:
+    def __init__(self, strategy=dealer_rules, bet=MIN_BET, record_every=100, rng=None, decks=None, penetration=SHOE_PENETRATION, shoe=None):
+        """With `decks` set, rounds are dealt from one persistent Shoe; otherwise
+        every round gets a freshly shuffled single deck. An existing `shoe`
+        can be passed in to carry on dealing from it."""
+        if not MIN_BET <= bet <= MAX_BET:
+            raise ValueError(f"Bet must be between ${MIN_BET} and ${MAX_BET}")
+        self.strategy = strategy
+        self.takes_hidden_cards = getattr(strategy, "takes_hidden_cards", False)
+        self.bet = bet
+        self.record_every = record_every
+        # One deck or shoe and two hands are reused for every round
+        if shoe is not None:
+            self.deck = shoe
+        elif decks:
+            self.deck = Shoe(decks, penetration, rng=rng)
+        else:
+            self.deck = Deck(rng=rng)
+        self.player_hand = Hand()
+        self.dealer_hand = Hand(dealer=True)
+
+    def play_round(self):
+        """Play one round and return (result, multiplier)"""
+        deck = self.deck
+        player_hand = self.player_hand
+        dealer_hand = self.dealer_hand
+
+        if isinstance(deck, Shoe):
+            deck.start_round()
+        else:
+            deck.buffer[:] = _FULL_DECK
+            deck.shuffle()
+        player_hand.clear()
+        dealer_hand.clear()
+        for _ in range(2):
+            player_hand.add_card(deck.deal(1))
+            dealer_hand.add_card(deck.deal(1))
+
+        outcome = settle_round(player_hand, dealer_hand)
+        if outcome is None:
+            # The dealer's first card is the hidden one
+            upcard = dealer_hand.cards[1]
+            strategy = self.strategy
+            if self.takes_hidden_cards:
+                hidden = dealer_hand.cards[:1]
+                strategy = lambda player_hand, upcard, deck: self.strategy(player_hand, upcard, deck, hidden)
+            while player_hand.get_value() < BLACKJACK and strategy(player_hand, upcard, deck) == HIT:
+                player_hand.add_card(deck.deal(1))
+            outcome = settle_round(player_hand, dealer_hand)
+
+        if outcome is None:
+            while dealer_hand.get_value() < DEALER_STAND:
+                dealer_hand.add_card(deck.deal(1))
+            outcome = settle_round(player_hand, dealer_hand) or settle_round(player_hand, dealer_hand, game_over=True)
+
+        return outcome[0], outcome[1]
+
+    def run(self, n_hands):
+        results = SimulationResult(self.bet)
+        bet = self.bet
+        record_every = self.record_every
+        player_hand = self.player_hand
+        dealer_hand = self.dealer_hand
+        wins = losses = pushes = blackjacks = player_busts = dealer_busts = 0
+        net = 0
+
+        for hand_number in range(1, n_hands + 1):
+            result, multiplier = self.play_round()
+            if result == "win":
+                wins += 1
+                # Same payout as Player.win_bet: the stake comes back plus bet * multiplier
+                net += bet * multiplier
+                if multiplier == BLACKJACK_PAYOUT:
+                    blackjacks += 1
+                elif dealer_hand.get_value() > BLACKJACK:
+                    dealer_busts += 1
+            elif result == "lose":
+                losses += 1
+                net -= bet
+                if player_hand.get_value() > BLACKJACK:
+                    player_busts += 1
+            else:
+                pushes += 1
+            if record_every and hand_number % record_every == 0:
+                results.bankroll.append(STARTING_MONEY + net)
+
+        results.hands = n_hands
+        results.wins = wins
+        results.losses = losses
+        results.pushes = pushes
+        results.blackjacks = blackjacks
+        results.player_busts = player_busts
+        results.dealer_busts = dealer_busts
+        results.wagered = bet * n_hands
+        results.net = net
+        return results
+
+
+def chunk_rng(seed, index):
+    """Independent, reproducible RNG stream for one chunk of a seeded run"""
+    return random.Random(f"{seed}/{index}")
+
+def _run_chunk(args):
+    strategy, bet, record_every, decks, penetration, seed, index, n_hands = args
+    simulator = Simulator(strategy, bet, record_every, rng=chunk_rng(seed, index), decks=decks, penetration=penetration)
+    return simulator.run(n_hands)
+
+def simulate(n_hands, workers=1, seed=None, strategy=dealer_rules, bet=MIN_BET, record_every=100,
+             decks=None, penetration=SHOE_PENETRATION, chunk_hands=CHUNK_HANDS):
+    """Play n_hands across `workers` processes and merge the results.
+
+    The same seed gives identical results for any number of workers. The
+    strategy must be picklable (a module-level function) when workers > 1.
+    With `decks` set each chunk plays through its own shoe.
+    """
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    chunks = []
+    for index, start in enumerate(range(0, n_hands, chunk_hands)):
+        chunks.append((strategy, bet, record_every, decks, penetration, seed, index, min(chunk_hands, n_hands - start)))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunk_results = list(executor.map(_run_chunk, chunks))
+    else:
+        chunk_results = map(_run_chunk, chunks)
+
+    results = SimulationResult(bet)
+    for chunk_result in chunk_results:
+        results.merge(chunk_result)
+    results.seed = seed
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate blackjack hands without a player at the keyboard")
+    parser.add_argument("--hands", type=int, default=100000)
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="dealer")
+    parser.add_argument("--bet", type=int, default=MIN_BET)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--decks", type=int, help="deal from a persistent shoe of this many decks")
+    parser.add_argument("--penetration", type=float, default=SHOE_PENETRATION)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = simulate(args.hands, workers=args.workers, seed=args.seed, strategy=STRATEGIES[args.strategy], bet=args.bet,
+                       decks=args.decks, penetration=args.penetration)
+    elapsed = time.perf_counter() - start
+
+    for key, value in results.summary().items():
+        print(f"{key:<14} {value}")
+    print(f"{'hands/minute':<14} {int(args.hands / elapsed * 60)}")
+
+if __name__ == "__main__":
+    main()
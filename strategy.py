@@ -0,0 +1,159 @@
+"""Composition-dependent hit/stand strategy.
+
+Works out the expected value of hitting and of standing for a player hand
+against a dealer upcard, given exactly which cards are still unseen, by
+recursing over every card the player could draw. The dealer's natural
+has already been settled by the time the player acts. How a player's 21
+is paid depends on the rules:
+
+    MAIN_RULES  settle_round, as main.py, the simulator and tables play:
+                reaching 21 pays BLACKJACK_PAYOUT straight away
+    WEB_RULES   the solo web game (game_service): a 21 waits for the
+                dealer, pays BLACKJACK_PAYOUT if it wins and pushes
+                against a dealer 21
+
+An exact solve works the dealer's odds out again for every card the player
+might draw, which can take seconds on a multi-deck shoe. Hints on the
+request thread skip that: the dealer's odds are worked out once, from the
+cards unseen when the hint is asked for, and used for every stand in the
+player's draws. Standing now is still valued exactly; later stands ignore
+the few cards the player has drawn meanwhile, which barely moves the odds
+of a shoe.
+
+Results are memoized in LRU caches bounded by BLACKJACK_STRATEGY_CACHE
+entries, so long-running web workers don't grow without limit.
+"""
+import os
+from functools import lru_cache
+
+from main import BLACKJACK, BLACKJACK_PAYOUT, RANKS, DECK_SIZE
+from dealer_odds import OUTCOMES, card_rank, dealer_distribution
+
+HIT = "hit"
+STAND = "stand"
+
+MAIN_RULES = "main"
+WEB_RULES = "web"
+
+CACHE_SIZE = int(os.environ.get("BLACKJACK_STRATEGY_CACHE", 200000))
+
+# Rank value (1-10) for each card code
+_CODE_RANK = [1 if rank["rank"] == "A" else rank["value"] for rank in RANKS] * (DECK_SIZE // len(RANKS))
+
+
+class Decision:
+    def __init__(self, action, ev_hit, ev_stand):
+        self.action = action
+        self.ev_hit = ev_hit
+        self.ev_stand = ev_stand
+
+    @property
+    def ev(self):
+        return max(self.ev_hit, self.ev_stand)
+
+    def to_dict(self):
+        return {
+            "action": self.action,
+            "ev": round(self.ev, 4),
+            "ev_hit": round(self.ev_hit, 4),
+            "ev_stand": round(self.ev_stand, 4),
+        }
+
+
+def unseen_counts(deck, hidden_cards=()):
+    """Cards per rank value 1-10 still in `deck` plus any cards the player can't see"""
+    counts = [0] * 10
+    for code in deck.buffer:
+        counts[_CODE_RANK[code % DECK_SIZE] - 1] += 1
+    for card in hidden_cards:
+        counts[card_rank(card) - 1] += 1
+    return counts
+
+def _value(hard_total, has_ace):
+    if has_ace and hard_total + 10 <= BLACKJACK:
+        return hard_total + 10
+    return hard_total
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _dealer(upcard, counts):
+    return dealer_distribution(upcard, counts, no_blackjack=True)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _stand_ev(player_value, upcard, counts, rules=MAIN_RULES):
+    distribution = _dealer(upcard, counts)
+    if player_value == BLACKJACK and rules == WEB_RULES:
+        # Everything but a dealer 21 loses to it, at the blackjack payout
+        return BLACKJACK_PAYOUT * (1 - distribution[OUTCOMES.index(BLACKJACK)])
+    ev = distribution[-1]  # dealer busts
+    for total, probability in zip(OUTCOMES[:-1], distribution):
+        if player_value > total:
+            ev += probability
+        elif player_value < total:
+            ev -= probability
+    return ev
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _solve(hard_total, has_ace, upcard, counts, dealer_counts=None, rules=MAIN_RULES):
+    """(ev_hit, ev_stand) for a live hand; counts is a tuple of unseen cards per rank value.
+
+    `dealer_counts` fixes the cards the dealer's odds are worked out from,
+    or is None to use `counts` at every draw.
+    """
+    player_value = _value(hard_total, has_ace)
+    ev_stand = _stand_ev(player_value, upcard, counts if dealer_counts is None else dealer_counts, rules)
+
+    total_weight = sum(counts)
+    if total_weight == 0:
+        return ev_stand, ev_stand
+    ev_hit = 0.0
+    remaining = list(counts)
+    for rank in range(1, 11):
+        weight = counts[rank - 1]
+        if weight == 0:
+            continue
+        new_hard = hard_total + rank
+        new_ace = has_ace or rank == 1
+        new_value = _value(new_hard, new_ace)
+        if new_value > BLACKJACK:
+            ev = -1.0
+        elif new_value == BLACKJACK and rules == MAIN_RULES:
+            ev = BLACKJACK_PAYOUT
+        else:
+            remaining[rank - 1] -= 1
+            ev = max(_solve(new_hard, new_ace, upcard, tuple(remaining), dealer_counts, rules))
+            remaining[rank - 1] += 1
+        ev_hit += weight * ev
+    return ev_hit / total_weight, ev_stand
+
+def solve(player_hand, upcard, counts, exact=True, rules=MAIN_RULES):
+    """Best action for `player_hand` against `upcard` (a Card or rank value 1-10).
+
+    Unless `exact`, the dealer's odds are worked out once from `counts`.
+    """
+    if not isinstance(upcard, int):
+        upcard = card_rank(upcard)
+    counts = tuple(counts)
+    if player_hand.is_bust():
+        return Decision(STAND, -1.0, -1.0)
+    if player_hand.get_value() == BLACKJACK:
+        ev_stand = BLACKJACK_PAYOUT if rules == MAIN_RULES else _stand_ev(BLACKJACK, upcard, counts, rules)
+        return Decision(STAND, -1.0, ev_stand)
+    ev_hit, ev_stand = _solve(player_hand.hard_total, player_hand.aces > 0, upcard, counts,
+                              None if exact else counts, rules)
+    return Decision(HIT if ev_hit > ev_stand else STAND, ev_hit, ev_stand)
+
+def hint(player_hand, dealer_hand, deck):
+    """Best action in the solo web game, quick enough for a request; the dealer's hidden first card counts as unseen"""
+    return solve(player_hand, dealer_hand.cards[1], unseen_counts(deck, dealer_hand.cards[:1]),
+                 exact=False, rules=WEB_RULES)
+
+def perfect_play(player_hand, dealer_upcard, deck, hidden_cards=()):
+    """Simulator strategy playing the composition-dependent optimum; the dealer's hidden card counts as unseen"""
+    return solve(player_hand, dealer_upcard, unseen_counts(deck, hidden_cards)).action
+
+# Tells the simulator to pass the dealer's hidden card
+perfect_play.takes_hidden_cards = True
+
+def clear_cache():
+    for cached in (_dealer, _stand_ev, _solve):
+        cached.cache_clear()
@@ -0,0 +1,307 @@
+"""Multi-seat blackjack tables.
+
+A Table seats up to seven players who share one shoe and one dealer hand.
+Rounds follow the rules of main.py (settle_round): once every seated
+player has bet, or BET_TIMEOUT after the first bet, the table deals to
+everyone who bet and plays the seats in order. A seat that doesn't act
+within TURN_TIMEOUT stands. When the last seat is done the dealer draws
+once for the whole table and every seat is settled.
+
+Timeouts are applied lazily, whenever anyone acts on or looks at the
+table, and each table's lock serializes everything done to it. A table
+closes when its last seat leaves, or once every seat has been given up
+for sitting idle and MAX_TABLES are open.
+"""
+import re
+import threading
+import time
+import uuid
+
+from main import Shoe, Hand, BLACKJACK_PAYOUT, DEALER_STAND, SHOE_DECKS, SHOE_PENETRATION, settle_round
+import round_log as round_logs
+
+MAX_SEATS = 7
+BET_TIMEOUT = 15  # seconds the other seats get to bet once someone has
+TURN_TIMEOUT = 30  # seconds a seat gets to act before it stands
+SEAT_IDLE_TIMEOUT = 10 * 60  # seconds before a seat nobody acts from is given up
+MAX_TABLES = 1000
+
+BETTING = "betting"
+PLAYING = "playing"
+
+_TABLE_ID = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+
+class TableError(Exception):
+    """An action the table's rules don't allow right now"""
+
+
+class Seat:
+    def __init__(self, player):
+        self.player = player
+        self.hand = Hand()
+        self.token = uuid.uuid4().hex
+        self.in_round = False  # holds a bet in the current round
+        self.done = False  # bust, 21, or stood
+        self.result = None  # (result, multiplier, message) of the last round
+        self.last_seen = time.monotonic()
+
+
+class Table:
+    def __init__(self, table_id, decks=SHOE_DECKS, penetration=SHOE_PENETRATION,
+                 bet_timeout=BET_TIMEOUT, turn_timeout=TURN_TIMEOUT, clock=time.monotonic, round_log=None):
+        self.table_id = table_id
+        self.shoe = Shoe(decks, penetration)
+        self.round_log = round_log
+        self.round_start = (None, 0)  # the shoe's seed and cards dealt when this round was dealt
+        self.dealer_hand = Hand(dealer=True)
+        self.seats = [None] * MAX_SEATS
+        self.phase = BETTING
+        self.turn = None  # seat number whose turn it is
+        self.deadline = None  # when the betting window or current turn runs out
+        self.round = 0
+        self.bet_timeout = bet_timeout
+        self.turn_timeout = turn_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return sum(seat is not None for seat in self.seats)
+
+    def join(self, player):
+        """Seat `player` at the first free seat; returns (seat number, seat token)"""
+        with self.lock:
+            self._tick()
+            for number, seat in enumerate(self.seats):
+                if seat is None:
+                    seat = self.seats[number] = Seat(player)
+                    seat.last_seen = self.clock()
+                    return number, seat.token
+            raise TableError("The table is full")
+
+    def leave(self, number, token):
+        with self.lock:
+            seat = self._seat(number, token)
+            if seat.in_round:
+                raise TableError("Wait for the round to finish before leaving")
+            self.seats[number] = None
+            if self.phase == BETTING:
+                self._deal_if_ready()
+            return seat
+
+    def bet(self, number, token, amount):
+        with self.lock:
+            seat = self._seat(number, token)
+            if self.phase != BETTING or seat.in_round:
+                raise TableError("Wait for the next round to bet")
+            if not seat.player.place_bet(amount):
+                raise TableError("Invalid bet amount")
+            seat.in_round = True
+            seat.done = False
+            seat.result = None
+            seat.hand.clear()
+            if self.deadline is None:
+                self.deadline = self.clock() + self.bet_timeout
+            self._deal_if_ready()
+
+    def hit(self, number, token):
+        with self.lock:
+            seat = self._seat(number, token)
+            self._check_turn(number)
+            seat.hand.add_card(self.shoe.deal(1))
+            if settle_round(seat.hand, self.dealer_hand) is not None:
+                # Bust or 21
+                seat.done = True
+                self._next_turn()
+            else:
+                self.deadline = self.clock() + self.turn_timeout
+
+    def stand(self, number, token):
+        with self.lock:
+            self._seat(number, token)
+            self._check_turn(number)
+            self.seats[number].done = True
+            self._next_turn()
+
+    def seat(self, number, token):
+        """The caller's own seat, after applying any timeouts"""
+        with self.lock:
+            return self._seat(number, token)
+
+    def snapshot(self):
+        """The table as plain data, after applying any timeouts.
+
+        The dealer's first card is None, and the dealer's value is None,
+        while the seats are still playing.
+        """
+        with self.lock:
+            self._tick()
+            dealer_cards = list(self.dealer_hand.cards)
+            dealer_value = self.dealer_hand.get_value()
+            if self.phase == PLAYING:
+                dealer_cards[0] = None
+                dealer_value = None
+            seats = []
+            for seat in self.seats:
+                if seat is None:
+                    seats.append(None)
+                    continue
+                seats.append({
+                    "name": seat.player.name,
+                    "money": seat.player.money,
+                    "bet": seat.player.current_bet if seat.in_round else 0,
+                    "cards": list(seat.hand.cards),
+                    "value": seat.hand.get_value(),
+                    "in_round": seat.in_round,
+                    "result": seat.result[0] if seat.result else None,
+                    "message": seat.result[2] if seat.result else None,
+                })
+            return {
+                "round": self.round,
+                "phase": self.phase,
+                "turn": self.turn,
+                "seconds_left": None if self.deadline is None else max(self.deadline - self.clock(), 0),
+                "dealer_cards": dealer_cards,
+                "dealer_value": dealer_value,
+                "seats": seats,
+            }
+
+    # Everything below runs with the lock held
+    def _seat(self, number, token):
+        self._tick()
+        seat = self.seats[number] if 0 <= number < MAX_SEATS else None
+        if seat is None or seat.token != token:
+            raise TableError("You are not seated at this table")
+        seat.last_seen = self.clock()
+        return seat
+
+    def _check_turn(self, number):
+        if self.phase != PLAYING or self.turn != number:
+            raise TableError("It's not your turn")
+
+    def _tick(self):
+        now = self.clock()
+        # Give up seats nobody has acted from for a long time, between rounds
+        if self.phase == BETTING:
+            for number, seat in enumerate(self.seats):
+                if seat is not None and not seat.in_round and now - seat.last_seen > SEAT_IDLE_TIMEOUT:
+                    self.seats[number] = None
+        while self.deadline is not None and now >= self.deadline:
+            if self.phase == BETTING:
+                self._deal()
+            else:
+                # The next seat's time starts when this one's ran out
+                self.seats[self.turn].done = True
+                self._next_turn(start=self.deadline)
+
+    def _deal_if_ready(self):
+        seated = [seat for seat in self.seats if seat is not None]
+        if any(seat.in_round for seat in seated) and all(seat.in_round for seat in seated):
+            self._deal()
+
+    def _deal(self):
+        playing = [seat for seat in self.seats if seat is not None and seat.in_round]
+        if not playing:
+            self.deadline = None
+            return
+        self.round += 1
+        self.shoe.start_round()
+        self.round_start = (self.shoe.seed, self.shoe.dealt)
+        self.dealer_hand.clear()
+        for _ in range(2):
+            for seat in playing:
+                seat.hand.add_card(self.shoe.deal(1))
+            self.dealer_hand.add_card(self.shoe.deal(1))
+        for seat in playing:
+            # Naturals are settled straight away, as in Game.play_single_game
+            seat.done = settle_round(seat.hand, self.dealer_hand) is not None
+        self.phase = PLAYING
+        self.turn = -1
+        self._next_turn()
+
+    def _next_turn(self, start=None):
+        for number in range(self.turn + 1, MAX_SEATS):
+            seat = self.seats[number]
+            if seat is not None and seat.in_round and not seat.done:
+                self.turn = number
+                self.deadline = (self.clock() if start is None else start) + self.turn_timeout
+                return
+        self._finish_round()
+
+    def _finish_round(self):
+        playing = [seat for seat in self.seats if seat is not None and seat.in_round]
+        # The dealer only draws if someone is still waiting on the dealer's hand
+        if any(settle_round(seat.hand, self.dealer_hand) is None for seat in playing):
+            while self.dealer_hand.get_value() < DEALER_STAND:
+                self.dealer_hand.add_card(self.shoe.deal(1))
+        for seat in playing:
+            seat.result = (settle_round(seat.hand, self.dealer_hand)
+                           or settle_round(seat.hand, self.dealer_hand, game_over=True))
+            bet = seat.player.current_bet
+            payout = _settle(seat.player, seat.result)
+            if self.round_log is not None:
+                seed, start = self.round_start
+                self.round_log.record(seat.player.name, self.shoe, seat.hand, self.dealer_hand, bet, payout,
+                                      seat.result[0], round_logs.TABLE, seed, start)
+            seat.in_round = False
+            seat.done = True
+        self.phase = BETTING
+        self.turn = None
+        self.deadline = None
+
+
+def _settle(player, outcome):
+    """Pay out a seat's round; returns what was paid back"""
+    result, multiplier, _ = outcome
+    money = player.money
+    player.games_played += 1
+    if result == "win":
+        player.games_won += 1
+        if multiplier == BLACKJACK_PAYOUT:
+            player.blackjacks += 1
+        # Whole dollars, as the solo routes and /play_batch pay
+        winnings = player.current_bet + int(player.current_bet * multiplier)
+        player.money += winnings
+        player.total_winnings += winnings
+        player.highest_balance = max(player.highest_balance, player.money)
+        player.current_bet = 0
+    elif result == "lose":
+        player.games_lost += 1
+        player.lose_bet()
+    else:
+        # A tie returns the stake
+        player.money += player.current_bet
+        player.current_bet = 0
+    return player.money - money
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+def get_table(table_id, create=False, round_log=None):
+    """The table called `table_id`, opening it first if `create` is set"""
+    with _tables_lock:
+        table = _tables.get(table_id)
+        if table is None and create:
+            if not _TABLE_ID.match(table_id):
+                raise TableError("Table names are 1-32 letters, digits, - or _")
+            if len(_tables) >= MAX_TABLES:
+                _close_idle_tables()
+            if len(_tables) >= MAX_TABLES:
+                raise TableError("No more tables can be opened")
+            table = _tables[table_id] = Table(table_id, round_log=round_log)
+        return table
+
+def close_if_empty(table):
+    with _tables_lock:
+        if len(table) == 0 and _tables.get(table.table_id) is table:
+            del _tables[table.table_id]
+
+def _close_idle_tables():
+    """Close tables whose every seat has been given up for sitting idle; needs _tables_lock held"""
+    for table_id, table in list(_tables.items()):
+        with table.lock:
+            table._tick()
+            empty = len(table) == 0
+        if empty:
+            del _tables[table_id]
@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+from main import BLACKJACK
+from round_log import RoundLog, RECORD_SIZE, BATCH, read_rounds, segments
+from simulator import Simulator, never_bust
+
+try:
+    from analytics import ROUND_DTYPE, analyze, map_segment
+except ImportError:
+    analyze = None
+
+@unittest.skipIf(analyze is None, "numpy is not installed")
+class TestAnalytics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        # Small segments, so players' drawdowns run across several of them
+        log = RoundLog(cls.temp_dir.name, max_bytes=RECORD_SIZE * 700)
+        simulator = Simulator(never_bust, bet=20, record_every=0, decks=2)
+        for hand in range(3000):
+            result, multiplier = simulator.play_round()
+            payout = 0 if result == "lose" else 20 if result == "tie" else 20 + int(20 * multiplier)
+            log.record(f"Player{hand % 3}", simulator.deck, simulator.player_hand, simulator.dealer_hand,
+                       20, payout, result, BATCH)
+        log.close()
+        cls.rounds = list(read_rounds(cls.temp_dir.name))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def test_records_map_in_place(self):
+        """Test the mapped records line up with the records read one by one"""
+        self.assertEqual(ROUND_DTYPE.itemsize, RECORD_SIZE)
+        self.assertGreater(len(segments(self.temp_dir.name)), 2)
+        records = map_segment(segments(self.temp_dir.name)[0])
+        self.assertEqual(records["player"][1].decode(), self.rounds[1].player)
+        self.assertEqual(records["cards"][1][:2].tolist(), [card.code for card in self.rounds[1].player_cards[:2]])
+
+    def test_report_matches_rounds(self):
+        """Test the report agrees with totals worked out round by round"""
+        summary = analyze(self.temp_dir.name).summary()
+        wagered = sum(logged.bet for logged in self.rounds)
+        paid = sum(logged.payout for logged in self.rounds)
+        self.assertEqual(summary["rounds"], 3000)
+        self.assertAlmostEqual(summary["house_net"], wagered - paid)
+
+        naturals = sum(sum(card.value for card in logged.player_cards[:2]) == BLACKJACK for logged in self.rounds)
+        self.assertAlmostEqual(summary["blackjack_frequency"], round(naturals / 3000 * 100, 4))
+
+        players = {player["name"]: player for player in summary["players"]}
+        self.assertEqual(sorted(players), ["Player0", "Player1", "Player2"])
+        for name, player in players.items():
+            played = [logged for logged in self.rounds if logged.player == name]
+            net = peak = drawdown = 0
+            for logged in played:
+                net += logged.payout - logged.bet
+                peak = max(peak, net)
+                drawdown = max(drawdown, peak - net)
+            self.assertEqual(player["rounds"], len(played))
+            self.assertAlmostEqual(player["win_rate"], round(sum(logged.result == "win" for logged in played) / len(played) * 100, 2))
+            self.assertAlmostEqual(player["net"], net)
+            self.assertAlmostEqual(player["max_drawdown"], drawdown)
+
+    def test_workers_agree(self):
+        """Test reading segments in several processes gives the same report"""
+        self.assertEqual(analyze(self.temp_dir.name, workers=2).summary(), analyze(self.temp_dir.name).summary())
+
+if __name__ == '__main__':
+    unittest.main()
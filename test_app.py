@@ -0,0 +1,200 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import game_service
+from app import app
+from game_service import round_store
+from main import Player, Leaderboard, WriteBehindLeaderboard, CARDS
+import table as tables
+
+class TestApp(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.client.post('/start_game', json={'player_name': 'TestPlayer'})
+
+    def _start_round(self):
+        # Deal until a round doesn't end on a natural
+        for _ in range(50):
+            data = self.client.post('/place_bet', json={'bet_amount': 10}).get_json()
+            if not data['game_message']:
+                return data
+        self.fail("Every round ended on a natural")
+
+    def test_round_cycle(self):
+        """Test bet, hit and stand against the server-side round"""
+        self._start_round()
+        data = self.client.post('/hit').get_json()
+        self.assertIn(data['status'], ('continue', 'game_over'))
+        if data['status'] == 'continue':
+            data = self.client.post('/stand').get_json()
+            self.assertEqual(data['status'], 'game_over')
+            self.assertIn(data['result'], ('win', 'lose', 'tie'))
+        data = self.client.post('/stand').get_json()
+        self.assertEqual(data['status'], 'error')
+
+    def test_shoe_persists_across_rounds(self):
+        """Test consecutive rounds deal from the same shoe"""
+        self.client.post('/place_bet', json={'bet_amount': 10})
+        with self.client.session_transaction() as session:
+            round_id = session['round_id']
+        first_left = len(round_store.get(round_id).deck)
+        self.client.post('/stand')
+        self.client.post('/place_bet', json={'bet_amount': 10})
+        with self.client.session_transaction() as session:
+            self.assertEqual(session['round_id'], round_id)
+        self.assertLess(len(round_store.get(round_id).deck), first_left)
+
+    def test_invalid_bet(self):
+        """Test bets outside the table limits are refused"""
+        data = self.client.post('/place_bet', json={'bet_amount': 5}).get_json()
+        self.assertEqual(data['status'], 'error')
+
+    def test_play_batch(self):
+        """Test a batch streams one line per hand and then the updated stats"""
+        response = self.client.post('/play_batch', json={'bet_amount': 10, 'hands': 50, 'strategy': 'never_bust'})
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(lines), 51)
+        self.assertEqual([line['hand'] for line in lines[:-1]], list(range(1, 51)))
+        summary = lines[-1]
+        self.assertEqual(summary['hands'], 50)
+        self.assertEqual(summary['stats']['player_money'], lines[-2]['player_money'])
+        self.assertEqual(summary['stats']['games_played'], 50)
+        self.assertEqual(self.client.get('/get_stats').get_json(), summary['stats'])
+
+    def test_play_batch_script(self):
+        """Test a scripted batch plays one hand per entry"""
+        response = self.client.post('/play_batch', json={'bet_amount': 10, 'script': [['hit', 'hit'], ['stand'], []]})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(lines[-1]['hands'], 3)
+        # Naturals aside, the second hand stands on its first two cards
+        if lines[1]['result'] != 'win' or lines[1]['player_value'] != 21:
+            self.assertEqual(len(lines[1]['player_hand']), 2)
+
+    def test_play_batch_limits(self):
+        """Test batches outside the bet, hand and strategy limits are refused"""
+        for payload in ({'bet_amount': 5, 'hands': 10}, {'bet_amount': 600, 'hands': 10},
+                        {'bet_amount': 10, 'hands': 0}, {'bet_amount': 10, 'hands': 10 ** 6},
+                        {'bet_amount': 10, 'hands': 10, 'strategy': 'perfect'},
+                        {'bet_amount': 10, 'script': [['fold']]}):
+            self.assertEqual(self.client.post('/play_batch', json=payload).get_json()['status'], 'error')
+
+    def test_play_batch_stops_when_broke(self):
+        """Test a batch stops once the bankroll can't cover the bet"""
+        response = self.client.post('/play_batch', json={'bet_amount': 500, 'hands': 10000, 'strategy': 'stand'})
+        summary = json.loads(response.get_data(as_text=True).splitlines()[-1])
+        self.assertEqual(summary['stopped'], 'bankroll')
+        self.assertLess(summary['stats']['player_money'], 500)
+
+    def test_hint(self):
+        """Test the hint route answers for a live round only"""
+        self.assertEqual(self.client.get('/hint').get_json()['status'], 'error')
+        self._start_round()
+        data = self.client.get('/hint').get_json()
+        self.assertEqual(data['status'], 'success')
+        self.assertIn(data['action'], ('hit', 'stand'))
+        self.assertEqual(data['ev'], max(data['ev_hit'], data['ev_stand']))
+
+class TestTableRoutes(unittest.TestCase):
+    def setUp(self):
+        self.players = []
+        for name in ('North', 'South'):
+            client = app.test_client()
+            client.post('/start_game', json={'player_name': name})
+            self.players.append(client)
+        self.addCleanup(self._leave)
+
+    def _leave(self):
+        for client in self.players:
+            client.post('/table/routes/leave')
+
+    def test_round_at_shared_table(self):
+        """Test two sessions play a round at one table and the session keeps the result"""
+        north, south = self.players
+        self.assertEqual(north.post('/table/routes/join').get_json()['your_seat'], 0)
+        self.assertEqual(south.post('/table/routes/join').get_json()['your_seat'], 1)
+        self.assertEqual(north.post('/place_bet', json={'bet_amount': 10}).get_json()['status'], 'error')
+
+        # No naturals, so the round waits for both seats to stand
+        table = tables.get_table('routes')
+        table.shoe.cards = table.shoe.cards + [CARDS[code] for code in (6, 7, 8, 9, 9, 9)]
+        north.post('/table/routes/bet', json={'bet_amount': 10})
+        data = south.post('/table/routes/bet', json={'bet_amount': 20}).get_json()
+        self.assertEqual([seat['bet'] for seat in data['seats'][:2]], [10, 20])
+        # Stand on every turn until the round is over
+        for _ in range(2):
+            data = north.get('/table/routes').get_json()
+            self.assertEqual(data['phase'], 'playing')
+            client = self.players[data['turn']]
+            self.assertEqual(self.players[1 - data['turn']].post('/table/routes/stand').get_json()['status'], 'error')
+            client.post('/table/routes/stand')
+
+        for client, data in zip(self.players, (client.get('/table/routes').get_json() for client in self.players)):
+            seat = data['seats'][data['your_seat']]
+            self.assertIn(seat['result'], ('win', 'lose', 'tie'))
+            stats = client.get('/get_stats').get_json()
+            self.assertEqual(stats['games_played'], 1)
+            self.assertEqual(stats['player_money'], seat['money'])
+
+        self.assertEqual(north.post('/table/routes/leave').get_json()['status'], 'success')
+        self.assertEqual(north.post('/table/routes/hit').get_json()['status'], 'error')
+        self.assertIsNone(north.get('/table/routes').get_json()['your_seat'])
+
+class TestLeaderboardRoute(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        leaderboard = WriteBehindLeaderboard(Leaderboard(os.path.join(self.temp_dir.name, "leaderboard.json")))
+        self.addCleanup(leaderboard.close)
+        self.leaderboard = leaderboard
+        patcher = mock.patch.multiple(game_service, _leaderboard=leaderboard, _leaderboard_cache=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_not_modified(self):
+        """Test a request with the current ETag gets a 304"""
+        response = self.client.get('/leaderboard')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [])
+        etag = response.headers['ETag']
+        response = self.client.get('/leaderboard', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_invalidates(self):
+        """Test saving a score changes the ETag"""
+        etag = self.client.get('/leaderboard').headers['ETag']
+        self.client.post('/start_game', json={'player_name': 'Saver'})
+        with self.client.session_transaction() as session:
+            session['games_played'] = 1
+        self.assertEqual(self.client.post('/save_to_leaderboard').get_json()['status'], 'success')
+        self.leaderboard.flush()
+        response = self.client.get('/leaderboard', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()[0]['name'], 'Saver')
+
+    def test_pages_and_rank(self):
+        """Test paging through the leaderboard and looking up a rank"""
+        for i in range(15):
+            player = Player(f"Player{i:02}")
+            player.money = 1000 - i * 10
+            self.leaderboard.add_player(player)
+        self.leaderboard.flush()
+
+        self.assertEqual(len(self.client.get('/leaderboard').get_json()), 10)
+        page = self.client.get('/leaderboard?limit=5&offset=10').get_json()
+        self.assertEqual([entry['name'] for entry in page], [f"Player{i:02}" for i in range(10, 15)])
+        self.assertEqual(self.client.get('/leaderboard?limit=1000').get_json()['status'], 'error')
+
+        data = self.client.get('/leaderboard/rank/Player12').get_json()
+        self.assertEqual(data['rank'], 13)
+        self.assertEqual(data['total'], 15)
+        self.assertEqual([entry['rank'] for entry in data['around']], [11, 12, 13, 14, 15])
+        self.assertEqual(self.client.get('/leaderboard/rank/Nobody').get_json()['status'], 'error')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.cookies import SimpleCookie
+from unittest import mock
+import game_service
+import table as tables
+from asgi_app import app, state_changes, load_session_token
+from app import app as flask_app
+from main import Leaderboard, WriteBehindLeaderboard
+
+class Client:
+    """Calls the ASGI app directly, keeping the session cookie like a browser"""
+
+    def __init__(self):
+        self.cookie = None
+
+    def request(self, method, path, payload=None, headers=()):
+        return asyncio.run(self._request(method, path, payload, headers))
+
+    async def _request(self, method, path, payload, headers):
+        path, _, query = path.partition('?')
+        request_headers = [(name.encode(), value.encode()) for name, value in headers]
+        if self.cookie:
+            request_headers.append((b'cookie', f'session={self.cookie}'.encode()))
+        scope = {'type': 'http', 'method': method, 'path': path,
+                 'query_string': query.encode(), 'headers': request_headers}
+        body = json.dumps(payload).encode() if payload is not None else b''
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await app(scope, receive, send)
+        response_headers = {}
+        for name, value in messages[0]['headers']:
+            response_headers[name.decode()] = value.decode()
+        if 'set-cookie' in response_headers:
+            self.cookie = SimpleCookie(response_headers['set-cookie'])['session'].value
+        return messages[0]['status'], response_headers, messages[1]['body']
+
+    def json(self, method, path, payload=None):
+        status, _, body = self.request(method, path, payload)
+        return json.loads(body)
+
+class TestASGIApp(unittest.TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.client.json('POST', '/start_game', {'player_name': 'TestPlayer'})
+
+    def test_round_cycle(self):
+        """Test bet, hit and stand through the ASGI app"""
+        for _ in range(50):
+            data = self.client.json('POST', '/place_bet', {'bet_amount': 10})
+            if not data['game_message']:
+                break
+        data = self.client.json('POST', '/stand')
+        self.assertEqual(data['status'], 'game_over')
+        self.assertEqual(self.client.json('POST', '/hit')['status'], 'error')
+        stats = self.client.json('GET', '/get_stats')
+        self.assertEqual(stats['player_name'], 'TestPlayer')
+        self.assertGreaterEqual(stats['games_played'], 1)
+
+    def test_play_batch_streams(self):
+        """Test the ASGI app streams a batch as NDJSON"""
+        status, headers, body = self.client.request('POST', '/play_batch', {'bet_amount': 10, 'hands': 20})
+        self.assertEqual(headers['content-type'], 'application/x-ndjson')
+        self.assertEqual(json.loads(body.splitlines()[0])['hand'], 1)
+        self.assertEqual(self.client.json('GET', '/get_stats')['games_played'], 20)
+
+    def test_play_batch_off_event_loop(self):
+        """Test a batch is played in the thread pool, not on the event loop"""
+        threads = []
+        play_batch = game_service.play_batch
+
+        def recording(*args):
+            threads.append(threading.current_thread())
+            return play_batch(*args)
+
+        with mock.patch.object(game_service, 'play_batch', recording):
+            self.client.request('POST', '/play_batch', {'bet_amount': 10, 'hands': 5})
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+    def test_session_shared_with_flask(self):
+        """Test a session cookie from the Flask app is accepted by the ASGI app"""
+        flask_client = flask_app.test_client()
+        flask_client.post('/start_game', json={'player_name': 'Traveller'})
+        self.client.cookie = flask_client.get_cookie('session').value
+        self.assertEqual(self.client.json('GET', '/get_stats')['player_name'], 'Traveller')
+
+    def test_bad_cookie_and_unknown_route(self):
+        """Test a forged cookie starts a fresh session and unknown paths 404"""
+        self.client.cookie = 'forged'
+        self.assertEqual(self.client.json('GET', '/get_stats')['player_name'], 'Player')
+        self.assertEqual(self.client.request('GET', '/nowhere')[0], 404)
+        self.assertEqual(self.client.request('GET', '/hit')[0], 405)
+
+    def test_table_routes(self):
+        """Test the shared table routes, including the table name in the path"""
+        data = self.client.json('POST', '/table/asgi/join')
+        self.assertEqual((data['table'], data['your_seat']), ('asgi', 0))
+        self.assertEqual(self.client.json('GET', '/table/asgi')['seats'][0]['name'], 'TestPlayer')
+        self.assertEqual(self.client.json('POST', '/table/other/bet', {'bet_amount': 10})['status'], 'error')
+        self.assertEqual(self.client.json('POST', '/table/asgi/leave')['status'], 'success')
+        self.assertEqual(self.client.request('GET', '/table/')[0], 404)
+        self.assertEqual(self.client.request('GET', '/table/asgi/join')[0], 405)
+
+    def test_closed_table_frees_session(self):
+        """Test a seat lost to a closed table or to idling is cleared from the cookie"""
+        self.client.json('POST', '/table/asgi-closed/join')
+        with tables._tables_lock:
+            del tables._tables['asgi-closed']
+        self.assertEqual(self.client.json('POST', '/table/asgi-closed/leave')['status'], 'error')
+        self.assertEqual(self.client.json('POST', '/place_bet', {'bet_amount': 10})['status'], 'success')
+
+        self.client.json('POST', '/start_game', {'player_name': 'TestPlayer'})
+        self.client.json('POST', '/table/asgi-idle/join')
+        table = tables.get_table('asgi-idle')
+        table.seats[0].last_seen -= tables.SEAT_IDLE_TIMEOUT + 1
+        self.assertEqual(self.client.json('POST', '/table/asgi-idle/bet', {'bet_amount': 10})['status'], 'error')
+        self.assertEqual(self.client.json('POST', '/place_bet', {'bet_amount': 10})['status'], 'success')
+        tables.close_if_empty(table)
+
+def _apply(state, message):
+    """Rebuild the full state from a channel reply, as the page does"""
+    state.update(message.get('set', {}))
+    for key, items in message.get('add', {}).items():
+        state[key] = state[key] + items
+    for key in message.get('del', []):
+        del state[key]
+
+class TestGameChannel(unittest.TestCase):
+    def _converse(self, messages, path='/ws', cookie=None):
+        """Open a channel, send `messages` and return everything the app sent"""
+        async def run():
+            incoming = asyncio.Queue()
+            incoming.put_nowait({'type': 'websocket.connect'})
+            for message in messages:
+                incoming.put_nowait({'type': 'websocket.receive', 'text': json.dumps(message)})
+            incoming.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+            headers = [(b'cookie', f'session={cookie}'.encode())] if cookie else []
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            await app({'type': 'websocket', 'path': path, 'headers': headers}, incoming.get, send)
+            return sent
+        return asyncio.run(run())
+
+    def test_state_changes(self):
+        """Test only changed values and newly dealt cards are sent"""
+        last = {'player_hand': [1, 2], 'player_value': 12, 'player_money': 990, 'game_message': ''}
+        state = {'player_hand': [1, 2, 3], 'player_value': 15, 'player_money': 990, 'can_hit': True}
+        changes = state_changes(last, state)
+        self.assertEqual(changes, {'add': {'player_hand': [3]}, 'set': {'player_value': 15, 'can_hit': True},
+                                   'del': ['game_message']})
+        _apply(last, changes)
+        self.assertEqual(last, state)
+
+    def test_round_over_channel(self):
+        """Test the replies of a round played over the channel rebuild its full state"""
+        actions = [{'id': 1, 'action': 'start_game', 'player_name': 'Socket'}]
+        actions += [{'id': 2 + i, 'action': 'place_bet', 'bet_amount': 10} for i in range(3)]
+        actions += [{'id': 5, 'action': 'stand'}, {'id': 6, 'action': 'get_stats'}, {'id': 7, 'action': 'fold'}]
+        sent = self._converse(actions)
+        self.assertEqual(sent[0]['type'], 'websocket.accept')
+
+        state = {}
+        replies = [json.loads(message['text']) for message in sent[1:]]
+        self.assertEqual([reply['id'] for reply in replies], [1, 2, 3, 4, 5, 6, 7])
+        for reply in replies[:6]:
+            _apply(state, reply)
+        self.assertEqual(state['player_name'], 'Socket')
+        self.assertIn('win_rate', state)
+        self.assertIn('error', replies[6])
+        # Unchanged stats aren't sent again
+        self.assertNotIn('set', replies[5])
+
+        token = next(reply['session'] for reply in reversed(replies) if 'session' in reply)
+        self.assertEqual(load_session_token(token)['games_played'], state['games_played'])
+
+    def test_resume_and_cookie(self):
+        """Test the channel starts from the cookie's session and can resume a token"""
+        client = Client()
+        client.json('POST', '/start_game', {'player_name': 'Cookie'})
+        sent = self._converse([{'id': 1, 'action': 'get_stats'}], cookie=client.cookie)
+        self.assertEqual(json.loads(sent[1]['text'])['set']['player_name'], 'Cookie')
+
+        sent = self._converse([{'id': 1, 'action': 'start_game', 'player_name': 'Moved'}])
+        token = json.loads(sent[1]['text'])['session']
+        sent = self._converse([{'id': 1, 'action': 'resume', 'token': token},
+                               {'id': 2, 'action': 'resume', 'token': 'forged'}])
+        self.assertEqual(json.loads(sent[1]['text'])['set']['player_name'], 'Moved')
+        self.assertIn('error', json.loads(sent[2]['text']))
+
+        self.assertEqual(client.json('POST', '/resume_session', {'token': token})['status'], 'success')
+        self.assertEqual(client.json('GET', '/get_stats')['player_name'], 'Moved')
+
+    def test_unknown_path_is_refused(self):
+        """Test sockets to other paths are closed"""
+        sent = self._converse([], path='/elsewhere')
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': 4404}])
+
+class TestASGILeaderboard(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        leaderboard = WriteBehindLeaderboard(Leaderboard(os.path.join(self.temp_dir.name, "leaderboard.json")))
+        self.addCleanup(leaderboard.close)
+        self.leaderboard = leaderboard
+        patcher = mock.patch.multiple(game_service, _leaderboard=leaderboard, _leaderboard_cache=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_save_and_etag(self):
+        """Test saving a score and revalidating the leaderboard with its ETag"""
+        status, headers, _ = self.client.request('GET', '/leaderboard')
+        etag = headers['etag']
+        self.assertEqual(self.client.request('GET', '/leaderboard', headers=[('if-none-match', etag)])[0], 304)
+
+        self.client.json('POST', '/start_game', {'player_name': 'Saver'})
+        self.assertEqual(self.client.json('POST', '/save_to_leaderboard')['status'], 'error')
+        self.client.json('POST', '/place_bet', {'bet_amount': 10})
+        self.client.json('POST', '/stand')
+        self.assertEqual(self.client.json('POST', '/save_to_leaderboard')['status'], 'success')
+        self.leaderboard.flush()
+
+        status, _, body = self.client.request('GET', '/leaderboard', headers=[('if-none-match', etag)])
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)[0]['name'], 'Saver')
+        self.assertEqual(self.client.json('GET', '/leaderboard/rank/Saver')['rank'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
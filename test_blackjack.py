@@ -1,9 +1,12 @@
 import unittest
+import contextlib
+import io
 import json
 import os
 import tempfile
+import time
 from unittest.mock import patch, MagicMock
-from main import Card, Deck, Hand, Player, Leaderboard, Game, BLACKJACK, DEALER_STAND
+from main import Card, Deck, Shoe, Hand, Player, Leaderboard, SQLiteLeaderboard, WriteBehindLeaderboard, Game, BLACKJACK, DEALER_STAND, CARDS, encode_cards, decode_cards, settle_round, open_leaderboard
 
 class TestCard(unittest.TestCase):
     def test_card_creation(self):
@@ -20,6 +23,14 @@ class TestCard(unittest.TestCase):
         card = Card("spades", rank_data)
         self.assertEqual(str(card), "K of spades")
 
+    def test_card_code_round_trip(self):
+        """Test every card survives the integer encoding"""
+        for code, card in enumerate(CARDS):
+            self.assertEqual(card.code, code)
+            self.assertIs(Card.from_code(code), card)
+        card = Card("spades", {"rank": "K", "value": 10})
+        self.assertEqual(str(decode_cards(encode_cards([card]))[0]), "K of spades")
+
 class TestDeck(unittest.TestCase):
     def test_deck_creation(self):
         """Test deck creation with all 52 cards"""
@@ -52,6 +63,48 @@ class TestDeck(unittest.TestCase):
         dealt_cards = deck.deal(5)
         self.assertEqual(len(dealt_cards), 0)
 
+    def test_deck_bytes_round_trip(self):
+        """Test a deck is restored from its compact byte encoding"""
+        deck = Deck()
+        deck.shuffle()
+        deck.deal(4)
+        data = deck.to_bytes()
+        self.assertEqual(len(data), 48)
+
+        restored = Deck.from_bytes(data)
+        self.assertEqual([str(card) for card in restored.cards], [str(card) for card in deck.cards])
+        self.assertEqual(str(restored.deal(1)[0]), str(deck.deal(1)[0]))
+
+class TestShoe(unittest.TestCase):
+    def test_shoe_creation(self):
+        """Test a shoe holds every card of every deck"""
+        shoe = Shoe(decks=6)
+        self.assertEqual(len(shoe), 312)
+        self.assertEqual(sorted(shoe.buffer), sorted(list(range(52)) * 6))
+
+    def test_shoe_persists_until_cut_card(self):
+        """Test the shoe only reshuffles once play passes the cut card"""
+        shoe = Shoe(decks=1, penetration=0.5)
+        self.assertFalse(shoe.start_round())
+        shoe.deal(25)
+        self.assertFalse(shoe.start_round())
+        self.assertEqual(len(shoe), 27)
+        shoe.deal(1)
+        self.assertTrue(shoe.start_round())
+        self.assertEqual(len(shoe), 52)
+
+    def test_shoe_never_runs_dry(self):
+        """Test dealing past the last card starts a fresh shoe"""
+        shoe = Shoe(decks=1)
+        self.assertEqual(len(shoe.deal(60)), 60)
+
+    def test_shoe_invalid_arguments(self):
+        """Test impossible shoe configurations are rejected"""
+        with self.assertRaises(ValueError):
+            Shoe(decks=0)
+        with self.assertRaises(ValueError):
+            Shoe(penetration=1.5)
+
 class TestHand(unittest.TestCase):
     def test_hand_creation(self):
         """Test hand creation"""
@@ -108,6 +161,38 @@ class TestHand(unittest.TestCase):
         hand.calculate_value()
         self.assertEqual(hand.value, 21)  # Ace becomes 1
 
+    def test_calculate_value_with_multiple_aces(self):
+        """Test every ace beyond the first counts as 1"""
+        hand = Hand()
+        ace = Card("hearts", {"rank": "A", "value": 11})
+        hand.add_card([ace, ace])
+        self.assertEqual(hand.get_value(), 12)
+        self.assertTrue(hand.is_soft())
+
+        hand.add_card([Card("spades", {"rank": "9", "value": 9})])
+        self.assertEqual(hand.get_value(), 21)
+
+        hand.add_card([Card("diamonds", {"rank": "K", "value": 10})])
+        self.assertEqual(hand.get_value(), 21)
+        self.assertFalse(hand.is_soft())
+        self.assertFalse(hand.is_bust())
+
+    def test_value_tracked_incrementally(self):
+        """Test value is current after add_card without recalculating"""
+        hand = Hand()
+        hand.add_card([Card("hearts", {"rank": "K", "value": 10}), Card("spades", {"rank": "Q", "value": 10})])
+        self.assertEqual(hand.value, 20)
+        hand.add_card([Card("clubs", {"rank": "5", "value": 5})])
+        self.assertTrue(hand.is_bust())
+
+        hand.cards.pop()
+        hand.calculate_value()
+        self.assertEqual(hand.get_value(), 20)
+
+        hand.clear()
+        self.assertEqual(hand.get_value(), 0)
+        self.assertEqual(len(hand.cards), 0)
+
     def test_is_blackjack(self):
         """Test blackjack detection"""
         hand = Hand()
@@ -283,6 +368,222 @@ class TestLeaderboard(unittest.TestCase):
         self.assertEqual(len(leaderboard.leaderboard), 10)
         self.assertEqual(leaderboard.leaderboard[0]["name"], "Player0")  # Highest balance
 
+    def test_keeps_every_player(self):
+        """Test players beyond the top 10 keep their entry and rank"""
+        leaderboard = Leaderboard(self.temp_file.name)
+        for i in range(12):
+            player = Player(f"Player{i}")
+            player.money = 1000 - i * 10
+            leaderboard.add_player(player)
+
+        self.assertEqual(len(leaderboard), 12)
+        self.assertEqual(leaderboard.rank("Player11"), 12)
+        self.assertIsNone(leaderboard.rank("Nobody"))
+        self.assertEqual([entry["name"] for entry in leaderboard.top(2, offset=10)], ["Player10", "Player11"])
+        rank, first, entries = leaderboard.around("Player1", radius=2)
+        self.assertEqual((rank, first), (2, 1))
+        self.assertEqual([entry["name"] for entry in entries], ["Player0", "Player1", "Player2", "Player3"])
+        self.assertEqual(len(Leaderboard(self.temp_file.name)), 12)
+
+    def test_rank_follows_best_entry(self):
+        """Test a better result moves the player up and a worse one is ignored"""
+        leaderboard = Leaderboard(self.temp_file.name)
+        for name, money in (("Player1", 1500), ("Player2", 1200), ("Player3", 900)):
+            player = Player(name)
+            player.money = money
+            leaderboard.add_player(player)
+        player = Player("Player3")
+        player.money = 2000
+        leaderboard.add_player(player)
+        self.assertEqual(leaderboard.rank("Player3"), 1)
+        player.money = 100
+        leaderboard.add_player(player)
+        self.assertEqual(leaderboard.rank("Player3"), 1)
+        self.assertEqual(len(leaderboard), 3)
+
+    def test_version_and_refresh(self):
+        """Test the version changes on writes and refresh picks up other writers"""
+        leaderboard = Leaderboard(self.temp_file.name)
+        version = leaderboard.version()
+        self.assertEqual(leaderboard.version(), version)
+
+        other = Leaderboard(self.temp_file.name)
+        other.add_player(Player("Elsewhere"))
+        self.assertNotEqual(leaderboard.version(), version)
+        self.assertEqual(len(leaderboard.leaderboard), 0)
+        leaderboard.refresh()
+        self.assertEqual(leaderboard.leaderboard[0]["name"], "Elsewhere")
+
+        version = leaderboard.version()
+        leaderboard.add_player(Player("Here"))
+        self.assertNotEqual(leaderboard.version(), version)
+
+class TestSQLiteLeaderboard(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "leaderboard.db")
+        self.json_path = os.path.join(self.temp_dir.name, "leaderboard.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _player(self, name, money, games_played=0, games_won=0):
+        player = Player(name)
+        player.money = money
+        player.games_played = games_played
+        player.games_won = games_won
+        return player
+
+    def test_add_player_and_sorting(self):
+        """Test entries come back ranked by win rate, then balance"""
+        leaderboard = SQLiteLeaderboard(self.db_path, import_from=None)
+        leaderboard.add_player(self._player("Player1", 800))
+        leaderboard.add_player(self._player("Player2", 1500))
+        leaderboard.add_player(self._player("Player3", 500, games_played=2, games_won=1))
+        names = [entry["name"] for entry in leaderboard.leaderboard]
+        self.assertEqual(names, ["Player3", "Player2", "Player1"])
+
+    def test_keeps_best_entry(self):
+        """Test a worse result doesn't replace a player's best"""
+        leaderboard = SQLiteLeaderboard(self.db_path, import_from=None)
+        leaderboard.add_player(self._player("Player1", 1200, games_played=4, games_won=2))
+        leaderboard.add_player(self._player("Player1", 2000, games_played=4, games_won=1))
+        leaderboard.add_player(self._player("Player1", 1300, games_played=4, games_won=2))
+        self.assertEqual(len(leaderboard.leaderboard), 1)
+        self.assertEqual(leaderboard.leaderboard[0]["final_balance"], 1300)
+
+    def test_top_n(self):
+        """Test only the configured number of entries is listed"""
+        leaderboard = SQLiteLeaderboard(self.db_path, top_n=3, import_from=None)
+        for i in range(5):
+            leaderboard.add_player(self._player(f"Player{i}", 1000 - i * 10))
+        self.assertEqual([entry["name"] for entry in leaderboard.leaderboard], ["Player0", "Player1", "Player2"])
+
+    def test_rank_and_pages(self):
+        """Test rank lookups and pages agree with the ranked order"""
+        leaderboard = SQLiteLeaderboard(self.db_path, top_n=3, import_from=None)
+        for i in range(6):
+            leaderboard.add_player(self._player(f"Player{i}", 1000 - i * 10))
+        leaderboard.add_player(self._player("Tied", 950))
+        self.assertEqual(len(leaderboard), 7)
+        # Equal results are ordered by name
+        self.assertEqual(leaderboard.rank("Player5"), 6)
+        self.assertEqual(leaderboard.rank("Tied"), 7)
+        self.assertIsNone(leaderboard.rank("Nobody"))
+        names = [entry["name"] for entry in leaderboard.top()]
+        self.assertEqual([entry["name"] for entry in leaderboard.top(2, offset=4)], names[4:6])
+        for name in names:
+            self.assertEqual(leaderboard.rank(name), names.index(name) + 1)
+        rank, first, entries = leaderboard.around("Player5", radius=1)
+        self.assertEqual((rank, first), (6, 5))
+        self.assertEqual([entry["name"] for entry in entries], names[4:7])
+        self.assertEqual(leaderboard.around("Nobody"), (None, None, []))
+
+    def test_rank_counts_along_index(self):
+        """Test a rank lookup only walks the ordering index, never the whole table"""
+        leaderboard = SQLiteLeaderboard(self.db_path, import_from=None)
+        plan = [row[3] for row in leaderboard._connection().execute(
+            "EXPLAIN QUERY PLAN " + SQLiteLeaderboard.RANK_QUERY, ("Player1",))]
+        counting = [step for step in plan if "other" in step]
+        self.assertTrue(counting)
+        self.assertTrue(all("USING COVERING INDEX leaderboard_order" in step for step in counting), plan)
+
+    def test_version(self):
+        """Test the version is shared between connections and bumped by each write"""
+        leaderboard = SQLiteLeaderboard(self.db_path, import_from=None)
+        other = SQLiteLeaderboard(self.db_path, import_from=None)
+        version = other.version()
+        leaderboard.add_player(self._player("Player1", 800))
+        self.assertNotEqual(other.version(), version)
+
+    def test_imports_json_once(self):
+        """Test an existing JSON leaderboard is imported on first use only"""
+        json_leaderboard = Leaderboard(self.json_path)
+        json_leaderboard.add_player(self._player("Imported", 1500))
+
+        leaderboard = SQLiteLeaderboard(self.db_path, import_from=self.json_path)
+        self.assertEqual(leaderboard.leaderboard[0]["name"], "Imported")
+
+        json_leaderboard.add_player(self._player("Later", 2000))
+        leaderboard = SQLiteLeaderboard(self.db_path, import_from=self.json_path)
+        self.assertEqual([entry["name"] for entry in leaderboard.leaderboard], ["Imported"])
+
+    def test_open_leaderboard(self):
+        """Test the backend is picked from the location"""
+        self.assertIsInstance(open_leaderboard(self.db_path), SQLiteLeaderboard)
+        leaderboard = open_leaderboard(self.json_path, top_n=5)
+        self.assertNotIsInstance(leaderboard, SQLiteLeaderboard)
+        self.assertEqual(leaderboard.top_n, 5)
+
+class TestWriteBehindLeaderboard(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.json_path = os.path.join(self.temp_dir.name, "leaderboard.json")
+        self.backend = Leaderboard(self.json_path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _player(self, name, money, games_played=0, games_won=0):
+        player = Player(name)
+        player.money = money
+        player.games_played = games_played
+        player.games_won = games_won
+        return player
+
+    def test_burst_is_one_write(self):
+        """Test scores queued between flushes are merged into a single write"""
+        leaderboard = WriteBehindLeaderboard(self.backend, flush_ms=60000)
+        self.addCleanup(leaderboard.close)
+        leaderboard.add_player(self._player("Player1", 800))
+        leaderboard.flush()
+        self.assertEqual(self.backend._writes, 1)
+
+        leaderboard.add_player(self._player("Player2", 1200, games_played=4, games_won=2))
+        leaderboard.add_player(self._player("Player2", 2000, games_played=4, games_won=1))
+        leaderboard.add_player(self._player("Player3", 900))
+        leaderboard.flush()
+        self.assertEqual(self.backend._writes, 2)
+        self.assertEqual([entry["name"] for entry in leaderboard.leaderboard], ["Player2", "Player3", "Player1"])
+        self.assertEqual(leaderboard.leaderboard[0]["final_balance"], 1200)
+        self.assertEqual(leaderboard.around("Player3", radius=1), (2, 1, leaderboard.top(3)))
+
+    def test_failed_write_is_retried(self):
+        """Test scores from a write that fails are kept and saved by the next attempt"""
+        failures = []
+        add_entries = self.backend.add_entries
+
+        def failing_once(entries):
+            if not failures:
+                failures.append(len(entries))
+                raise OSError("disk full")
+            add_entries(entries)
+
+        self.backend.add_entries = failing_once
+        leaderboard = WriteBehindLeaderboard(self.backend, flush_ms=10)
+        self.addCleanup(leaderboard.close)
+        with contextlib.redirect_stderr(io.StringIO()) as errors:
+            leaderboard.add_player(self._player("Player1", 800))
+            leaderboard.flush()
+            self.assertEqual(failures, [1])
+            for _ in range(200):
+                if leaderboard.rank("Player1"):
+                    break
+                time.sleep(0.01)
+        self.assertEqual(leaderboard.rank("Player1"), 1)
+        self.assertIn("disk full", errors.getvalue())
+
+    def test_close_saves_queued_scores(self):
+        """Test closing writes what is still queued and refuses new scores"""
+        leaderboard = WriteBehindLeaderboard(self.backend, flush_ms=60000)
+        leaderboard.add_player(self._player("Player1", 800))
+        leaderboard.add_player(self._player("Player2", 900))
+        leaderboard.close()
+        self.assertEqual(len(Leaderboard(self.json_path).leaderboard), 2)
+        self.assertEqual(os.listdir(self.temp_dir.name), ["leaderboard.json"])
+        with self.assertRaises(RuntimeError):
+            leaderboard.add_player(self._player("Player3", 1000))
+
 class TestGame(unittest.TestCase):
     def test_game_creation(self):
         """Test game creation"""
@@ -315,5 +616,34 @@ class TestGame(unittest.TestCase):
         bet = game.get_bet_amount(player)
         self.assertEqual(bet, 50)
 
+    def test_settle_round(self):
+        """Test round settlement without any I/O"""
+        player_hand = Hand()
+        dealer_hand = Hand(dealer=True)
+        player_hand.add_card([Card("hearts", {"rank": "A", "value": 11}), Card("spades", {"rank": "K", "value": 10})])
+        dealer_hand.add_card([Card("clubs", {"rank": "9", "value": 9}), Card("spades", {"rank": "8", "value": 8})])
+        self.assertEqual(settle_round(player_hand, dealer_hand)[:2], ("win", 1.5))
+
+        player_hand = Hand()
+        player_hand.add_card([Card("hearts", {"rank": "9", "value": 9}), Card("spades", {"rank": "8", "value": 8})])
+        self.assertIsNone(settle_round(player_hand, dealer_hand))
+        self.assertEqual(settle_round(player_hand, dealer_hand, game_over=True)[0], "tie")
+
+    @patch('builtins.print')
+    def test_check_winner_pays_blackjack(self, mock_print):
+        """Test check_winner pays and counts a blackjack"""
+        game = Game()
+        player = Player("TestPlayer")
+        player.place_bet(100)
+        player_hand = Hand()
+        dealer_hand = Hand(dealer=True)
+        player_hand.add_card([Card("hearts", {"rank": "A", "value": 11}), Card("spades", {"rank": "K", "value": 10})])
+        dealer_hand.add_card([Card("clubs", {"rank": "9", "value": 9}), Card("spades", {"rank": "8", "value": 8})])
+
+        self.assertTrue(game.check_winner(player_hand, dealer_hand, player))
+        self.assertEqual(player.games_won, 1)
+        self.assertEqual(player.blackjacks, 1)
+        self.assertEqual(player.money, 1150)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
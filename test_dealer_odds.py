@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+from main import Card
+import dealer_odds
+
+class TestDealerOdds(unittest.TestCase):
+    def test_distributions_sum_to_one(self):
+        """Test every distribution is a probability distribution"""
+        for decks in (1, 8):
+            for upcard in dealer_odds.UPCARDS:
+                for no_blackjack in (False, True):
+                    outcomes = dealer_odds.dealer_outcomes(upcard, decks, no_blackjack)
+                    self.assertAlmostEqual(sum(outcomes.values()), 1.0)
+
+    def test_known_values(self):
+        """Test against published six-deck dealer probabilities"""
+        self.assertAlmostEqual(dealer_odds.dealer_outcomes(6, decks=6)["bust"], 0.4228, places=4)
+        self.assertAlmostEqual(dealer_odds.dealer_outcomes(10, decks=6)["bust"], 0.2125, places=4)
+
+    def test_no_blackjack_conditioning(self):
+        """Test an ace upcard can't reach 21 from the hole card once naturals are excluded"""
+        with_natural = dealer_odds.dealer_outcomes(1, decks=1)
+        without_natural = dealer_odds.dealer_outcomes(1, decks=1, no_blackjack=True)
+        self.assertLess(without_natural[21], with_natural[21])
+
+    def test_card_upcard(self):
+        """Test a Card can be passed as the upcard"""
+        king = Card("spades", {"rank": "K", "value": 10})
+        self.assertEqual(dealer_odds.dealer_outcomes(king, 2), dealer_odds.dealer_outcomes(10, 2))
+
+    def test_invalid_arguments(self):
+        """Test out-of-range decks and upcards are rejected"""
+        with self.assertRaises(ValueError):
+            dealer_odds.dealer_outcomes(10, decks=9)
+        with self.assertRaises(ValueError):
+            dealer_odds.dealer_outcomes(11)
+
+    def test_save_and_load(self):
+        """Test the binary cache file round trips"""
+        tables = dealer_odds.get_tables()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "odds.bin")
+            dealer_odds.save_tables(tables, path)
+            self.assertEqual(dealer_odds.load_tables(path), tables)
+
+            with open(path, "r+b") as f:
+                f.write(b"XXXX")
+            self.assertIsNone(dealer_odds.load_tables(path))
+        self.assertIsNone(dealer_odds.load_tables(os.path.join(temp_dir, "missing.bin")))
+
+if __name__ == '__main__':
+    unittest.main()
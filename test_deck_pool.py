@@ -0,0 +1,65 @@
+import random
+import time
+import unittest
+import metrics
+from main import Shoe, shuffled_shoe
+from deck_pool import DeckPool
+
+class TestDeckPool(unittest.TestCase):
+    def setUp(self):
+        # Two decks, so the pool the web app installs for its shoes is left alone
+        self.pool = DeckPool(decks=2, size=4, threads=1, rng=random.Random(5))
+
+    def tearDown(self):
+        self.pool.close()
+
+    def _wait_until_full(self):
+        deadline = time.monotonic() + 5
+        while len(self.pool) < self.pool.size:
+            self.assertLess(time.monotonic(), deadline, "the pool was never refilled")
+            time.sleep(0.01)
+
+    def test_refills_in_background(self):
+        """Test shoes come from the pool, its threads top it up, and an empty pool still deals"""
+        self._wait_until_full()
+        taken = [self.pool.take() for _ in range(4)]
+        self.assertEqual(self.pool.hits, 4)
+        for seed, buffer in taken:
+            self.assertEqual(buffer, shuffled_shoe(2, seed))
+        self._wait_until_full()
+
+        self.pool.close()
+        self.pool._ready.clear()
+        seed, buffer = self.pool.take()
+        self.assertEqual(self.pool.misses, 1)
+        self.assertEqual(buffer, shuffled_shoe(2, seed))
+
+    def test_serves_shoes(self):
+        """Test unseeded shoes are dealt from the installed pool and seeded ones are not"""
+        self.pool.install()
+        self._wait_until_full()
+        shoe = Shoe(2)
+        self.assertEqual(self.pool.hits, 1)
+        self.assertEqual(shoe.buffer, shuffled_shoe(2, shoe.seed))
+        shoe.reshuffle()
+        self.assertEqual(self.pool.hits, 2)
+        Shoe(2, rng=random.Random(1))
+        Shoe(3)
+        self.assertEqual((self.pool.hits, self.pool.misses), (2, 0))
+        self.pool.close()
+        self.assertNotIn(2, Shoe.pools)
+
+    def test_metrics(self):
+        """Test the pool's hits and misses are served at /metrics"""
+        self.addCleanup(metrics._collectors.update, dict(metrics._collectors))
+        self.pool.register_metrics()
+        self._wait_until_full()
+        self.pool.take()
+        text = metrics.render()
+        self.assertIn('# TYPE blackjack_deck_pool_takes_total counter', text)
+        self.assertIn('blackjack_deck_pool_takes_total{result="hit"} 1', text)
+        self.assertIn('blackjack_deck_pool_takes_total{result="miss"} 0', text)
+        self.assertIn('blackjack_deck_pool_ready ', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import asyncio
+import random
+import threading
+import unittest
+from werkzeug.serving import make_server
+from app import app
+from loadgen import run, think_time, bet_range, VirtualPlayer
+
+class TestLoadgen(unittest.TestCase):
+    def test_plays_against_server(self):
+        """Test virtual players play full rounds against a running app with no errors"""
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            results = asyncio.run(run(f'http://127.0.0.1:{server.server_port}', players=8, rounds=3,
+                                      seed=1, bets='10-50', connections=4))
+        finally:
+            server.shutdown()
+        summary = results.summary()
+        self.assertEqual(summary['rounds'], 24)
+        self.assertEqual(summary['error_rate'], 0.0, summary['top_errors'])
+        self.assertEqual(summary['routes']['POST /place_bet']['requests'], 24)
+        self.assertGreaterEqual(summary['routes']['POST /start_game']['requests'], 8)
+        self.assertLessEqual(summary['routes']['POST /place_bet']['p50_ms'], summary['routes']['POST /place_bet']['max_ms'])
+
+    def test_scenarios_repeat(self):
+        """Test a seed gives each player the same bets and think times every run"""
+        think = think_time('exp:0.5')
+
+        def draws(seed, name):
+            player = VirtualPlayer(None, None, name, seed, think=think, bets=bet_range('10-500'))
+            return ([player.bet_rng.randint(*player.bets) for _ in range(5)],
+                    [player.think(player.think_rng) for _ in range(5)])
+
+        self.assertEqual(draws(7, 'Load1'), draws(7, 'Load1'))
+        self.assertNotEqual(draws(7, 'Load1'), draws(7, 'Load2'))
+        self.assertNotEqual(draws(7, 'Load1'), draws(8, 'Load1'))
+        self.assertEqual(think_time('fixed:0.25')(random.Random()), 0.25)
+        with self.assertRaises(ValueError):
+            think_time('gamma:2')
+        with self.assertRaises(ValueError):
+            bet_range('5')
+
+if __name__ == '__main__':
+    unittest.main()
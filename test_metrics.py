@@ -0,0 +1,65 @@
+import unittest
+from unittest import mock
+import metrics
+from app import app
+from test_asgi_app import Client
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets(self):
+        """Test every value lands in a bucket no more than 1/16 below its top"""
+        histogram = metrics.Histogram()
+        for value in list(range(100)) + [10 ** power + offset for power in range(2, 12) for offset in (-1, 0, 1)]:
+            histogram.counts = [0] * len(histogram.counts)
+            histogram.record(value)
+            index = histogram.counts.index(1)
+            top = metrics.bucket_top(index)
+            self.assertLessEqual(value, top)
+            self.assertGreaterEqual(value, top - top // 16)
+            if index:
+                self.assertGreater(value, metrics.bucket_top(index - 1))
+
+    def test_quantiles(self):
+        """Test quantiles come back within a bucket of the exact values"""
+        histogram = metrics.Histogram()
+        for value in range(1, 10001):
+            histogram.record(value * 1000)
+        for fraction, exact in ((0.5, 5_000_000), (0.99, 9_900_000), (1.0, 10_000_000)):
+            self.assertLessEqual(exact, histogram.quantile(fraction))
+            self.assertLessEqual(histogram.quantile(fraction), exact * 17 / 16)
+        self.assertEqual(histogram.snapshot()[1:], (10000, sum(range(1, 10001)) * 1000))
+
+class TestMetricsRoute(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.reset()
+
+    def test_off_by_default(self):
+        """Test /metrics is not found when metrics are off"""
+        with mock.patch.object(metrics, 'enabled', False):
+            self.assertEqual(app.test_client().get('/metrics').status_code, 404)
+            metrics.phase('round_load', metrics.clock())
+        self.assertNotIn('blackjack_phase_seconds', metrics.render())
+
+    def test_asgi_routes_and_phases(self):
+        """Test a round through the ASGI app shows up by route pattern and phase"""
+        with mock.patch.object(metrics, 'enabled', True):
+            client = Client()
+            client.json('POST', '/start_game', {'player_name': 'Timed'})
+            client.json('POST', '/place_bet', {'bet_amount': 10})
+            client.json('POST', '/table/metrics/join')
+            client.json('GET', '/leaderboard/rank/Timed')
+            status, headers, body = client.request('GET', '/metrics')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-type'], metrics.CONTENT_TYPE)
+        text = body.decode()
+        self.assertIn('# TYPE blackjack_request_seconds summary', text)
+        self.assertIn('blackjack_request_seconds_count{route="/place_bet",method="POST"} 1', text)
+        self.assertIn('blackjack_request_seconds_count{route="/table/<table_id>/join",method="POST"} 1', text)
+        self.assertIn('blackjack_request_seconds_count{route="/leaderboard/rank/<name>",method="GET"} 1', text)
+        self.assertIn('blackjack_phase_seconds{phase="session_load",quantile="0.99"}', text)
+        self.assertIn('blackjack_phase_seconds_count{phase="round_save"}', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import tempfile
+import time
+import unittest
+from unittest import mock
+import game_service
+from app import app
+from main import Shoe, Hand, Player
+from round_log import RoundLog, RECORD_SIZE, SOLO, TABLE, read_rounds, replay, segments
+from table import Table
+
+def _round(shoe):
+    """Deal a round with no hits, as the web routes would"""
+    shoe.start_round()
+    player_hand = Hand()
+    dealer_hand = Hand(dealer=True)
+    for _ in range(2):
+        player_hand.add_card(shoe.deal(1))
+        dealer_hand.add_card(shoe.deal(1))
+    return player_hand, dealer_hand
+
+class TestRoundLog(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_records_round_trip_and_rotate(self):
+        """Test records come back in order across segments, with nothing written until a flush"""
+        log = RoundLog(self.directory, max_bytes=RECORD_SIZE * 10, buffer_bytes=RECORD_SIZE * 4, flush_seconds=60)
+        shoe = Shoe(2)
+        dealt = []
+        for i in range(25):
+            player_hand, dealer_hand = _round(shoe)
+            log.record(f"Player{i}", shoe, player_hand, dealer_hand, 10, 20, "win")
+            dealt.append((player_hand.cards, dealer_hand.cards))
+            if i == 0:
+                self.assertEqual(list(read_rounds(self.directory)), [])
+        log.close()
+
+        self.assertGreater(len(segments(self.directory)), 1)
+        rounds = list(read_rounds(self.directory))
+        self.assertEqual([logged.player for logged in rounds], [f"Player{i}" for i in range(25)])
+        self.assertEqual([(logged.player_cards, logged.dealer_cards) for logged in rounds], dealt)
+        self.assertEqual(rounds[0].source, SOLO)
+
+    def test_replay_deals_the_round_again(self):
+        """Test a round is rebuilt from its seed and a wrong payout is caught"""
+        log = RoundLog(self.directory)
+        shoe = Shoe(6)
+        shoe.deal(40)
+        player_hand, dealer_hand = _round(shoe)
+        player_hand.add_card(shoe.deal(1))
+        log.record("Replayed", shoe, player_hand, dealer_hand, 10, 12345, "lose")
+        log.close()
+
+        logged = next(read_rounds(self.directory))
+        self.assertEqual(logged.position, 40)
+        replayed = replay(logged)
+        self.assertEqual(replayed.player_hand.cards, player_hand.cards)
+        self.assertEqual(replayed.dealer_hand.cards, dealer_hand.cards)
+        self.assertEqual(replayed.shoe.to_bytes(), shoe.to_bytes())
+        self.assertTrue(any("payout" in problem for problem in replayed.problems))
+
+    def test_writers_sharing_a_directory(self):
+        """Test two writers in one directory keep to their own segments, and a quiet log is flushed on a timer"""
+        first = RoundLog(self.directory, flush_seconds=0.05)
+        second = RoundLog(self.directory, flush_seconds=60)
+        shoe = Shoe(1)
+        first.record("First", shoe, *_round(shoe), 10, 0, "lose")
+        second.record("Second", shoe, *_round(shoe), 10, 0, "lose")
+        for _ in range(100):
+            if list(read_rounds(self.directory)):
+                break
+            time.sleep(0.01)
+        self.assertEqual([logged.player for logged in read_rounds(self.directory)], ["First"])
+        first.close()
+        second.close()
+        self.assertEqual(len(segments(self.directory)), 2)
+        self.assertEqual(sorted(logged.player for logged in read_rounds(self.directory)), ["First", "Second"])
+
+    def test_torn_record_is_skipped(self):
+        """Test a record cut short at the end of a segment is left out"""
+        log = RoundLog(self.directory)
+        shoe = Shoe(1)
+        log.record("Whole", shoe, *_round(shoe), 10, 0, "lose")
+        log.close()
+        with open(segments(self.directory)[0], "ab") as f:
+            f.write(b"\0" * (RECORD_SIZE // 2))
+        self.assertEqual([logged.player for logged in read_rounds(self.directory)], ["Whole"])
+
+    def test_web_rounds_replay(self):
+        """Test every round played through the web routes and a batch replays with the same payout"""
+        log = RoundLog(self.directory)
+        with mock.patch.object(game_service, 'round_log', log):
+            client = app.test_client()
+            client.post('/start_game', json={'player_name': 'Logged'})
+            for _ in range(20):
+                data = client.post('/place_bet', json={'bet_amount': 10}).get_json()
+                if data['status'] == 'error':
+                    break
+                if data['player_value'] < 12:
+                    client.post('/hit')
+                client.post('/stand')
+            client.post('/play_batch', json={'bet_amount': 10, 'hands': 200})
+            games_played = client.get('/get_stats').get_json()['games_played']
+        log.close()
+
+        rounds = list(read_rounds(self.directory))
+        self.assertEqual(len(rounds), games_played)
+        for logged in rounds:
+            self.assertEqual(replay(logged).problems, [])
+
+    def test_table_rounds_replay(self):
+        """Test seats at a shared table are logged and their payouts check out"""
+        log = RoundLog(self.directory)
+        table = Table("logged", round_log=log)
+        seats = [table.join(Player(name)) for name in ("East", "West")]
+        for seat in seats:
+            table.bet(*seat, 10)
+        while table.snapshot()["phase"] == "playing":
+            table.stand(*seats[table.turn])
+        log.close()
+
+        rounds = list(read_rounds(self.directory))
+        self.assertEqual([(logged.player, logged.source) for logged in rounds], [("East", TABLE), ("West", TABLE)])
+        self.assertEqual(rounds[0].dealer_cards, rounds[1].dealer_cards)
+        for logged in rounds:
+            self.assertEqual(replay(logged).problems, [])
+
+if __name__ == '__main__':
+    unittest.main()
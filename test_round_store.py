@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from main import Deck, Shoe, Hand
+from round_store import Round, MemoryRoundStore, SQLiteRoundStore, create_round_store, new_round_id
+
+def _make_round():
+    deck = Deck()
+    deck.shuffle()
+    player_hand = Hand()
+    dealer_hand = Hand(dealer=True)
+    for _ in range(2):
+        player_hand.add_card(deck.deal(1))
+        dealer_hand.add_card(deck.deal(1))
+    return Round(deck, player_hand, dealer_hand)
+
+def _cards(hand):
+    return [str(card) for card in hand.cards]
+
+class TestRound(unittest.TestCase):
+    def test_round_bytes_round_trip(self):
+        """Test a round is restored from its byte encoding"""
+        game_round = _make_round()
+        restored = Round.from_bytes(game_round.to_bytes())
+        self.assertEqual(restored.deck.to_bytes(), game_round.deck.to_bytes())
+        self.assertEqual(_cards(restored.player_hand), _cards(game_round.player_hand))
+        self.assertEqual(_cards(restored.dealer_hand), _cards(game_round.dealer_hand))
+        self.assertTrue(restored.dealer_hand.dealer)
+        self.assertFalse(restored.player_hand.dealer)
+
+    def test_round_with_shoe_round_trip(self):
+        """Test a shoe keeps its size and cut card through the byte encoding"""
+        game_round = _make_round()
+        game_round.deck = Shoe(decks=4, penetration=0.8)
+        game_round.deck.deal(30)
+        restored = Round.from_bytes(game_round.to_bytes())
+        self.assertIsInstance(restored.deck, Shoe)
+        self.assertEqual(restored.deck.decks, 4)
+        self.assertEqual(restored.deck.cut_card, game_round.deck.cut_card)
+        self.assertEqual(restored.deck.to_bytes(), game_round.deck.to_bytes())
+
+class TestMemoryRoundStore(unittest.TestCase):
+    def test_put_get_delete(self):
+        """Test the memory store hands back the same live round"""
+        store = MemoryRoundStore()
+        round_id = new_round_id()
+        game_round = _make_round()
+        store.put(round_id, game_round)
+        self.assertIs(store.get(round_id), game_round)
+        store.delete(round_id)
+        self.assertIsNone(store.get(round_id))
+
+    def test_expired_rounds_are_evicted(self):
+        """Test rounds past their TTL are dropped"""
+        store = MemoryRoundStore(ttl=0)
+        store.put("a", _make_round())
+        store.put("b", _make_round())
+        self.assertIsNone(store.get("b"))
+        self.assertEqual(len(store), 0)
+
+class TestSQLiteRoundStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "rounds.db")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_put_get_delete(self):
+        """Test rounds survive a trip through SQLite"""
+        store = SQLiteRoundStore(self.path)
+        game_round = _make_round()
+        store.put("abc", game_round)
+
+        restored = SQLiteRoundStore(self.path).get("abc")
+        self.assertEqual(restored.deck.to_bytes(), game_round.deck.to_bytes())
+        self.assertEqual(_cards(restored.player_hand), _cards(game_round.player_hand))
+
+        store.delete("abc")
+        self.assertIsNone(store.get("abc"))
+
+    def test_expired_rounds_are_hidden(self):
+        """Test rounds past their TTL are not returned"""
+        store = SQLiteRoundStore(self.path, ttl=-1)
+        store.put("abc", _make_round())
+        self.assertIsNone(store.get("abc"))
+
+    def test_create_round_store(self):
+        """Test the store factory parses its URL"""
+        self.assertIsInstance(create_round_store("memory"), MemoryRoundStore)
+        self.assertIsInstance(create_round_store("sqlite:///" + self.path), SQLiteRoundStore)
+        with self.assertRaises(ValueError):
+            create_round_store("bogus://")
+
+if __name__ == '__main__':
+    unittest.main()
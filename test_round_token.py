@@ -0,0 +1,111 @@
+import unittest
+from unittest import mock
+from flask.json.tag import TaggedJSONSerializer
+from itsdangerous import URLSafeTimedSerializer
+import hashlib
+import game_service
+from app import app
+from main import Hand
+from round_store import Round, create_round_store
+from round_token import RoundTokens, TokenShoe, TokenRoundStore, shoe_order
+
+def _deal(tokens, decks=6, penetration=0.75):
+    shoe = tokens.new_shoe(decks, penetration)
+    player_hand, dealer_hand = Hand(), Hand(dealer=True)
+    player_hand.add_card(shoe.deal(3))
+    dealer_hand.add_card(shoe.deal(2))
+    return Round(shoe, player_hand, dealer_hand)
+
+class TestRoundTokens(unittest.TestCase):
+    def test_round_trip(self):
+        """Test a round comes back from its token with the same hands and the same shoe to come"""
+        tokens = RoundTokens(['secret'])
+        game_round = _deal(tokens)
+        token = tokens.encode(game_round)
+        self.assertLess(len(token), 64)
+
+        shoe_order.cache_clear()
+        resumed = TokenRoundStore(['secret']).get(token)
+        self.assertEqual(resumed.player_hand.cards, game_round.player_hand.cards)
+        self.assertEqual(resumed.dealer_hand.cards, game_round.dealer_hand.cards)
+        self.assertEqual(resumed.deck.buffer, game_round.deck.buffer)
+        self.assertEqual(resumed.deck.cut_card, game_round.deck.cut_card)
+        self.assertEqual(resumed.deck.deal(20), game_round.deck.deal(20))
+
+    def test_forged_tokens_refused(self):
+        """Test tampered, truncated and foreign tokens decode to nothing"""
+        tokens = RoundTokens(['secret'])
+        token = tokens.encode(_deal(tokens))
+        tampered = token[:30] + ('A' if token[30] != 'A' else 'B') + token[31:]
+        for bad in (tampered, token[:20], '', '!!!', 'AAAA'):
+            self.assertIsNone(tokens.decode(bad))
+        self.assertIsNone(RoundTokens(['other']).decode(token))
+
+    def test_key_rotation(self):
+        """Test tokens from a retired key still work and new shoes use the current key"""
+        old = RoundTokens(['old'])
+        token = old.encode(_deal(old))
+        rotated = RoundTokens(['old', 'new'])
+        resumed = rotated.decode(token)
+        self.assertIsNotNone(resumed)
+        self.assertEqual(resumed.deck.key.id, old.current_key.id)
+        self.assertEqual(rotated.decode(rotated.encode(resumed)).player_hand.cards, resumed.player_hand.cards)
+        resumed.deck.reshuffle()
+        self.assertIs(resumed.deck.key, rotated.current_key)
+        self.assertIsNone(RoundTokens(['new']).decode(token))
+
+    def test_shoe_running_out(self):
+        """Test a round that empties the shoe part-way through still makes a token"""
+        tokens = RoundTokens(['secret'])
+        game_round = _deal(tokens, decks=1, penetration=1)
+        nonce = game_round.deck.nonce
+        game_round.player_hand.add_card(game_round.deck.deal(len(game_round.deck) + 2))
+        self.assertNotEqual(game_round.deck.nonce, nonce)
+        resumed = tokens.decode(tokens.encode(game_round))
+        self.assertEqual(resumed.player_hand.cards, game_round.player_hand.cards)
+        self.assertEqual(resumed.deck.buffer, game_round.deck.buffer)
+
+    def test_web_rounds(self):
+        """Test rounds are played through the web routes with the round kept only in the cookie"""
+        store = create_round_store('token', ['secret'])
+        with mock.patch.multiple(game_service, round_store=store, round_tokens=True):
+            client = app.test_client()
+            client.post('/start_game', json={'player_name': 'Tokens'})
+            finished = 0
+            for _ in range(10):
+                data = client.post('/place_bet', json={'bet_amount': 10}).get_json()
+                self.assertEqual(data['status'], 'success')
+                with client.session_transaction() as session:
+                    self.assertIsInstance(store.get(session['round_id']).deck, TokenShoe)
+                if not data['game_message']:
+                    self.assertEqual(client.post('/stand').get_json()['status'], 'game_over')
+                with client.session_transaction() as session:
+                    finished += not session['game_active']
+            stats = client.get('/get_stats').get_json()
+        self.assertGreater(finished, 0)
+        self.assertEqual(stats['games_played'], finished)
+
+class TestSecretKeyFallbacks(unittest.TestCase):
+    def test_default_key_refused_for_tokens(self):
+        """Test round tokens are never signed with the public default key"""
+        self.assertEqual(game_service.round_token_keys(game_service.DEFAULT_SECRET_KEY, ['old']), [])
+        self.assertEqual(game_service.round_token_keys('new', [game_service.DEFAULT_SECRET_KEY, 'old']), ['old', 'new'])
+        with self.assertRaises(ValueError):
+            create_round_store('token', [])
+
+    def test_cookie_signed_with_old_key(self):
+        """Test a session cookie signed with a fallback key is still accepted"""
+        old_serializer = URLSafeTimedSerializer(
+            'retired key', salt='cookie-session', serializer=TaggedJSONSerializer(),
+            signer_kwargs={'key_derivation': 'hmac', 'digest_method': hashlib.sha1})
+        cookie = old_serializer.dumps({'player_name': 'Rotated', 'player_money': 750})
+        with mock.patch.dict(app.config, {'SECRET_KEY_FALLBACKS': ['retired key']}):
+            client = app.test_client()
+            client.set_cookie('session', cookie)
+            self.assertEqual(client.get('/get_stats').get_json()['player_name'], 'Rotated')
+        client = app.test_client()
+        client.set_cookie('session', cookie)
+        self.assertEqual(client.get('/get_stats').get_json()['player_name'], 'Player')
+
+if __name__ == '__main__':
+    unittest.main()
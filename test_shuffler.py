@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from collections import Counter
+from unittest import mock
+from main import Deck, Shoe, Hand, DECK_SIZE
+from round_log import RoundLog, read_rounds, replay
+from shuffler import Shuffler, SecureShuffler, SeededShuffler
+from deck_pool import open_deck_pool
+
+class TestShuffler(unittest.TestCase):
+    def test_seeded_repeats(self):
+        """Test a seed gives the same shuffles every time and each is a permutation"""
+        first, again, other = (bytearray(range(DECK_SIZE)) * 6 for _ in range(3))
+        SeededShuffler(42).shuffle(first)
+        SeededShuffler(42).shuffle(again)
+        SeededShuffler(43).shuffle(other)
+        self.assertEqual(first, again)
+        self.assertNotEqual(first, other)
+        self.assertEqual(sorted(first), sorted(bytearray(range(DECK_SIZE)) * 6))
+
+    def test_seeded_order_is_pinned(self):
+        """Test a seeded shuffle reads its words little-endian, giving the same order on every platform"""
+        items = list(range(12))
+        SeededShuffler(42).shuffle(items)
+        self.assertEqual(items, [4, 8, 5, 1, 11, 3, 10, 2, 7, 0, 9, 6])
+        words = Shuffler(lambda count: bytes([1, 0, 0, 0, 0, 0, 0, 2]), buffer_bytes=8)._words(2)
+        self.assertEqual(list(words), [1, 0x02000000])
+
+    def test_orders_equally_likely(self):
+        """Test every order of three items comes up about as often"""
+        shuffler = SeededShuffler("uniform", buffer_bytes=4096)
+        counts = Counter()
+        for _ in range(30000):
+            items = [0, 1, 2]
+            shuffler.shuffle(items)
+            counts[tuple(items)] += 1
+        self.assertEqual(len(counts), 6)
+        for count in counts.values():
+            self.assertAlmostEqual(count / 5000, 1, delta=0.06)
+
+    def test_rejects_uneven_words(self):
+        """Test a word from the uneven top of the range is drawn again"""
+        # 2**32 - 1 is above the largest multiple of 3, so the last item swaps with index 4 % 3,
+        # drawn after it, and then the word 1 leaves the second item where it is
+        words = iter([0xFFFFFFFF, 1, 4])
+        shuffler = Shuffler(lambda count: b"".join(next(words).to_bytes(4, "little") for _ in range(count // 4)), buffer_bytes=4)
+        items = [0, 1, 2]
+        shuffler.shuffle(items)
+        self.assertEqual(items, [0, 2, 1])
+
+    def test_bits(self):
+        """Test getrandbits and randbelow stay in range"""
+        shuffler = SecureShuffler(buffer_bytes=64)
+        for bits in (1, 7, 8, 64, 100):
+            self.assertLess(shuffler.getrandbits(bits), 1 << bits)
+        self.assertTrue(all(0 <= shuffler.randbelow(10) < 10 for _ in range(200)))
+
+    def test_deals_decks_and_shoes(self):
+        """Test decks and shoes shuffle with a shuffler and shoes from it are logged without a seed"""
+        deck = Deck(rng=SecureShuffler())
+        deck.shuffle()
+        self.assertEqual(sorted(deck.buffer), list(range(DECK_SIZE)))
+        shoe = Shoe(2, rng=SecureShuffler())
+        self.assertIsNone(shoe.seed)
+        self.assertEqual(sorted(shoe.buffer), sorted(bytearray(range(DECK_SIZE)) * 2))
+
+        with tempfile.TemporaryDirectory() as directory:
+            log = RoundLog(directory)
+            player_hand, dealer_hand = Hand(), Hand(dealer=True)
+            player_hand.add_card(shoe.deal(2))
+            dealer_hand.add_card(shoe.deal(2))
+            log.record("Secure", shoe, player_hand, dealer_hand, 10, 0, "lose")
+            log.close()
+            logged = next(read_rounds(directory))
+        self.assertTrue(logged.reshuffled)
+        self.assertEqual(replay(logged).player_hand.cards, player_hand.cards)
+
+    def test_pool_setting(self):
+        """Test the deck pool setting can shuffle every shoe securely with no pool kept"""
+        with mock.patch.dict(os.environ, {'BLACKJACK_DECK_POOL': '0', 'BLACKJACK_DECK_POOL_RNG': 'secure'}):
+            pool = open_deck_pool(decks=3)
+        try:
+            self.assertIsInstance(pool.rng, SecureShuffler)
+            self.assertIsNone(Shoe(3).seed)
+            self.assertEqual((pool.hits, pool.misses, len(pool)), (0, 1, 0))
+        finally:
+            pool.close()
+
+if __name__ == '__main__':
+    unittest.main()
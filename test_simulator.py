@@ -0,0 +1,102 @@
+import unittest
+from main import MIN_BET, MAX_BET, STARTING_MONEY
+from simulator import Simulator, SimulationResult, always_stand, never_bust, dealer_rules, simulate, STAND
+
+class TestSimulator(unittest.TestCase):
+    def test_results_add_up(self):
+        """Test every hand is counted as exactly one win, loss or push"""
+        results = Simulator(dealer_rules, bet=20).run(2000)
+        self.assertEqual(results.hands, 2000)
+        self.assertEqual(results.wins + results.losses + results.pushes, 2000)
+        self.assertEqual(results.wagered, 40000)
+        self.assertLessEqual(results.blackjacks, results.wins)
+        self.assertAlmostEqual(results.ev, results.net / results.wagered)
+
+    def test_standing_never_busts(self):
+        """Test a strategy that never hits never busts"""
+        results = Simulator(always_stand).run(1000)
+        self.assertEqual(results.player_busts, 0)
+
+    def test_strategy_receives_hand_and_upcard(self):
+        """Test the strategy callback sees the live hand and dealer upcard"""
+        seen = []
+
+        def recording_strategy(player_hand, dealer_upcard, deck):
+            seen.append((len(player_hand.cards), dealer_upcard.rank, len(deck)))
+            return STAND
+
+        simulator = Simulator(recording_strategy)
+        simulator.run(50)
+        self.assertTrue(seen)
+        for cards, rank, remaining in seen:
+            self.assertEqual(cards, 2)
+            self.assertEqual(remaining, 48)
+
+    def test_strategy_can_take_hidden_card(self):
+        """Test a strategy asking for the dealer's hidden card is passed it"""
+        seen = []
+
+        def recording_strategy(player_hand, dealer_upcard, deck, hidden_cards=()):
+            seen.append(list(hidden_cards) == simulator.dealer_hand.cards[:1])
+            return STAND
+        recording_strategy.takes_hidden_cards = True
+
+        simulator = Simulator(recording_strategy)
+        simulator.run(50)
+        self.assertTrue(seen)
+        self.assertTrue(all(seen))
+
+    def test_bankroll_trajectory(self):
+        """Test the bankroll is sampled every record_every hands"""
+        results = Simulator(never_bust, record_every=10).run(100)
+        self.assertEqual(len(results.bankroll), 11)
+        self.assertEqual(results.bankroll[0], STARTING_MONEY)
+        self.assertEqual(results.bankroll[-1], STARTING_MONEY + results.net)
+
+    def test_persistent_shoe(self):
+        """Test rounds can be dealt from one shoe across hands"""
+        simulator = Simulator(decks=2, penetration=0.5)
+        results = simulator.run(500)
+        self.assertEqual(results.wins + results.losses + results.pushes, 500)
+        self.assertEqual(simulator.deck.decks, 2)
+
+    def test_invalid_bet(self):
+        """Test bets outside the table limits are rejected"""
+        with self.assertRaises(ValueError):
+            Simulator(bet=MIN_BET - 1)
+        with self.assertRaises(ValueError):
+            Simulator(bet=MAX_BET + 1)
+
+    def test_merge(self):
+        """Test merging two runs continues the bankroll of the first"""
+        first = Simulator(record_every=10).run(100)
+        second = Simulator(record_every=10).run(100)
+        expected_net = first.net + second.net
+        merged = SimulationResult().merge(first).merge(second)
+        self.assertEqual(merged.hands, 200)
+        self.assertEqual(merged.net, expected_net)
+        self.assertEqual(len(merged.bankroll), 21)
+        self.assertEqual(merged.bankroll[-1], STARTING_MONEY + expected_net)
+
+class TestSimulate(unittest.TestCase):
+    def test_same_seed_any_worker_count(self):
+        """Test a seed gives identical results regardless of worker count"""
+        serial = simulate(5000, workers=1, seed=123, chunk_hands=1000)
+        parallel = simulate(5000, workers=2, seed=123, chunk_hands=1000)
+        self.assertEqual(serial.summary(), parallel.summary())
+        self.assertEqual(serial.bankroll, parallel.bankroll)
+
+    def test_different_seeds_differ(self):
+        """Test different seeds give different hands"""
+        first = simulate(5000, seed=1, chunk_hands=1000)
+        second = simulate(5000, seed=2, chunk_hands=1000)
+        self.assertNotEqual(first.bankroll, second.bankroll)
+
+    def test_partial_last_chunk(self):
+        """Test hand counts that are not a multiple of the chunk size"""
+        results = simulate(2500, seed=5, chunk_hands=1000)
+        self.assertEqual(results.hands, 2500)
+        self.assertEqual(results.seed, 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from main import Card, Deck, Hand
+import dealer_odds
+import strategy
+
+def _hand(*ranks):
+    hand = Hand()
+    for rank in ranks:
+        value = 11 if rank == "A" else 10 if rank in ("10", "J", "Q", "K") else int(rank)
+        hand.add_card([Card("hearts", {"rank": rank, "value": value})])
+    return hand
+
+def _counts_without(decks, *rank_values):
+    counts = dealer_odds.shoe_counts(decks)
+    for rank_value in rank_values:
+        counts[rank_value - 1] -= 1
+    return counts
+
+class TestStrategy(unittest.TestCase):
+    def test_stand_on_twenty(self):
+        """Test a hard 20 stands against every upcard"""
+        for upcard in range(1, 11):
+            decision = strategy.solve(_hand("K", "Q"), upcard, _counts_without(1, 10, 10, upcard))
+            self.assertEqual(decision.action, strategy.STAND)
+
+    def test_hit_when_no_card_busts(self):
+        """Test hitting is preferred when no card can bust the hand"""
+        decision = strategy.solve(_hand("5", "6"), 10, _counts_without(1, 5, 6, 10))
+        self.assertEqual(decision.action, strategy.HIT)
+        self.assertGreater(decision.ev_hit, decision.ev_stand)
+
+    def test_stand_ev_matches_dealer_odds(self):
+        """Test the stand EV of a hard 16 is the dealer's bust probability minus the rest"""
+        counts = _counts_without(1, 10, 6, 7)
+        decision = strategy.solve(_hand("10", "6"), 7, counts)
+        bust = dealer_odds.dealer_distribution(7, counts, no_blackjack=True)[-1]
+        self.assertAlmostEqual(decision.ev_stand, 2 * bust - 1)
+
+    def test_web_rules_make_21_wait_for_the_dealer(self):
+        """Test under the web game's rules a 21 pushes against a dealer 21, which can change the best play"""
+        counts = _counts_without(1, 10, 10, 1, 5)
+        web = strategy.solve(_hand("K", "Q", "A"), 5, counts, rules=strategy.WEB_RULES)
+        dealer_21 = dealer_odds.dealer_distribution(5, counts, no_blackjack=True)[4]
+        self.assertAlmostEqual(web.ev_stand, 1.5 * (1 - dealer_21))
+        counts = _counts_without(1, 1, 7, 5)
+        self.assertEqual(strategy.solve(_hand("A", "7"), 5, counts).action, strategy.HIT)
+        self.assertEqual(strategy.solve(_hand("A", "7"), 5, counts, rules=strategy.WEB_RULES).action, strategy.STAND)
+
+    def test_finished_hands(self):
+        """Test hands already on or over 21 just stand"""
+        self.assertEqual(strategy.solve(_hand("K", "Q", "5"), 10, _counts_without(1)).action, strategy.STAND)
+        self.assertEqual(strategy.solve(_hand("K", "Q", "A"), 10, _counts_without(1)).action, strategy.STAND)
+
+    def test_hint_counts_hole_card_as_unseen(self):
+        """Test a mid-round hint treats the dealer's hidden card as unseen"""
+        deck = Deck()
+        deck.shuffle()
+        player_hand = Hand()
+        dealer_hand = Hand(dealer=True)
+        for _ in range(2):
+            player_hand.add_card(deck.deal(1))
+            dealer_hand.add_card(deck.deal(1))
+        self.assertEqual(sum(strategy.unseen_counts(deck, dealer_hand.cards[:1])), 49)
+        decision = strategy.hint(player_hand, dealer_hand, deck)
+        self.assertIn(decision.action, (strategy.HIT, strategy.STAND))
+
+    def test_quick_solve_works_dealer_out_once(self):
+        """Test a non-exact solve works the dealer's odds out once and stays close to the exact one"""
+        counts = _counts_without(6, 2, 3, 6)
+        strategy.clear_cache()
+        quick = strategy.solve(_hand("2", "3"), 6, counts, exact=False)
+        self.assertEqual(strategy._dealer.cache_info().currsize, 1)
+        exact = strategy.solve(_hand("2", "3"), 6, counts)
+        self.assertEqual(quick.action, exact.action)
+        self.assertEqual(quick.ev_stand, exact.ev_stand)
+        self.assertAlmostEqual(quick.ev_hit, exact.ev_hit, places=2)
+
+    def test_cache_is_bounded(self):
+        """Test the memo caches have a size limit"""
+        self.assertEqual(strategy._solve.cache_info().maxsize, strategy.CACHE_SIZE)
+        strategy.clear_cache()
+        self.assertEqual(strategy._solve.cache_info().currsize, 0)
+
+if __name__ == '__main__':
+    unittest.main()
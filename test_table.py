@@ -0,0 +1,154 @@
+import unittest
+from unittest import mock
+from main import Player, CARDS
+import table as tables
+from table import Table, TableError, BETTING, PLAYING
+
+RANK_CODES = {"A": 0, "2": 1, "3": 2, "4": 3, "5": 4, "6": 5, "7": 6, "8": 7, "9": 8, "10": 9, "J": 10, "Q": 11, "K": 12}
+
+class Clock:
+    """A clock the test moves by hand"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTable(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.table = Table("test", bet_timeout=15, turn_timeout=30, clock=self.clock)
+        self.alice = self.table.join(Player("Alice"))
+        self.bob = self.table.join(Player("Bob"))
+
+    def _stack(self, *ranks):
+        """Put cards on top of the shoe so they're dealt in the order given"""
+        self.table.shoe.cards = self.table.shoe.cards + [CARDS[RANK_CODES[rank]] for rank in reversed(ranks)]
+
+    def _deal(self, *ranks):
+        self._stack(*ranks)
+        self.table.bet(*self.alice, 10)
+        self.table.bet(*self.bob, 10)
+
+    def test_join_until_full(self):
+        """Test players take the free seats in order and an eighth is refused"""
+        self.assertEqual(self.alice[0], 0)
+        self.assertEqual(self.bob[0], 1)
+        for _ in range(5):
+            self.table.join(Player("Guest"))
+        with self.assertRaises(TableError):
+            self.table.join(Player("Late"))
+
+    def test_deals_once_everyone_has_bet(self):
+        """Test the cards come out when the last seat bets, with the hole card hidden"""
+        self._stack("10", "10", "10", "9", "8", "7")
+        self.table.bet(*self.alice, 10)
+        self.assertEqual(self.table.snapshot()["phase"], BETTING)
+        self.table.bet(*self.bob, 10)
+        snapshot = self.table.snapshot()
+        self.assertEqual(snapshot["phase"], PLAYING)
+        self.assertIsNone(snapshot["dealer_cards"][0])
+        self.assertIsNone(snapshot["dealer_value"])
+        self.assertEqual([len(seat["cards"]) for seat in snapshot["seats"][:2]], [2, 2])
+
+    def test_betting_window_closes(self):
+        """Test seats that haven't bet when the betting window closes sit the round out"""
+        self._stack("10", "9", "10", "8")
+        self.table.bet(*self.alice, 10)
+        self.clock.now = 16
+        snapshot = self.table.snapshot()
+        self.assertEqual(snapshot["phase"], PLAYING)
+        self.assertEqual(snapshot["turn"], 0)
+        self.assertFalse(snapshot["seats"][1]["in_round"])
+        with self.assertRaises(TableError):
+            self.table.bet(*self.bob, 10)
+
+    def test_turn_timeout_stands(self):
+        """Test a seat that doesn't act stands, and the next seat's time starts then"""
+        self._deal("10", "10", "10", "8", "9", "7")
+        self.assertEqual(self.table.snapshot()["turn"], 0)
+        with self.assertRaises(TableError):
+            self.table.hit(*self.bob)
+        # Both turns run out before anyone looks again
+        self.clock.now = 65
+        snapshot = self.table.snapshot()
+        self.assertEqual(snapshot["phase"], BETTING)
+        self.assertEqual(snapshot["seats"][0]["result"], "win")
+        self.assertEqual(snapshot["seats"][1]["result"], "win")
+
+    def test_round_is_settled(self):
+        """Test the dealer plays once for the table and every seat is paid"""
+        self._deal("10", "10", "10", "9", "6", "7")
+        self.table.stand(*self.alice)
+        self._stack("10")
+        self.table.hit(*self.bob)
+        snapshot = self.table.snapshot()
+        self.assertEqual(snapshot["phase"], BETTING)
+        self.assertEqual(snapshot["dealer_value"], 17)
+        self.assertEqual([seat["result"] for seat in snapshot["seats"][:2]], ["win", "lose"])
+        self.assertEqual([seat["money"] for seat in snapshot["seats"][:2]], [1010, 990])
+        self.assertEqual(self.table.seat(*self.alice).player.games_won, 1)
+
+    def test_blackjack_pays_whole_dollars(self):
+        """Test a natural pays 1.5x rounded down to whole dollars, as the solo game does"""
+        self._stack("A", "10", "10", "K", "9", "7")
+        self.table.bet(*self.alice, 15)
+        self.table.bet(*self.bob, 10)
+        self.table.stand(*self.bob)
+        alice = self.table.seat(*self.alice).player
+        self.assertEqual(alice.money, 1022)
+        self.assertIsInstance(alice.money, int)
+        self.assertEqual(alice.blackjacks, 1)
+
+    def test_dealer_stays_when_everyone_busts(self):
+        """Test the dealer doesn't draw when no seat is waiting on the dealer's hand"""
+        self._deal("10", "10", "10", "6", "6", "5")
+        self._stack("10")
+        self.table.hit(*self.alice)
+        self._stack("10")
+        self.table.hit(*self.bob)
+        snapshot = self.table.snapshot()
+        self.assertEqual(len(snapshot["dealer_cards"]), 2)
+        self.assertEqual([seat["result"] for seat in snapshot["seats"][:2]], ["lose", "lose"])
+
+    def test_tie_returns_stake(self):
+        """Test a push gives the bet back"""
+        self._deal("10", "10", "10", "8", "7", "8")
+        self.table.stand(*self.alice)
+        self.table.stand(*self.bob)
+        snapshot = self.table.snapshot()
+        self.assertEqual([seat["result"] for seat in snapshot["seats"][:2]], ["tie", "lose"])
+        self.assertEqual(snapshot["seats"][0]["money"], 1000)
+
+    def test_leave(self):
+        """Test seats can only be left between rounds and empty tables are closed"""
+        table = tables.get_table("leave-test", create=True)
+        seat = table.join(Player("Solo"))
+        table.bet(*seat, 10)
+        if table.snapshot()["phase"] == PLAYING:
+            with self.assertRaises(TableError):
+                table.leave(*seat)
+            table.stand(*seat)
+        table.leave(*seat)
+        tables.close_if_empty(table)
+        self.assertIsNone(tables.get_table("leave-test"))
+        with self.assertRaises(TableError):
+            tables.get_table("no spaces", create=True)
+
+    def test_idle_tables_are_closed(self):
+        """Test a table whose seats all timed out makes room for a new one"""
+        with mock.patch.object(tables, "_tables", {}), mock.patch.object(tables, "MAX_TABLES", 2):
+            idle = tables.get_table("idle", create=True)
+            idle.join(Player("Gone"))
+            busy = tables.get_table("busy", create=True)
+            busy.join(Player("Here"))
+            with self.assertRaises(TableError):
+                tables.get_table("new", create=True)
+            idle.seats[0].last_seen -= tables.SEAT_IDLE_TIMEOUT + 1
+            self.assertIsNotNone(tables.get_table("new", create=True))
+            self.assertIsNone(tables.get_table("idle"))
+            self.assertIs(tables.get_table("busy"), busy)
+
+if __name__ == '__main__':
+    unittest.main()
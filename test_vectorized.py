@@ -0,0 +1,65 @@
+import unittest
+from main import Hand, decode_cards
+from simulator import Simulator, dealer_rules, never_bust
+
+try:
+    import numpy as np
+    import vectorized
+except ImportError:
+    np = None
+
+class _FixedOrder:
+    """Stands in for an RNG, 'shuffling' into a preset deal order"""
+
+    def __init__(self, deal_order):
+        self.deal_order = deal_order
+
+    def shuffle(self, buffer):
+        # Deck.deal pops from the end, so the first card dealt goes last
+        buffer[:] = bytes(reversed(self.deal_order))
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestVectorized(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(2024)
+
+    def test_shuffled_shoes(self):
+        """Test every shoe row is a permutation of the full shoe"""
+        shoes = vectorized.shuffled_shoes(20, decks=2, rng=self.rng)
+        self.assertEqual(shoes.shape, (20, 104))
+        for row in shoes:
+            self.assertEqual(sorted(row.tolist()), sorted(list(range(52)) * 2))
+
+    def test_hand_totals_match_hand(self):
+        """Test batched totals agree with Hand.get_value"""
+        shoes = vectorized.shuffled_shoes(500, rng=self.rng)
+        counts = self.rng.integers(1, 8, size=500)
+        values, soft = vectorized.hand_totals(shoes[:, :7], counts)
+        for row, count, value, is_soft in zip(shoes, counts, values, soft):
+            hand = Hand()
+            hand.add_card(decode_cards(bytes(row[:count])))
+            self.assertEqual(hand.get_value(), value)
+            self.assertEqual(hand.is_soft(), is_soft)
+
+    def test_play_rounds_match_simulator(self):
+        """Test batched rounds agree with Simulator.play_round on the same shoes"""
+        shoes = vectorized.shuffled_shoes(300, rng=self.rng)
+        for player_stand, strategy in ((17, dealer_rules), (12, never_bust)):
+            rounds = vectorized.play_rounds(shoes, player_stand=player_stand)
+            for i, shoe in enumerate(shoes):
+                simulator = Simulator(strategy, rng=_FixedOrder(bytes(shoe)))
+                result, multiplier = simulator.play_round()
+                self.assertEqual(vectorized.TIE if result == "tie" else vectorized.WIN if result == "win" else vectorized.LOSE,
+                                 rounds["result"][i])
+                self.assertEqual(multiplier, rounds["multiplier"][i])
+                self.assertEqual(simulator.player_hand.get_value(), rounds["player_value"][i])
+                self.assertEqual(simulator.dealer_hand.get_value(), rounds["dealer_value"][i])
+
+    def test_summarize(self):
+        """Test the summary counts every round once"""
+        rounds = vectorized.play_rounds(vectorized.shuffled_shoes(1000, rng=self.rng))
+        summary = vectorized.summarize(rounds)
+        self.assertEqual(summary["wins"] + summary["losses"] + summary["pushes"], 1000)
+
+if __name__ == '__main__':
+    unittest.main()
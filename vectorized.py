@@ -0,0 +1,144 @@
+"""NumPy batch dealing and evaluation for bulk analytics.
+
+Shoes are (B, cards) uint8 arrays of card codes in deal order: column 0 is
+the first card dealt. Totals follow Hand.get_value and round results follow
+settle_round, so a batch agrees card for card with playing the same shoes
+through Hand objects.
+
+Requires numpy, which the game itself does not need.
+"""
+import numpy as np
+
+from main import SUITS, RANKS, DECK_SIZE, BLACKJACK, DEALER_STAND, BLACKJACK_PAYOUT
+
+# Indexed by card code
+CARD_VALUES = np.array([rank["value"] for _ in SUITS for rank in RANKS], dtype=np.int16)
+CARD_IS_ACE = np.array([rank["rank"] == "A" for _ in SUITS for rank in RANKS])
+# Value in the low byte and the ace count above it, so a single sum gives both
+_PACKED = CARD_VALUES + (CARD_IS_ACE.astype(np.int16) << 8)
+
+LOSE, WIN, TIE = 0, 1, 2
+
+
+def shuffled_shoes(batch, decks=1, rng=None):
+    """Deal `batch` independently shuffled shoes of `decks` decks each"""
+    if rng is None:
+        rng = np.random.default_rng()
+    shoe = np.tile(np.arange(DECK_SIZE, dtype=np.uint8), decks)
+    return rng.permuted(np.broadcast_to(shoe, (batch, shoe.size)), axis=1)
+
+def hand_totals(cards, counts=None):
+    """Values and soft flags for hands given as a (B, n) array of card codes.
+
+    `counts` optionally gives how many leading columns of each row are in
+    the hand; by default every column is.
+    """
+    packed = _PACKED[cards]
+    if counts is not None:
+        packed *= np.arange(cards.shape[1]) < np.asarray(counts)[:, None]
+    return _value(packed.sum(axis=1, dtype=np.int16))
+
+def _value(packed):
+    aces = packed >> 8
+    hard = (packed & 0xFF) - 10 * aces
+    # Same rule as Hand: at most one ace counts as 11, and only if it doesn't bust
+    soft = (aces > 0) & (hard + 10 <= BLACKJACK)
+    return np.where(soft, hard + 10, hard), soft
+
+
+class _Hands:
+    """Running packed totals for one hand per row"""
+
+    def __init__(self, shoes, columns):
+        self.packed = _PACKED[shoes[:, columns]].sum(axis=1, dtype=np.int16)
+        self.count = np.full(len(shoes), len(columns), dtype=np.int16)
+
+    def value(self):
+        return _value(self.packed)[0]
+
+    def draw(self, shoes, rows, position):
+        self.packed[rows] += _PACKED[shoes[rows, position[rows]]]
+        self.count[rows] += 1
+        position[rows] += 1
+
+
+def play_rounds(shoes, player_stand=DEALER_STAND):
+    """Play one round per shoe with the settle_round rules.
+
+    The player hits below `player_stand` (the simulator's dealer_rules
+    strategy at the default of 17) and the dealer hits below DEALER_STAND.
+    Returns a dict of per-round arrays.
+    """
+    batch = len(shoes)
+    rows = np.arange(batch)
+    # Initial deal alternates player, dealer, player, dealer
+    player = _Hands(shoes, [0, 2])
+    dealer = _Hands(shoes, [1, 3])
+    position = np.full(batch, 4, dtype=np.int32)
+
+    result = np.full(batch, -1, dtype=np.int8)
+    multiplier = np.zeros(batch)
+
+    def settle(mask, outcome, paid=0):
+        mask = mask & (result < 0)
+        result[mask] = outcome
+        multiplier[mask] = paid
+
+    # Naturals are settled before anyone draws
+    player_value = player.value()
+    dealer_value = dealer.value()
+    settle((player_value == BLACKJACK) & (dealer_value == BLACKJACK), TIE)
+    settle(player_value == BLACKJACK, WIN, BLACKJACK_PAYOUT)
+    settle(dealer_value == BLACKJACK, LOSE)
+
+    # Player's turn
+    while True:
+        hitting = rows[(result < 0) & (player_value < BLACKJACK) & (player_value < player_stand)]
+        if hitting.size == 0:
+            break
+        player.draw(shoes, hitting, position)
+        player_value = player.value()
+    settle(player_value > BLACKJACK, LOSE)
+    settle(player_value == BLACKJACK, WIN, BLACKJACK_PAYOUT)
+
+    # Dealer's turn
+    while True:
+        hitting = rows[(result < 0) & (dealer_value < DEALER_STAND)]
+        if hitting.size == 0:
+            break
+        dealer.draw(shoes, hitting, position)
+        dealer_value = dealer.value()
+    settle(dealer_value > BLACKJACK, WIN, 1)
+    settle(dealer_value == BLACKJACK, LOSE)
+    settle(player_value > dealer_value, WIN, 1)
+    settle(player_value < dealer_value, LOSE)
+    settle(np.ones(batch, dtype=bool), TIE)
+
+    net = np.where(result == WIN, multiplier, np.where(result == LOSE, -1.0, 0.0))
+    return {
+        "result": result,
+        "multiplier": multiplier,
+        "net": net,
+        "player_value": player_value,
+        "dealer_value": dealer_value,
+        "player_cards": player.count,
+        "dealer_cards": dealer.count,
+        "blackjack": (result == WIN) & (multiplier == BLACKJACK_PAYOUT),
+        "player_bust": player_value > BLACKJACK,
+        "dealer_bust": dealer_value > BLACKJACK,
+    }
+
+def summarize(rounds):
+    """Aggregate play_rounds output into the same counters as SimulationResult.summary"""
+    result = rounds["result"]
+    hands = len(result)
+    return {
+        "hands": hands,
+        "wins": int((result == WIN).sum()),
+        "losses": int((result == LOSE).sum()),
+        "pushes": int((result == TIE).sum()),
+        "blackjacks": int(rounds["blackjack"].sum()),
+        "player_busts": int(rounds["player_bust"].sum()),
+        "dealer_busts": int((rounds["dealer_bust"] & (result == WIN)).sum()),
+        "ev": round(float(rounds["net"].mean()), 6) if hands else 0,
+    }